@@ -1,1070 +1,4808 @@
-# =============================================================================
-# PARTE 1 – IMPORTS E CONFIGURAÇÃO BÁSICA
-# =============================================================================
-import os
-from glob import glob
-
-import numpy as np
-import pandas as pd
-import streamlit as st
-import altair as alt
-from datetime import timedelta
-import streamlit.components.v1 as components
-
-
-# Configuração da página do Streamlit
-st.set_page_config(
-    page_title="Avicultura - Dashboard automático",
-    layout="wide",
-)
-
-# Âncora de topo para navegação
-st.markdown("<div id='topo' style='position: relative; top: -30px;'></div>", unsafe_allow_html=True)
-
-st.title("Avicultura · Dashboard automático a partir de CSV")
-st.caption(
-    "Os gráficos e indicadores são gerados automaticamente a partir dos arquivos CSV na pasta `dados/`."
-)
-
-
-# =============================================================================
-# PARTE 2 – LEITURA GLOBAL DOS ARQUIVOS CSV E PRÉ-PROCESSAMENTO
-# =============================================================================
-PASTA_DADOS = "dados"
-
-if not os.path.isdir(PASTA_DADOS):
-    st.error(f"Pasta '{PASTA_DADOS}' não encontrada. Crie a pasta e coloque seus arquivos .csv nela.")
-    st.stop()
-
-arquivos_csv = sorted(glob(os.path.join(PASTA_DADOS, "*.csv")))
-
-# -------------------- Sidebar: informações de arquivos ------------------------
-with st.sidebar:
-    st.header("Configurações")
-    st.write(f"📂 Pasta de dados: `{PASTA_DADOS}/`")
-    st.write(f"📄 Arquivos CSV encontrados: **{len(arquivos_csv)}**")
-    if arquivos_csv:
-        st.write("Arquivos:")
-        for arq in arquivos_csv:
-            st.text(f"- {os.path.basename(arq)}")
-    else:
-        st.warning("Nenhum arquivo CSV encontrado. Adicione pelo menos um arquivo na pasta.")
-        st.stop()
-
-# Lê e concatena todos os CSV em um único DataFrame "dados"
-dfs = []
-for caminho in arquivos_csv:
-    try:
-        df_tmp = pd.read_csv(caminho)
-        df_tmp["__arquivo_origem"] = os.path.basename(caminho)
-        dfs.append(df_tmp)
-    except Exception as e:
-        st.error(f"Erro ao ler `{caminho}`: {e}")
-
-if not dfs:
-    st.error("Não foi possível carregar nenhum CSV.")
-    st.stop()
-
-dados = pd.concat(dfs, ignore_index=True)
-
-# -------------------- Pré-processamento global --------------------
-# 1) Coluna de data
-if "data" not in dados.columns:
-    st.error("Coluna obrigatória 'data' não encontrada nos CSV.")
-    st.stop()
-
-dados["data"] = pd.to_datetime(
-    dados["data"].astype(str).str.strip(),
-    format="%d/%m/%Y",
-    dayfirst=True,
-    errors="coerce",
-)
-
-dados = dados.dropna(subset=["data"])
-dados = dados.sort_values("data")
-
-# 2) Colunas numéricas
-colunas_num = [
-    "milho_pct",
-    "farelo_soja_pct",
-    "calcario_pct",
-    "nucleo_pct",
-    "consumo_g_ave_dia",
-    "ovos_granja",
-    "ovos_escola",
-    "ovos_quebrados",
-    "ovos_sem_casca",
-    "ovos_deformados",
-    "aves_doentes",
-]
-
-for col in colunas_num:
-    if col in dados.columns:
-        dados[col] = pd.to_numeric(dados[col], errors="coerce")
-
-# 3) Métricas derivadas
-if {"ovos_granja", "ovos_escola"}.issubset(dados.columns):
-    dados["perda_ovos"] = dados["ovos_granja"] - dados["ovos_escola"]
-else:
-    dados["perda_ovos"] = np.nan
-
-if {"ovos_quebrados", "ovos_sem_casca", "ovos_deformados", "ovos_granja"}.issubset(dados.columns):
-    dados["ovos_defeituosos"] = (
-        dados["ovos_quebrados"]
-        + dados["ovos_sem_casca"]
-        + dados["ovos_deformados"]
-    )
-    dados["pct_defeituosos"] = 100 * dados["ovos_defeituosos"] / dados["ovos_granja"]
-else:
-    dados["ovos_defeituosos"] = np.nan
-    dados["pct_defeituosos"] = np.nan
-
-
-# =============================================================================
-# PARTE 3 – FILTRO DE PERÍODO, CARDS RESUMO E MENU LATERAL
-# =============================================================================
-CONSUMO_MIN = 105.0
-CONSUMO_MAX = 115.0
-
-with st.sidebar:
-    st.markdown("---")
-    st.subheader("Filtro de período")
-
-    data_min = dados["data"].min().date()
-    data_max = dados["data"].max().date()
-
-    default_ini = max(data_min, data_max - timedelta(days=30))
-
-    periodo = st.date_input(
-        "Selecione o intervalo",
-        value=(data_min, data_max),
-        min_value=data_min,
-        max_value=data_max,
-    )
-
-    if isinstance(periodo, tuple):
-        ini, fim = periodo
-    else:
-        ini = periodo
-        fim = periodo
-
-mask_data = (dados["data"].dt.date >= ini) & (dados["data"].dt.date <= fim)
-dados_filtrados = dados[mask_data].copy()
-
-if dados_filtrados.empty:
-    st.warning("Nenhum dado dentro do período selecionado.")
-    st.stop()
-
-# -------------------- Cards resumo no topo --------------------
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-    consumo_medio = dados_filtrados["consumo_g_ave_dia"].mean()
-    if not np.isnan(consumo_medio):
-        delta = consumo_medio - CONSUMO_MIN
-        st.metric(
-            "Consumo médio (g/ave/dia)",
-            f"{consumo_medio:.1f}",
-            f"{delta:+.1f} vs. limite mínimo 105",
-        )
-    else:
-        st.metric("Consumo médio", "N/A")
-
-with col2:
-    if "ovos_granja" in dados_filtrados.columns:
-        prod_media = dados_filtrados["ovos_granja"].mean()
-        st.metric("Produção média (ovos/dia - granja)", f"{prod_media:.0f}")
-    else:
-        st.metric("Produção média", "N/A")
-
-with col3:
-    if "perda_ovos" in dados_filtrados.columns:
-        perda_media = dados_filtrados["perda_ovos"].mean()
-        st.metric("Perda média (granja → escola)", f"{perda_media:.1f} ovos/dia")
-    else:
-        st.metric("Perda média", "N/A")
-
-with col4:
-    if "pct_defeituosos" in dados_filtrados.columns:
-        pct_medio_def = dados_filtrados["pct_defeituosos"].mean()
-        if not np.isnan(pct_medio_def):
-            st.metric("Ovos não conformes (média)", f"{pct_medio_def:.1f}%")
-        else:
-            st.metric("Ovos não conformes (média)", "N/A")
-    else:
-        st.metric("Ovos não conformes (média)", "N/A")
-
-st.markdown("---")
-
-
-# -------------------- Função de navegação (scroll por âncora) ----------------
-def scroll_to(anchor: str):
-    """
-    Rola até o elemento com o id fornecido.
-    O deslocamento para não cortar o título será feito no próprio <div id='...'>.
-    """
-    components.html(
-        f"""
-        <script>
-        const frameWin = window.parent;
-        const frameDoc = frameWin.document;
-        const el = frameDoc.getElementById('{anchor}');
-        if (el) {{
-            el.scrollIntoView({{ behavior: 'smooth', block: 'start' }});
-        }}
-        </script>
-        """,
-        height=0,
-    )
-
-
-# -------------------- Menu lateral de navegação rápida -----------------------
-with st.sidebar:
-    st.markdown("---")
-    st.subheader("Navegação rápida")
-    secao = st.radio(
-        "Ir para a seção:",
-        [
-            "Topo",
-            "Mistura da ração",
-            "Consumo",
-            "Produção e perdas",
-            "Qualidade & sanidade",
-        ],
-        index=0,
-    )
-
-
-# =============================================================================
-# PARTE 4 – FUNÇÕES AUXILIARES (GRÁFICO E DIAGNÓSTICO)
-# =============================================================================
-def _build_x_axis_and_scale(df_plot):
-    """
-    Constrói eixo X padronizado (datas) para todos os gráficos Altair:
-    - Domínio: últimos 30 dias até a data de hoje;
-    - Ticks explícitos a cada 7 dias, SEMPRE terminando em hoje;
-    - Formato 'dia mês' (ex.: 05 Dez) com meses em português.
-    """
-    # Janela fixa: últimos 30 dias até hoje
-    hoje = pd.Timestamp.today().normalize()
-    dmin = hoje - pd.Timedelta(days=30)
-    dmax = hoje
-
-    # Ticks semanais: hoje, hoje-7, hoje-14, ... dentro do domínio
-    valores_ticks = []
-    dia = hoje
-    while dia >= dmin:
-        valores_ticks.append(dia)
-        dia -= pd.Timedelta(days=7)
-    valores_ticks = list(reversed(valores_ticks))  # em ordem crescente
-
-    label_expr = (
-        "replace("
-        "replace("
-        "replace("
-        "replace("
-        "replace("
-        "replace("
-        "replace("
-        "replace("
-        "replace("
-        "replace("
-        "replace("
-        "replace(datum.label,"
-        "'Jan','Jan'),"
-        "'Feb','Fev'),"
-        "'Mar','Mar'),"
-        "'Apr','Abr'),"
-        "'May','Mai'),"
-        "'Jun','Jun'),"
-        "'Jul','Jul'),"
-        "'Aug','Ago'),"
-        "'Sep','Set'),"
-        "'Oct','Out'),"
-        "'Nov','Nov'),"
-        "'Dec','Dez')"
-    )
-
-    x_axis = alt.Axis(
-        title="",
-        format="%d %b",
-        values=valores_ticks,  # ticks explícitos (hoje, -7, -14, ...)
-        labelExpr=label_expr,
-    )
-
-    x_scale = alt.Scale(domain=[dmin, dmax])
-
-    return x_axis, x_scale
-
-
-
-
-def chart_serie_altair(
-    df,
-    col,
-    titulo,
-    ref_min=None,
-    ref_max=None,
-    ylim=None,
-    y_label=None,
-    value_format=".1f",
-    tooltip_label=None,
-):
-    """
-    Cria um gráfico Altair de série temporal com:
-      - eixo X padronizado (datas em PT-BR, ticks a cada 5 dias);
-      - faixa de referência opcional [ref_min, ref_max];
-      - personalização do rótulo do eixo Y e formatação de valores.
-    """
-    if df.empty or col not in df.columns:
-        return None
-
-    df_plot = df.copy()
-
-    if y_label is None:
-        y_label = "%"
-    if tooltip_label is None:
-        tooltip_label = "Valor"
-
-    x_axis, x_scale = _build_x_axis_and_scale(df_plot)
-    scale_y = alt.Scale(domain=ylim, nice=False) if ylim else alt.Undefined
-
-    base = alt.Chart(df_plot).encode(
-        x=alt.X("data:T", axis=x_axis, scale=x_scale)
-    )
-
-    camadas = []
-
-    # Faixa de referência, se fornecida
-    if (ref_min is not None) and (ref_max is not None):
-        df_plot["ref_min"] = ref_min
-        df_plot["ref_max"] = ref_max
-        faixa = base.mark_area(opacity=0.15).encode(
-            y=alt.Y("ref_min:Q", scale=scale_y),
-            y2=alt.Y2("ref_max:Q"),
-        )
-        camadas.append(faixa)
-
-    # Linha principal
-    linha = base.mark_line().encode(
-        y=alt.Y(f"{col}:Q", title=y_label, scale=scale_y),
-    )
-    camadas.append(linha)
-
-    # Pontos
-    pontos = base.mark_point(size=60).encode(
-        y=alt.Y(f"{col}:Q", scale=scale_y),
-        tooltip=[
-            alt.Tooltip("data:T", title="Data"),
-            alt.Tooltip(f"{col}:Q", title=tooltip_label, format=value_format),
-        ],
-    )
-    camadas.append(pontos)
-
-    # Rótulos numéricos sobre os pontos
-    textos = base.mark_text(dy=-20, fontSize=10, color="white").encode(
-        y=alt.Y(f"{col}:Q", scale=scale_y),
-        text=alt.Text(f"{col}:Q", format=value_format),
-    )
-    camadas.append(textos)
-
-    chart = alt.layer(*camadas).properties(
-        height=250,
-        title=titulo,
-    )
-
-    return chart.interactive()
-
-
-def diagnostico_serie(df, col, ref_min, ref_max, nome):
-    """
-    Gera um texto de diagnóstico para a série usando a faixa [ref_min, ref_max].
-
-    Inclui:
-    - contagem de pontos dentro / acima / abaixo da faixa;
-    - análise da média dos 2 últimos registros;
-    - alerta nutricional específico para cada ingrediente (milho, farelo, calcário, núcleo).
-    """
-    if df.empty or col not in df.columns:
-        return f"Diagnóstico para {nome}: série sem dados suficientes."
-
-    y = df[col].dropna()
-    if y.empty:
-        return f"Diagnóstico para {nome}: série sem dados válidos (após remoção de NaN)."
-
-    dentro = ((y >= ref_min) & (y <= ref_max)).sum()
-    acima = (y > ref_max).sum()
-    abaixo = (y < ref_min).sum()
-    total = len(y)
-
-    partes = []
-    partes.append(
-        f"No período considerado (últimos **{total} registros**), "
-        f"**{dentro}** pontos ficaram **dentro** da faixa alvo "
-        f"({ref_min:.1f}–{ref_max:.1f} %), "
-        f"**{acima}** acima e **{abaixo}** abaixo."
-    )
-
-    if dentro == total:
-        partes.append("A mistura está **bem ajustada** em torno da faixa definida.")
-    elif acima + abaixo > dentro:
-        partes.append("Há **alta variabilidade** em relação à formulação recomendada.")
-    else:
-        partes.append(
-            "A maior parte dos dias está próxima da formulação ideal, "
-            "mas ainda há espaço para ajustes finos."
-        )
-
-    if len(y) >= 2:
-        ultimos = y.tail(2)
-        janela_desc = "2 últimos registros"
-    else:
-        ultimos = y
-        janela_desc = "registros disponíveis"
-
-    media_ultimos = ultimos.mean()
-    partes.append(
-        f"A média dos **{janela_desc}** é **{media_ultimos:.1f} %**."
-    )
-
-    if media_ultimos > ref_max:
-        tendencia = "acima"
-    elif media_ultimos < ref_min:
-        tendencia = "abaixo"
-    else:
-        tendencia = "dentro"
-
-    nome_lower = nome.lower()
-
-    alerta = ""
-    if tendencia == "acima":
-        if "milho" in nome_lower:
-            alerta = (
-                "Tendência recente de **excesso de milho**. "
-                "Isso aumenta a densidade energética da dieta, favorecendo deposição de gordura, "
-                "queda de persistência de postura e maior risco de ovos com casca frágil "
-                "se farelo de soja e calcário não acompanham o ajuste."
-            )
-        elif "farelo" in nome_lower:
-            alerta = (
-                "Tendência recente de **excesso de farelo de soja**. "
-                "Dietas muito proteicas podem aumentar custo, sobrecarregar metabolismo e "
-                "não se converter em ganho de produção se a energia não estiver alinhada."
-            )
-        elif "calcário" in nome_lower or "calcario" in nome_lower:
-            alerta = (
-                "Tendência recente de **excesso de calcário**. "
-                "Excesso de cálcio pode reduzir consumo, interferir na absorção de outros minerais "
-                "e comprometer desempenho se não houver ajuste cuidadoso do restante da formulação."
-            )
-        elif "núcleo" in nome_lower or "nucleo" in nome_lower:
-            alerta = (
-                "Tendência recente de **excesso de núcleo**. "
-                "Concentração muito alta de núcleo eleva o custo e pode gerar desbalanços de "
-                "vitaminas e minerais, sem ganho proporcional em desempenho."
-            )
-        else:
-            alerta = (
-                "A média recente está **acima da faixa alvo**, sugerindo excesso deste componente "
-                "na dieta. Avaliar impacto em custo e equilíbrio energia/proteína/minerais."
-            )
-
-    elif tendencia == "abaixo":
-        if "milho" in nome_lower:
-            alerta = (
-                "Tendência recente de **déficit de milho**. "
-                "Energia insuficiente leva a menor consumo efetivo, ovos menores e queda de produção, "
-                "especialmente em períodos frios ou de maior exigência."
-            )
-        elif "farelo" in nome_lower:
-            alerta = (
-                "Tendência recente de **déficit de farelo de soja**. "
-                "Proteína abaixo do recomendado reduz massa de ovo, piora a conversão alimentar "
-                "e compromete a persistência de postura."
-            )
-        elif "calcário" in nome_lower or "calcario" in nome_lower:
-            alerta = (
-                "Tendência recente de **déficit de calcário**. "
-                "Isso aumenta o risco de cascas finas, trincadas e maior percentual de ovos não conformes, "
-                "além de mobilização de cálcio ósseo das aves."
-            )
-        elif "núcleo" in nome_lower or "nucleo" in nome_lower:
-            alerta = (
-                "Tendência recente de **déficit de núcleo**. "
-                "Pode haver carência de vitaminas, minerais e aditivos, refletindo em queda de imunidade, "
-                "pior qualidade de casca e maior sensibilidade a estresses."
-            )
-        else:
-            alerta = (
-                "A média recente está **abaixo da faixa alvo**, sugerindo deficiência deste componente "
-                "na dieta. Monitorar possíveis quedas de desempenho e qualidade dos ovos."
-            )
-    else:
-        alerta = (
-            "A média recente permanece **dentro da faixa alvo**, indicando tendência de estabilidade. "
-            "Manter o acompanhamento para evitar deriva gradual ao longo das próximas semanas."
-        )
-
-    partes.append(alerta)
-
-    return " ".join(partes)
-
-def diagnostico_consumo(df, col, ref_min, ref_max, nome="Consumo de ração"):
-    """
-    Gera um texto de diagnóstico para o CONSUMO de ração (g/ave/dia),
-    usando a faixa [ref_min, ref_max].
-
-    Inclui:
-    - contagem de dias abaixo / dentro / acima da faixa;
-    - análise da média dos 2 últimos registros;
-    - interpretação zootécnica para consumo baixo, alto ou dentro da faixa.
-    """
-    if df.empty or col not in df.columns:
-        return f"Diagnóstico para {nome}: série sem dados suficientes."
-
-    y = df[col].dropna()
-    if y.empty:
-        return f"Diagnóstico para {nome}: série sem dados válidos (após remoção de NaN)."
-
-    # -------------------------------------------------------------------------
-    # 1) Estatística global: quantos dias em cada faixa
-    # -------------------------------------------------------------------------
-    dentro = ((y >= ref_min) & (y <= ref_max)).sum()
-    acima = (y > ref_max).sum()
-    abaixo = (y < ref_min).sum()
-    total = len(y)
-
-    partes = []
-    partes.append(
-        f"No período analisado (**{total} dias** com dados válidos), "
-        f"**{abaixo}** dia(s) ficaram **abaixo** da faixa alvo "
-        f"({ref_min:.0f}–{ref_max:.0f} g/ave/dia), "
-        f"**{dentro}** dentro e **{acima}** **acima**."
-    )
-
-    if dentro == total:
-        partes.append(
-            "O padrão de consumo está **bem ajustado** à faixa recomendada, "
-            "o que tende a favorecer estabilidade de produção e conversão alimentar."
-        )
-    elif abaixo > acima:
-        partes.append(
-            "Predomina consumo **abaixo** da faixa ideal, sugerindo possível limitação de ingestão "
-            "ou problemas pontuais de manejo/ambiência."
-        )
-    elif acima > abaixo:
-        partes.append(
-            "Predomina consumo **acima** da faixa ideal, indicando risco de **desperdício de ração** "
-            "e aumento de custo por dúzia de ovos se a produção não acompanha esse aumento."
-        )
-    else:
-        partes.append(
-            "Há **variabilidade relevante** no consumo, alternando dias abaixo e acima da faixa. "
-            "Vale investigar se há mudanças de manejo, temperatura ou formulação ao longo do período."
-        )
-
-    # -------------------------------------------------------------------------
-    # 2) Tendência recente: média dos 2 últimos registros
-    # -------------------------------------------------------------------------
-    if len(y) >= 2:
-        ultimos = y.tail(2)
-        janela_desc = "2 últimos registros"
-    else:
-        ultimos = y
-        janela_desc = "registros disponíveis"
-
-    media_ultimos = ultimos.mean()
-    partes.append(
-        f"A média dos **{janela_desc}** é **{media_ultimos:.1f} g/ave/dia**."
-    )
-
-    if media_ultimos > ref_max:
-        tendencia = "acima"
-    elif media_ultimos < ref_min:
-        tendencia = "abaixo"
-    else:
-        tendencia = "dentro"
-
-    # -------------------------------------------------------------------------
-    # 3) Interpretação zootécnica da tendência recente
-    # -------------------------------------------------------------------------
-    if tendencia == "abaixo":
-        alerta = (
-            "A **tendência recente é de consumo ABAIXO da faixa ideal**. "
-            "Isso pode indicar:\n"
-            "- **Oferta diária de ração insuficiente**, os comedouros não estão recebendo ração suficiente no momento do trato;\n"
-            "- **Baixa ingestão** por competição em comedouros ou densidade elevada;\n"
-            "- Ambiência desfavorável (calor excessivo, frio intenso ou variações bruscas);\n"
-            "- Problemas de acesso à ração (altura de comedouros, segregação de lotes, falhas na distribuição);\n"
-            "- Palatabilidade ou granulometria inadequadas, levando as aves a selecionar ou desperdiçar parte da mistura.\n\n"
-            "Do ponto de vista produtivo, consumo baixo tende a resultar em **queda de produção**, "
-            "**ovos menores** e **pior persistência de postura** se mantido por vários dias. "
-            "Recomenda-se conferir se a **quantidade oferecida por trato** está adequada e se os comedouros "
-            "não permanecem vazios por longos períodos."
-        )
-    elif tendencia == "acima":
-        alerta = (
-            "A **tendência recente é de consumo ACIMA da faixa ideal**. "
-            "Situações possíveis:\n"
-            "- **Excesso de ração ofertada em cada trato**, com comedouros permanecendo cheios e "
-            "sobras significativas ao final do dia (ração velha, fina e mais sujeita a seleção e desperdício);\n"
-            "- Ajustes de manejo que aumentaram o acesso à ração, mas sem controle fino de quantidade ofertada;\n"
-            "- Granulometria muito fina ou muito grossa, levando a **desperdício por seleção** e queda de eficiência;\n"
-            "- Formulação com densidade energética mais baixa, fazendo a ave comer mais para compensar.\n\n"
-            "Se o aumento de consumo **não vier acompanhado de ganho proporcional em produção**, "
-            "há risco de **piorar a conversão alimentar** e **elevar o custo por dúzia de ovos**. "
-            "Vale revisar se há **sobras excessivas nos comedouros** e ajustar a quantidade fornecida por trato."
-        )
-    else:  # dentro da faixa
-        alerta = (
-            "A **tendência recente permanece DENTRO da faixa recomendada**, "
-            "o que sugere um **ajuste adequado entre ambiência, manejo, quantidade ofertada e formulação**. "
-            "Vale manter o monitoramento contínuo para captar rapidamente qualquer desvio, "
-            "especialmente em períodos de mudança de temperatura, fase de postura ou alteração de ração."
-        )
-
-
-    partes.append(alerta)
-
-    return " ".join(partes)
-
-
-def bloco_instagram_mistura(df, col, titulo, ref_min, ref_max, texto_ref, nome_curto, ylim=None):
-    """
-    Renderiza um "card" vertical no estilo linha do tempo (Instagram):
-
-    - Título do componente (ex.: 'Milho (%)')
-    - Texto de referência (valores alvo / fórmula)
-    - Gráfico temporal (Altair) com faixa [ref_min, ref_max]
-    - Diagnóstico automático abaixo do gráfico
-    """
-    st.markdown(f"### {titulo}")
-    st.markdown(texto_ref)
-
-    chart = chart_serie_altair(
-        df=df,
-        col=col,
-        titulo=titulo,
-        ref_min=ref_min,
-        ref_max=ref_max,
-        ylim=ylim,
-        y_label="%",
-        value_format=".1f",
-        tooltip_label=f"{nome_curto} (%)",
-    )
-    if chart is not None:
-        st.altair_chart(chart, use_container_width=True)
-
-    diag = diagnostico_serie(df, col, ref_min, ref_max, nome_curto)
-    st.markdown(f"**Diagnóstico ({nome_curto}):** {diag}")
-
-    st.markdown("---")
-
-
-# =============================================================================
-# PARTE 5 – SEÇÃO 1: MISTURA DA RAÇÃO
-# =============================================================================
-st.markdown("<div id='mistura' style='position: relative; top: -40px;'></div>", unsafe_allow_html=True)
-st.subheader("Mistura da ração · linha do tempo")
-
-caminho_mistura = os.path.join(PASTA_DADOS, "mistura_racao.csv")
-
-if not os.path.exists(caminho_mistura):
-    st.warning(
-        "Arquivo `mistura_racao.csv` não encontrado na pasta de dados. "
-        "Crie-o com as colunas: data,%_milho,%_calcario,%_soja,%_nucleo."
-    )
-else:
-    df_mist = pd.read_csv(caminho_mistura)
-
-    df_mist.columns = [c.strip() for c in df_mist.columns]
-
-    colunas_alvo_mist = {
-        "data": ["data", "Data", "DATA"],
-        "milho_pct": ["milho_pct", "%_milho", "Milho", "Milho (%)", "milho (%)"],
-        "calcario_pct": ["calcario_pct", "%_calcario", "Calcário", "Calcario", "Calcário (%)"],
-        "farelo_soja_pct": [
-            "farelo_soja_pct",
-            "%_soja",
-            "Farelo de soja",
-            "Farelo de Soja (%)",
-        ],
-        "nucleo_pct": ["nucleo_pct", "%_nucleo", "Núcleo", "Nucleo", "Núcleo (%)"],
-    }
-
-    df_norm = pd.DataFrame()
-    for destino, candidatos in colunas_alvo_mist.items():
-        encontrado = None
-        for nome in candidatos:
-            if nome in df_mist.columns:
-                encontrado = nome
-                break
-        if encontrado is None:
-            st.error(
-                f"Não encontrei coluna correspondente a '{destino}'. "
-                f"Colunas atuais em mistura_racao.csv: {list(df_mist.columns)}"
-            )
-            st.stop()
-        else:
-            df_norm[destino] = df_mist[encontrado]
-
-    df_mist = df_norm
-
-    for c in ["milho_pct", "farelo_soja_pct", "calcario_pct", "nucleo_pct"]:
-        df_mist[c] = (
-            df_mist[c]
-            .astype(str)
-            .str.replace(",", ".", regex=False)
-            .astype(float)
-        )
-
-    df_mist["data"] = pd.to_datetime(
-        df_mist["data"],
-        format="%d/%m/%Y",
-        dayfirst=True,
-        errors="raise",
-    )
-
-    df_mist = df_mist.sort_values("data")
-    df_mist = df_mist.tail(10).copy()
-
-    bloco_instagram_mistura(
-        df=df_mist,
-        col="milho_pct",
-        titulo="Milho (%)",
-        ref_min=59,
-        ref_max=67,
-        texto_ref="""
-        **Referência teórica:** 62 % (faixa alvo: 59% – 67 %).  
-        **Função:** principal fonte de energia da dieta.
-        """,
-        nome_curto="Milho",
-        ylim=(40, 90),
-    )
-
-    bloco_instagram_mistura(
-        df=df_mist,
-        col="farelo_soja_pct",
-        titulo="Farelo de soja (%)",
-        ref_min=22,
-        ref_max=26,
-        texto_ref="""
-        **Referência teórica:** 24 % (faixa alvo: 22.8% – 25.2%)  
-        **Função:** principal fonte de proteína da formulação.
-        """,
-        nome_curto="Farelo de soja",
-        ylim=(0, 40),
-    )
-
-    bloco_instagram_mistura(
-        df=df_mist,
-        col="calcario_pct",
-        titulo="Calcário (%)",
-        ref_min=9,
-        ref_max=11,
-        texto_ref="""
-        **Referência teórica:** 10 % (faixa alvo: 9.5% – 10.5%)  
-        **Função:** oferta de cálcio para qualidade de casca.
-        """,
-        nome_curto="Calcário",
-        ylim=(0, 20),
-    )
-
-    bloco_instagram_mistura(
-        df=df_mist,
-        col="nucleo_pct",
-        titulo="Núcleo (%)",
-        ref_min=3,
-        ref_max=5,
-        texto_ref="""
-        **Referência teórica:** 4 % (faixa alvo: 3–5 %)  
-        **Função:** vitaminas, minerais e aditivos concentrados.
-        """,
-        nome_curto="Núcleo",
-        ylim=None,
-    )
-
-
-# =============================================================================
-# PARTE 6 – SEÇÃO 2: CONSUMO
-# =============================================================================
-# =============================================================================
-# PARTE 6 – SEÇÃO 2: CONSUMO
-# =============================================================================
-st.markdown("<div id='consumo' style='position: relative; top: -40px;'></div>", unsafe_allow_html=True)
-st.markdown("### Consumo de ração (g/ave/dia)")
-
-st.markdown("""
-**Referência de manejo:** faixa ideal de **105–115 g/ave/dia**.  
-**Função:** garantir ingestão suficiente para atender o requerimento de energia e nutrientes,
-mantendo produção, peso corporal e qualidade de casca adequados.
-""")
-
-caminho_consumo = os.path.join(PASTA_DADOS, "consumo_racao.csv")
-
-if not os.path.exists(caminho_consumo):
-    st.warning(
-        "Arquivo `consumo_racao.csv` não encontrado na pasta de dados. "
-        "Crie-o com as colunas: data,consumo_g_ave_dia."
-    )
-else:
-    df_consumo = pd.read_csv(caminho_consumo)
-
-    # Remove espaços dos nomes de coluna
-    df_consumo.columns = [c.strip() for c in df_consumo.columns]
-
-    if not {"data", "consumo_g_ave_dia"}.issubset(df_consumo.columns):
-        st.error(
-            "O arquivo `consumo_racao.csv` deve conter as colunas "
-            "`data` e `consumo_g_ave_dia`."
-        )
-    else:
-        # Converte data
-        df_consumo["data"] = pd.to_datetime(
-            df_consumo["data"],
-            format="%d/%m/%Y",
-            dayfirst=True,
-            errors="coerce",
-        )
-        df_consumo = df_consumo.dropna(subset=["data"])
-
-        # Garante numérico, aceitando vírgula
-        df_consumo["consumo_g_ave_dia"] = (
-            df_consumo["consumo_g_ave_dia"]
-            .astype(str)
-            .str.replace(",", ".", regex=False)
-            .astype(float)
-        )
-
-        # Aplica o mesmo filtro de período da página
-        mask_consumo = (
-            (df_consumo["data"].dt.date >= ini)
-            & (df_consumo["data"].dt.date <= fim)
-        )
-        df_consumo_filtrado = df_consumo[mask_consumo].copy()
-
-        if df_consumo_filtrado.empty:
-            st.info("Não há dados de `consumo_racao.csv` dentro do período selecionado.")
-        else:
-            # Gráfico em linha com faixa de referência
-            chart_consumo = chart_serie_altair(
-                df=df_consumo_filtrado,
-                col="consumo_g_ave_dia",
-                titulo="Consumo de ração (g/ave/dia)",
-                ref_min=CONSUMO_MIN,
-                ref_max=CONSUMO_MAX,
-                ylim=(80, 140),
-                y_label="Consumo (g/ave/dia)",
-                value_format=".1f",
-                tooltip_label="Consumo (g/ave/dia)",
-            )
-
-            if chart_consumo is not None:
-                st.altair_chart(chart_consumo, use_container_width=True)
-
-            # Estatística para o diagnóstico
-            consumo_medio_periodo = df_consumo_filtrado["consumo_g_ave_dia"].mean()
-
-            diag_consumo = diagnostico_consumo(
-                df=df_consumo_filtrado,
-                col="consumo_g_ave_dia",
-                ref_min=CONSUMO_MIN,
-                ref_max=CONSUMO_MAX,
-                nome="Consumo de ração (g/ave/dia)",
-            )
-
-            # Somente o diagnóstico automático abaixo do gráfico
-            st.markdown(f"**Diagnóstico (Consumo de ração):** {diag_consumo}")
-
-            st.markdown("---")
-
-
-# =============================================================================
-# PARTE 7 – SEÇÃO 3: PRODUÇÃO E PERDAS (VERTICAL)
-# =============================================================================
-st.markdown("<div id='producao' style='position: relative; top: -40px;'></div>", unsafe_allow_html=True)
-st.subheader("Produção e perdas de ovos · linha do tempo")
-
-if {"ovos_granja", "ovos_escola"}.issubset(dados_filtrados.columns):
-    df_prod = dados_filtrados[["data", "ovos_granja", "ovos_escola"]].dropna(subset=["ovos_granja", "ovos_escola"]).copy()
-
-    if not df_prod.empty:
-        df_long = df_prod.melt(id_vars="data", value_vars=["ovos_granja", "ovos_escola"], var_name="origem", value_name="ovos")
-
-        x_axis, x_scale = _build_x_axis_and_scale(df_long)
-
-        chart_prod = (
-            alt.Chart(df_long)
-            .encode(
-                x=alt.X("data:T", axis=x_axis, scale=x_scale),
-                y=alt.Y("ovos:Q", title="Produção de ovos (unid./dia)"),
-                color=alt.Color(
-                    "origem:N",
-                    title="Origem",
-                    scale=alt.Scale(domain=["ovos_granja", "ovos_escola"],
-                                    range=["#1f77b4", "#ff7f0e"]),
-                    legend=alt.Legend(labelExpr="replace(replace(datum.label,'ovos_granja','Granja'),'ovos_escola','Escola')"),
-                ),
-                tooltip=[
-                    alt.Tooltip("data:T", title="Data"),
-                    alt.Tooltip("origem:N", title="Origem"),
-                    alt.Tooltip("ovos:Q", title="Ovos", format=".0f"),
-                ],
-            )
-            .mark_line()
-        )
-
-        pontos_prod = (
-            alt.Chart(df_long)
-            .encode(
-                x=alt.X("data:T", axis=x_axis, scale=x_scale),
-                y=alt.Y("ovos:Q"),
-                color="origem:N",
-            )
-            .mark_point(size=50)
-        )
-
-        st.markdown("### Produção diária de ovos (granja vs. escola)")
-        st.altair_chart((chart_prod + pontos_prod).properties(height=300), use_container_width=True)
-
-        st.markdown(
-            """
-            **Referência conceitual:**  
-            - A curva da escola deveria acompanhar de perto a curva da granja.  
-            - Diferenças sistemáticas indicam perdas no transporte, registro ou manejo.
-            """
-        )
-
-    if "perda_ovos" in dados_filtrados.columns:
-        df_perdas = dados_filtrados[["data", "perda_ovos"]].dropna(subset=["perda_ovos"]).copy()
-
-        chart_perdas = chart_serie_altair(
-            df=df_perdas,
-            col="perda_ovos",
-            titulo="Perdas no trajeto (granja → escola)",
-            ref_min=None,
-            ref_max=None,
-            ylim=None,
-            y_label="Perdas (ovos)",
-            value_format=".0f",
-            tooltip_label="Perdas (ovos)",
-        )
-
-        st.markdown("### Perdas no trajeto (granja → escola)")
-        if chart_perdas is not None:
-            st.altair_chart(chart_perdas, use_container_width=True)
-
-    total_granja = dados_filtrados["ovos_granja"].sum()
-    total_escola = dados_filtrados["ovos_escola"].sum()
-    total_perdas = dados_filtrados["perda_ovos"].sum()
-
-    st.markdown(
-        f"""
-        **Diagnóstico de produção e perdas (período filtrado):**  
-
-        - Total produzido na granja: **{total_granja:.0f} ovos**  
-        - Total registrado na escola: **{total_escola:.0f} ovos**  
-        - Diferença absoluta (perdas acumuladas): **{total_perdas:.0f} ovos**  
-
-        Se a diferença for recorrente e significativa, vale investigar:  
-        - acondicionamento das bandejas e proteção durante o transporte;  
-        - conferência de contagem na saída da granja e na chegada à escola;  
-        - registro diário em planilhas para rastrear dias mais críticos.
-        """
-    )
-else:
-    st.info("Colunas 'ovos_granja' e 'ovos_escola' não encontradas nos dados.")
-
-st.markdown("---")
-
-
-# =============================================================================
-# PARTE 8 – SEÇÃO 4: QUALIDADE & SANIDADE (VERTICAL)
-# =============================================================================
-st.markdown("<div id='qualidade' style='position: relative; top: -40px;'></div>", unsafe_allow_html=True)
-st.subheader("Qualidade dos ovos & sanidade · linha do tempo")
-
-if "pct_defeituosos" in dados_filtrados.columns:
-    df_qual = dados_filtrados[["data", "pct_defeituosos"]].dropna(subset=["pct_defeituosos"]).copy()
-
-    chart_qual = chart_serie_altair(
-        df=df_qual,
-        col="pct_defeituosos",
-        titulo="Percentual de ovos não conformes (%)",
-        ref_min=0,
-        ref_max=5,
-        ylim=None,
-        y_label="% de ovos não conformes",
-        value_format=".1f",
-        tooltip_label="% não conformes",
-    )
-
-    if chart_qual is not None:
-        st.altair_chart(chart_qual, use_container_width=True)
-
-    st.markdown(
-        """
-        **Referência prática:**  
-        - Idealmente, o percentual de ovos não conformes deve ser mantido **o mais baixo possível**,  
-          tipicamente abaixo de **3–5%**, dependendo do sistema de produção.  
-        - Picos de defeitos podem estar associados a problemas de nutrição, sanidade ou manejo.
-        """
-    )
-
-col_q1, col_q2 = st.columns(2)
-with col_q1:
-    if "ovos_defeituosos" in dados_filtrados.columns:
-        total_def = dados_filtrados["ovos_defeituosos"].sum()
-        st.metric("Total de ovos não conformes (período)", f"{total_def:.0f}")
-with col_q2:
-    if "aves_doentes" in dados_filtrados.columns:
-        total_doentes = dados_filtrados["aves_doentes"].sum()
-        st.metric("Soma de aves doentes observadas", f"{total_doentes:.0f}")
-
-st.markdown("### Tabela detalhada (dados filtrados)")
-st.dataframe(
-    dados_filtrados[
-        [
-            "data",
-            "milho_pct",
-            "farelo_soja_pct",
-            "calcario_pct",
-            "nucleo_pct",
-            "consumo_g_ave_dia",
-            "ovos_granja",
-            "ovos_escola",
-            "perda_ovos",
-            "ovos_quebrados",
-            "ovos_sem_casca",
-            "ovos_deformados",
-            "ovos_defeituosos",
-            "pct_defeituosos",
-            "aves_doentes",
-            "__arquivo_origem",
-        ]
-        if "__arquivo_origem" in dados_filtrados.columns
-        else dados_filtrados.columns
-    ],
-    use_container_width=True,
-)
-
-st.markdown("---")
-st.caption(
-    "Para atualizar o dashboard, basta adicionar novos arquivos .csv na pasta `dados/` "
-    "seguindo o mesmo padrão de colunas. Ao recarregar a página, os gráficos são atualizados automaticamente."
-)
-
-
-# =====================================================================
-# DISPARA O SCROLL APÓS DESENHAR TODA A PÁGINA
-# =====================================================================
-if secao == "Topo":
-    scroll_to("topo")
-elif secao == "Mistura da ração":
-    scroll_to("mistura")
-elif secao == "Consumo":
-    scroll_to("consumo")
-elif secao == "Produção e perdas":
-    scroll_to("producao")
-elif secao == "Qualidade & sanidade":
-    scroll_to("qualidade")
+# =============================================================================
+# PARTE 1 – IMPORTS E CONFIGURAÇÃO BÁSICA
+# =============================================================================
+import cProfile
+import hashlib
+import io
+import base64
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+import weakref
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+import altair as alt
+from datetime import timedelta
+import streamlit.components.v1 as components
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # snapshot colunar e exportação Parquet são opcionais
+    pa = feather = pq = None
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # sem watchdog, o observador verifica a pasta periodicamente
+    FileSystemEventHandler = Observer = None
+try:
+    import duckdb
+except ImportError:  # banco DuckDB é opcional (SQLite vem com o Python)
+    duckdb = None
+try:
+    import openpyxl
+except ImportError:  # sem openpyxl, a exportação XLSX fica indisponível
+    openpyxl = None
+try:
+    import pyinstrument
+except ImportError:  # sem pyinstrument, o perfil é gravado com cProfile
+    pyinstrument = None
+
+# Séries longas (anos de dados diários) passam do limite padrão de 5000 linhas
+# do Altair; o volume enviado ao navegador é controlado por "Reduzir pontos".
+alt.data_transformers.disable_max_rows()
+
+
+# Configuração da página do Streamlit
+st.set_page_config(
+    page_title="Avicultura - Dashboard automático",
+    layout="wide",
+)
+
+# Âncora de topo para navegação
+st.markdown("<div id='topo' style='position: relative; top: -30px;'></div>", unsafe_allow_html=True)
+
+st.title("Avicultura · Dashboard automático a partir de CSV")
+st.caption(
+    "Os gráficos e indicadores são gerados automaticamente a partir dos arquivos CSV na pasta `dados/`."
+)
+
+
+# =============================================================================
+# PARTE 2 – LEITURA GLOBAL DOS ARQUIVOS CSV E PRÉ-PROCESSAMENTO
+# =============================================================================
+def numero_ambiente(nome, padrao, tipo=int):
+    """
+    Valor numérico da variável de ambiente `nome`, ou `padrao` se ela não
+    existir ou não for um número válido (a página abre mesmo com um valor
+    errado, em vez de falhar na importação).
+    """
+    try:
+        return tipo(os.environ.get(nome, padrao))
+    except ValueError:
+        return padrao
+
+
+PASTA_DADOS = os.environ.get("AVICULTURA_PASTA_DADOS", "dados")
+
+# Snapshot colunar opcional (Arrow IPC) com os dados já tipados.
+# Ative com a variável de ambiente AVICULTURA_SNAPSHOT=1.
+USAR_SNAPSHOT = os.environ.get("AVICULTURA_SNAPSHOT", "0") == "1"
+PASTA_SNAPSHOT = os.path.join(PASTA_DADOS, ".snapshot")
+
+# Versão do formato dos caches em disco (snapshot e banco): ao mudar tipos
+# ou colunas gravadas, incremente para que os caches antigos sejam refeitos
+VERSAO_CACHE = 4
+
+# Banco analítico embutido opcional: com AVICULTURA_BACKEND=sqlite (ou duckdb)
+# os CSV são gravados em um banco local e período, KPIs, totais e tabela viram
+# consultas; só as linhas e colunas que cada bloco usa chegam ao pandas.
+BACKEND = os.environ.get("AVICULTURA_BACKEND", "pandas").lower()
+USAR_BANCO = BACKEND in ("sqlite", "duckdb")
+PASTA_BANCO = os.path.join(PASTA_DADOS, ".banco")
+
+# Medição das etapas do pipeline: painel "Modo diagnóstico" da barra lateral
+# (ligado por padrão com AVICULTURA_DEBUG=1) e benchmarks/medir_pipeline.py
+# (com AVICULTURA_MEDICOES=<arquivo>, cada etapa medida vira uma linha JSON).
+ARQUIVO_MEDICOES = os.environ.get("AVICULTURA_MEDICOES")
+DIAGNOSTICO_PADRAO = os.environ.get("AVICULTURA_DEBUG", "0") == "1"
+PASTA_PERFIS = os.environ.get("AVICULTURA_PASTA_PERFIS", "perfis")
+_lock_medicoes = threading.Lock()
+
+# Medidas da execução atual do script (só coletadas com o modo diagnóstico)
+diagnostico = {"ativo": False, "medidas": []}
+
+
+@contextmanager
+def etapa(nome):
+    """
+    Mede uma etapa: tempo, linhas processadas (preenchidas por quem mede, em
+    `medida["linhas"]`) e, com o modo diagnóstico, o pico de memória acima
+    do uso na entrada ("pico_mb") e a variação líquida entre entrada e saída
+    ("variacao_mb"), pelo tracemalloc (ver `_abrir_janela_memoria`). Como o
+    tracemalloc vale para o processo, ambos incluem o que outras threads
+    alocaram no mesmo intervalo.
+
+    Etapas podem se aninhar (ex.: "datas" dentro de "ingestao"): cada medida
+    é inclusiva. Sem modo diagnóstico nem AVICULTURA_MEDICOES, não mede nada.
+    """
+    medida = {"etapa": nome, "linhas": None}
+    if not (ARQUIVO_MEDICOES or diagnostico["ativo"]):
+        yield medida
+        return
+
+    janela = _abrir_janela_memoria() if diagnostico["ativo"] else None
+    inicio = time.perf_counter()
+    try:
+        yield medida
+    finally:
+        medida["segundos"] = time.perf_counter() - inicio
+        if janela is not None:
+            medida.update(_fechar_janela_memoria(janela))
+        if diagnostico["ativo"]:
+            diagnostico["medidas"].append(medida)
+        if ARQUIVO_MEDICOES:
+            with _lock_medicoes, open(ARQUIVO_MEDICOES, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"etapa": nome, "segundos": medida["segundos"], "linhas": medida["linhas"]}) + "\n")
+
+
+def _acumular_pico(registro):
+    """
+    Leva o pico global do tracemalloc (desde o último `reset_peak`) a todas
+    as janelas abertas e zera o pico. Chamada sob o lock do registro: como
+    toda abertura e fechamento de janela passa por aqui, cada janela acaba
+    com o máximo de todo o seu intervalo, mesmo com etapas aninhadas ou em
+    várias sessões ao mesmo tempo.
+    """
+    em_uso, pico = tracemalloc.get_traced_memory()
+    for janela in registro["janelas"]:
+        janela["pico"] = max(janela["pico"], pico)
+    tracemalloc.reset_peak()
+    return em_uso
+
+
+def _abrir_janela_memoria():
+    """Começa a acompanhar o pico de memória de uma etapa (None sem tracemalloc)."""
+    registro = registro_rastreamento()
+    with registro["lock"]:
+        if not tracemalloc.is_tracing():
+            return None
+        em_uso = _acumular_pico(registro)
+        janela = {"inicio": em_uso, "pico": em_uso}
+        registro["janelas"].append(janela)
+        return janela
+
+
+def _fechar_janela_memoria(janela):
+    """{"pico_mb", "variacao_mb"} da etapa cuja janela termina agora."""
+    registro = registro_rastreamento()
+    with registro["lock"]:
+        em_uso = _acumular_pico(registro) if tracemalloc.is_tracing() else None
+        registro["janelas"].remove(janela)
+    if em_uso is None:
+        return {}
+    return {
+        "pico_mb": (janela["pico"] - janela["inicio"]) / 2**20,
+        "variacao_mb": (em_uso - janela["inicio"]) / 2**20,
+    }
+
+
+def _contar_linhas(args, resultado):
+    """Linhas do primeiro DataFrame/Series entre os argumentos ou o resultado."""
+    resultados = resultado if isinstance(resultado, tuple) else (resultado,)
+    for valor in (*args, *resultados):
+        if isinstance(valor, (pd.DataFrame, pd.Series)):
+            return len(valor)
+    return None
+
+
+def medir_etapa(nome):
+    """Decorador: mede cada chamada da função como a etapa `nome`."""
+    def decorador(funcao):
+        @wraps(funcao)
+        def medida_funcao(*args, **kwargs):
+            with etapa(nome) as medida:
+                resultado = funcao(*args, **kwargs)
+                medida["linhas"] = _contar_linhas(args, resultado)
+            return resultado
+        return medida_funcao
+    return decorador
+
+
+@st.cache_resource(show_spinner=False)
+def registro_rastreamento():
+    """
+    Sessões que pedem o rastreamento de memória. O tracemalloc vale para o
+    processo inteiro: liga quando a primeira sessão pede (0 -> 1) e desliga
+    quando a última deixa de pedir (1 -> 0), sob o lock. "janelas": etapas
+    em medição (ver `_acumular_pico`); o pico só é zerado sob o mesmo lock.
+    """
+    return {"lock": threading.Lock(), "sessoes": 0, "iniciado_aqui": False, "janelas": []}
+
+
+class _ReferenciaRastreamento:
+    """Marca, no estado da sessão, que ela conta no registro de rastreamento."""
+
+    __slots__ = ("liberar", "__weakref__")
+
+
+def _liberar_rastreamento():
+    registro = registro_rastreamento()
+    with registro["lock"]:
+        registro["sessoes"] = max(0, registro["sessoes"] - 1)
+        if registro["sessoes"] == 0 and registro["iniciado_aqui"]:
+            tracemalloc.stop()
+            registro["iniciado_aqui"] = False
+
+
+def usar_rastreamento(ativo):
+    """
+    Registra se a sessão atual quer o rastreamento de memória. A contagem
+    da sessão é liberada ao desligar o modo ou quando a sessão termina (o
+    estado é descartado), como em `usar_conjunto`.
+    """
+    ref = st.session_state.get("_rastreamento_ref")
+    if ativo and ref is None:
+        registro = registro_rastreamento()
+        with registro["lock"]:
+            registro["sessoes"] += 1
+            # Rastreamento já ligado por fora (ex.: PYTHONTRACEMALLOC) não é desligado aqui
+            if registro["sessoes"] == 1 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                registro["iniciado_aqui"] = True
+        ref = _ReferenciaRastreamento()
+        ref.liberar = weakref.finalize(ref, _liberar_rastreamento)
+        st.session_state["_rastreamento_ref"] = ref
+    elif not ativo and ref is not None:
+        del st.session_state["_rastreamento_ref"]
+        ref.liberar()
+
+
+def iniciar_perfil():
+    """Começa a perfilar a execução atual (pyinstrument, se instalado; senão cProfile)."""
+    if pyinstrument is not None:
+        perfil = pyinstrument.Profiler()
+        perfil.start()
+    else:
+        perfil = cProfile.Profile()
+        perfil.enable()
+    return perfil
+
+
+def gravar_perfil(perfil):
+    """Encerra o perfil e grava em PASTA_PERFIS (.html do pyinstrument ou .prof do cProfile)."""
+    os.makedirs(PASTA_PERFIS, exist_ok=True)
+    base = os.path.join(PASTA_PERFIS, f"execucao-{pd.Timestamp.now():%Y%m%d-%H%M%S}")
+    if isinstance(perfil, cProfile.Profile):
+        perfil.disable()
+        perfil.dump_stats(base + ".prof")
+        return base + ".prof"
+    perfil.stop()
+    with open(base + ".html", "w", encoding="utf-8") as f:
+        f.write(perfil.output_html())
+    return base + ".html"
+
+
+if not os.path.isdir(PASTA_DADOS):
+    st.error(f"Pasta '{PASTA_DADOS}' não encontrada. Crie a pasta e coloque seus arquivos .csv nela.")
+    st.stop()
+
+
+
+def listar_csv():
+    """Lista ordenada dos CSV da pasta de dados (usada pela página e pelo observador)."""
+    return sorted(glob(os.path.join(PASTA_DADOS, "*.csv")))
+
+
+arquivos_csv = listar_csv()
+
+# -------------------- Sidebar: informações de arquivos ------------------------
+with st.sidebar:
+    st.header("Configurações")
+    st.write(f"📂 Pasta de dados: `{PASTA_DADOS}/`")
+    st.write(f"📄 Arquivos CSV encontrados: **{len(arquivos_csv)}**")
+    if not arquivos_csv:
+        st.warning("Nenhum arquivo CSV encontrado. Adicione pelo menos um arquivo na pasta.")
+        st.stop()
+
+# -------------------- Sidebar: modo diagnóstico --------------------
+inicio_execucao = time.perf_counter()
+perfil = None
+with st.sidebar:
+    diagnostico["ativo"] = st.checkbox(
+        "Modo diagnóstico (tempo e memória por etapa)",
+        value=DIAGNOSTICO_PADRAO,
+        key="modo_diagnostico",
+        help="Mostra no fim da barra lateral o tempo, as linhas e o pico de memória de "
+        "cada etapa. O rastreamento de memória deixa a página mais lenta (para todas as "
+        "sessões, enquanto alguma estiver com o modo ligado).",
+    )
+    usar_rastreamento(diagnostico["ativo"])
+    if diagnostico["ativo"]:
+        if st.button("Gravar perfil de uma execução", help=f"O perfil é salvo em `{PASTA_PERFIS}/`."):
+            perfil = iniciar_perfil()
+
+# -------------------- Leitura incremental dos arquivos --------------------
+# Esquema numérico declarado: coluna canônica -> dtype em memória.
+# Todas as seções convertem números por `converter_numericos`, usando este esquema.
+# float64: em float32, 95.2 viraria 95.199997 na tabela, na exportação e no banco.
+ESQUEMA_NUMERICO = {
+    "milho_pct": "float64",
+    "farelo_soja_pct": "float64",
+    "calcario_pct": "float64",
+    "nucleo_pct": "float64",
+    "consumo_g_ave_dia": "float64",
+    "ovos_granja": "float64",
+    "ovos_escola": "float64",
+    "ovos_quebrados": "float64",
+    "ovos_sem_casca": "float64",
+    "ovos_deformados": "float64",
+    "aves_doentes": "float64",
+    "aves_alojadas": "float64",
+}
+colunas_num = list(ESQUEMA_NUMERICO)
+
+# Representação compacta opcional de "dados" (AVICULTURA_COMPACTO=1):
+# contagens como inteiros anuláveis pequenos, percentuais e consumo em float32
+# e textos repetidos como categorias.
+MEMORIA_COMPACTA = os.environ.get("AVICULTURA_COMPACTO", "0") == "1"
+ESQUEMA_CONTAGENS = {
+    "ovos_granja": "UInt32",
+    "ovos_escola": "UInt32",
+    "ovos_quebrados": "UInt16",
+    "ovos_sem_casca": "UInt16",
+    "ovos_deformados": "UInt16",
+    "aves_doentes": "UInt16",
+    "aves_alojadas": "UInt32",
+}
+COLUNAS_CATEGORICAS = ["__arquivo_origem", "observacao"]
+# Em float32, 95.2 vira 95.199997: ao sair da memória (tela, gráficos,
+# exportação, banco, métricas derivadas) essas colunas voltam a float64
+# arredondadas em CASAS_DECIMAIS_COMPACTAS (ver `valores_exatos`).
+COLUNAS_FLOAT32 = ["milho_pct", "farelo_soja_pct", "calcario_pct", "nucleo_pct", "consumo_g_ave_dia"]
+CASAS_DECIMAIS_COMPACTAS = 4
+
+
+def valores_exatos(df):
+    """`df` com as colunas float32 em float64 arredondadas (o próprio `df` se não houver nenhuma)."""
+    colunas = [c for c in df.columns if df[c].dtype == np.float32]
+    if not colunas:
+        return df
+    return df.assign(**{c: df[c].astype("float64").round(CASAS_DECIMAIS_COMPACTAS) for c in colunas})
+
+# Nomes alternativos aceitos nos cabeçalhos (ex.: mistura_racao.csv usa "%_milho")
+ALIASES_COLUNAS = {
+    "data": ["data", "Data", "DATA"],
+    "milho_pct": ["milho_pct", "%_milho", "Milho", "Milho (%)", "milho (%)"],
+    "calcario_pct": ["calcario_pct", "%_calcario", "Calcário", "Calcario", "Calcário (%)"],
+    "farelo_soja_pct": [
+        "farelo_soja_pct",
+        "%_soja",
+        "Farelo de soja",
+        "Farelo de Soja (%)",
+    ],
+    "nucleo_pct": ["nucleo_pct", "%_nucleo", "Núcleo", "Nucleo", "Núcleo (%)"],
+}
+_ALIAS_PARA_CANONICO = {
+    alias: canonico for canonico, aliases in ALIASES_COLUNAS.items() for alias in aliases
+}
+
+# Decimal com vírgula entre aspas (ex.: "63,5" ou "1.234,5") denuncia CSV no padrão brasileiro
+_PADRAO_DECIMAL_VIRGULA = re.compile(rb'"\s*-?\d+(?:\.\d{3})*,\d+\s*"')
+# Num arquivo com vírgula decimal, valor sem vírgula só com grupos de milhar (ex.: 1.234)
+_PADRAO_SO_MILHAR = r"-?\d{1,3}(?:\.\d{3})+"
+TAMANHO_AMOSTRA_DECIMAL = 64 * 1024
+
+
+def normalizar_colunas(colunas):
+    """Remove espaços dos nomes de coluna e troca aliases pelo nome canônico."""
+    return [_ALIAS_PARA_CANONICO.get(c.strip(), c.strip()) for c in colunas]
+
+
+def detectar_decimal(amostra):
+    """Separador decimal do arquivo ("," ou "."), a partir de uma amostra em bytes."""
+    return "," if _PADRAO_DECIMAL_VIRGULA.search(amostra) else "."
+
+
+def opcoes_numericas_csv(decimal, colunas_data=("data",)):
+    """
+    Argumentos de `pd.read_csv` para converter números já na leitura (em C).
+    As colunas de data (`colunas_data`, nomes como estão no arquivo) são
+    lidas sempre como texto.
+
+    Com decimal "," o milhar "." não é passado ao `read_csv`: um único valor
+    com vírgula decidiria o arquivo todo, e um "95.2" sem aspas em outra
+    linha viraria 952. Colunas com algum ponto ficam como texto e são
+    convertidas valor a valor em `converter_numericos`.
+    """
+    return {"dtype": {col: str for col in colunas_data}, "decimal": decimal}
+
+
+def converter_numericos(df, decimal="."):
+    """
+    Aplica o ESQUEMA_NUMERICO ao DataFrame.
+
+    O caso comum já chega numérico do `read_csv` (decimal configurado por
+    arquivo) e só é reduzido ao dtype compacto. Colunas que ficaram como
+    texto (células com espaços, milhar, lixo) passam por uma limpeza
+    vetorizada valor a valor e `pd.to_numeric`; o que não for número vira NaN:
+    - com vírgula: padrão brasileiro ("1.234,5" -> 1234.5);
+    - sem vírgula, em arquivo de `decimal` ",": só grupos de milhar
+      ("1.234" -> 1234); qualquer outro ponto é decimal ("95.2" -> 95.2).
+    """
+    for col, dtype in ESQUEMA_NUMERICO.items():
+        if col not in df.columns:
+            continue
+        serie = df[col]
+        if not pd.api.types.is_numeric_dtype(serie):
+            texto = serie.astype(str).str.strip()
+            brasileiro = texto.str.contains(",", regex=False)
+            if decimal == ",":
+                brasileiro |= texto.str.fullmatch(_PADRAO_SO_MILHAR)
+            texto = texto.where(
+                ~brasileiro, texto.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+            )
+            serie = pd.to_numeric(texto, errors="coerce")
+        df[col] = serie.astype(dtype)
+        if MEMORIA_COMPACTA and col in ESQUEMA_CONTAGENS:
+            df[col] = contagem_compacta(df[col], ESQUEMA_CONTAGENS[col])
+        elif MEMORIA_COMPACTA and col in COLUNAS_FLOAT32:
+            df[col] = df[col].astype("float32")
+    return df
+
+
+def contagem_compacta(serie, dtype):
+    """
+    Converte uma coluna de contagem para inteiro anulável (`dtype`). Se houver
+    valor fracionário, negativo ou fora da faixa, a coluna fica como está
+    (float64), para não perder informação.
+    """
+    valores = serie.to_numpy(dtype="float64", na_value=np.nan)
+    validos = valores[~np.isnan(valores)]
+    faixa = np.iinfo(dtype.lower())
+    if validos.size and (
+        (validos != np.round(validos)).any() or validos.min() < faixa.min or validos.max() > faixa.max
+    ):
+        return serie
+    return serie.astype(dtype)
+
+
+def compactar_textos(df):
+    """Guarda as colunas de texto repetitivo (origem, observação) como categorias."""
+    for col in COLUNAS_CATEGORICAS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return df
+
+
+def concatenar_blocos(blocos):
+    """
+    `pd.concat` que preserva as colunas categóricas: com categorias diferentes
+    entre blocos o pandas voltaria a texto, então todos recebem antes a união
+    das categorias (as do primeiro bloco, normalmente a base, vêm primeiro).
+    """
+    blocos = list(blocos)
+    for col in COLUNAS_CATEGORICAS:
+        series = [b[col] for b in blocos if col in b.columns and isinstance(b[col].dtype, pd.CategoricalDtype)]
+        if len(series) < 2:
+            continue
+        categorias = series[0].cat.categories
+        for serie in series[1:]:
+            categorias = categorias.append(serie.cat.categories.difference(categorias))
+        blocos = [
+            b.assign(**{col: b[col].cat.set_categories(categorias)})
+            if col in b.columns and isinstance(b[col].dtype, pd.CategoricalDtype)
+            else b
+            for b in blocos
+        ]
+    return pd.concat(blocos, ignore_index=True)
+
+
+def ler_csv_tipado(caminho):
+    """
+    Lê um CSV inteiro com as mesmas regras da ingestão global:
+    nomes de coluna normalizados, separador decimal detectado e esquema numérico.
+    """
+    with open(caminho, "rb") as f:
+        conteudo = f.read()
+    cabecalho = pd.read_csv(io.BytesIO(conteudo), nrows=0).columns
+    colunas_data = [c for c, canonico in zip(cabecalho, normalizar_colunas(cabecalho)) if canonico == "data"]
+    opcoes = opcoes_numericas_csv(detectar_decimal(conteudo[:TAMANHO_AMOSTRA_DECIMAL]), colunas_data)
+    df = pd.read_csv(io.BytesIO(conteudo), **opcoes)
+    df.columns = normalizar_colunas(df.columns)
+    return converter_numericos(df, opcoes["decimal"])
+
+
+# Número de threads usadas para ler os arquivos em paralelo.
+# Ajuste com a variável de ambiente AVICULTURA_WORKERS (1 = leitura sequencial).
+NUM_WORKERS = max(1, numero_ambiente("AVICULTURA_WORKERS", min(8, os.cpu_count() or 1)))
+
+# Quantidade de bytes, imediatamente antes do ponto já lido, guardada para
+# conferir se o arquivo só recebeu linhas novas no final (e não foi reescrito).
+# Eles descartam de cara a maioria das reescritas; as que preservam o fim do
+# trecho lido são pegas pelo CRC32 de todo o prefixo (ver `_crc_prefixo`).
+TAMANHO_CONTROLE = 64
+TAMANHO_PEDACO_CRC = 1 << 20
+
+
+def _crc_prefixo(f, tamanho):
+    """CRC32 dos primeiros `tamanho` bytes de `f`, lidos em pedaços (deixa `f` nessa posição)."""
+    f.seek(0)
+    crc = 0
+    while tamanho > 0:
+        pedaco = f.read(min(tamanho, TAMANHO_PEDACO_CRC))
+        if not pedaco:
+            break
+        crc = zlib.crc32(pedaco, crc)
+        tamanho -= len(pedaco)
+    return crc
+
+
+# Formatos de data aceitos: (padrão do texto, formato strptime, descrição).
+# O formato de cada arquivo é detectado UMA vez a partir de uma amostra e a
+# coluna inteira é convertida com formato fixo (caminho vetorizado rápido).
+FORMATOS_DATA = [
+    (r"\d{1,2}/\d{1,2}/\d{4}", "%d/%m/%Y", "dd/mm/aaaa"),
+    (r"\d{4}-\d{1,2}-\d{1,2}", "%Y-%m-%d", "aaaa-mm-dd (ISO)"),
+    (r"\d{1,2}-\d{1,2}-\d{4}", "%d-%m-%Y", "dd-mm-aaaa"),
+    (r"\d{1,2}/\d{1,2}/\d{2}", "%d/%m/%y", "dd/mm/aa"),
+    (r"\d{1,2}-\d{1,2}-\d{2}", "%d-%m-%y", "dd-mm-aa"),
+    (r"\d{4}/\d{1,2}/\d{1,2}", "%Y/%m/%d", "aaaa/mm/dd"),
+    (r"\d{1,2}\.\d{1,2}\.\d{4}", "%d.%m.%Y", "dd.mm.aaaa"),
+]
+TAMANHO_AMOSTRA_DATA = 200
+
+
+def detectar_formato_data(valores):
+    """
+    Escolhe, entre FORMATOS_DATA, o formato que converte mais valores de uma
+    amostra do início da coluna. Em caso de empate vale a ordem da lista
+    (dd/mm/aaaa primeiro). Retorna None se nenhum formato servir.
+    """
+    amostra = valores.dropna().head(TAMANHO_AMOSTRA_DATA)
+    melhor, melhor_ok = None, 0
+    for padrao, formato, _ in FORMATOS_DATA:
+        compativeis = amostra[amostra.str.fullmatch(padrao)]
+        if len(compativeis) <= melhor_ok:
+            continue
+        ok = pd.to_datetime(compativeis, format=formato, errors="coerce").notna().sum()
+        if ok > melhor_ok:
+            melhor, melhor_ok = formato, ok
+    return melhor
+
+
+@medir_etapa("datas")
+def converter_datas(serie, formato=None):
+    """
+    Converte uma coluna de datas com formato fixo. Se `formato` não for dado,
+    ele é detectado pela amostra; sem nenhum formato conhecido, recorre à
+    inferência elemento a elemento ("mixed"), mais lenta, para não perder o arquivo.
+
+    Retorna (datas, formato_usado).
+    """
+    valores = serie.astype(str).str.strip()
+    if formato is None:
+        formato = detectar_formato_data(valores)
+    if formato is None or formato == "mixed":
+        return pd.to_datetime(valores, format="mixed", dayfirst=True, errors="coerce"), "mixed"
+    return pd.to_datetime(valores, format=formato, errors="coerce"), formato
+
+
+def descricao_formato_data(formato):
+    """Texto amigável do formato de data, para exibição na barra lateral."""
+    for _, f, descricao in FORMATOS_DATA:
+        if f == formato:
+            return descricao
+    if formato == "mixed":
+        return "inferido linha a linha (lento)"
+    return "sem coluna de data"
+
+
+@medir_etapa("metricas_derivadas")
+def metricas_derivadas(df):
+    """
+    Calcula as métricas derivadas linha a linha (perdas, defeitos e as bases
+    da conversão alimentar), em float64. Como dependem apenas da própria
+    linha, podem ser aplicadas só às linhas novas.
+
+    Conversão alimentar: só entram linhas com consumo E produção. A ração do
+    dia (kg) usa o plantel da coluna `aves_alojadas` quando o lote a registra
+    ("racao_kg"); sem ela, fica a ração por ave ("racao_kg_ave"), multiplicada
+    depois pelo plantel informado na barra lateral. Assim, nada aqui depende
+    de preços ou do plantel escolhido na página.
+    """
+    vazio = pd.Series(np.nan, index=df.index, dtype="float64")
+
+    def valores(col):
+        # Contagens compactas (inteiros sem sinal) não podem gerar perdas
+        # negativas; colunas float32 voltam aos valores do arquivo
+        return valores_exatos(df[[col]])[col].to_numpy(dtype="float64", na_value=np.nan)
+
+    if {"ovos_granja", "ovos_escola"}.issubset(df.columns):
+        df["perda_ovos"] = valores("ovos_granja") - valores("ovos_escola")
+    else:
+        df["perda_ovos"] = vazio
+
+    if {"ovos_quebrados", "ovos_sem_casca", "ovos_deformados", "ovos_granja"}.issubset(df.columns):
+        df["ovos_defeituosos"] = (
+            valores("ovos_quebrados")
+            + valores("ovos_sem_casca")
+            + valores("ovos_deformados")
+        )
+        df["pct_defeituosos"] = (100 * df["ovos_defeituosos"] / valores("ovos_granja")).astype("float64")
+    else:
+        df["ovos_defeituosos"] = vazio
+        df["pct_defeituosos"] = vazio
+
+    if {"consumo_g_ave_dia", "ovos_granja"}.issubset(df.columns):
+        consumo, ovos = valores("consumo_g_ave_dia"), valores("ovos_granja")
+        pareado = ~np.isnan(consumo) & ~np.isnan(ovos)
+        aves = valores("aves_alojadas") if "aves_alojadas" in df.columns else np.full(len(df), np.nan, dtype="float64")
+        com_plantel = pareado & ~np.isnan(aves)
+        df["duzias_ovos"] = np.where(pareado, ovos / 12, np.nan).astype("float64")
+        df["racao_kg"] = np.where(com_plantel, consumo * aves / 1000, np.nan).astype("float64")
+        df["racao_kg_ave"] = np.where(pareado & ~com_plantel, consumo / 1000, np.nan).astype("float64")
+    else:
+        df["duzias_ovos"] = vazio
+        df["racao_kg"] = vazio
+        df["racao_kg_ave"] = vazio
+
+    return df
+
+
+def preprocessar_bloco(conteudo, colunas, origem, formato_data=None, decimal="."):
+    """
+    Converte um trecho de CSV (bytes, SEM a linha de cabeçalho) em DataFrame
+    pré-processado: origem, data, colunas numéricas e métricas derivadas.
+
+    `formato_data` é o formato já detectado para o arquivo (None = detectar)
+    e `decimal` o separador decimal do arquivo.
+    Retorna (df, formato_data).
+    """
+    if conteudo.strip():
+        df = pd.read_csv(io.BytesIO(conteudo), header=None, names=colunas, **opcoes_numericas_csv(decimal))
+    else:
+        df = pd.DataFrame(columns=colunas)
+
+    df["__arquivo_origem"] = origem
+
+    if "data" in df.columns and not df.empty:
+        df["data"], formato_data = converter_datas(df["data"], formato_data)
+        df = df.dropna(subset=["data"])
+    elif "data" in df.columns:
+        df["data"] = pd.to_datetime(df["data"])
+
+    df = converter_numericos(df, decimal)
+    if MEMORIA_COMPACTA:
+        df = compactar_textos(df)
+
+    return metricas_derivadas(df), formato_data
+
+
+@medir_etapa("leitura_csv")
+def ler_arquivo_incremental(caminho, entrada):
+    """
+    Lê um CSV aproveitando o que já foi processado em `entrada`.
+
+    Os arquivos de lote só crescem no final. Se o tamanho e o mtime não
+    mudaram, nada é lido; se os bytes de controle antes do offset e o CRC32
+    do trecho já lido conferem, apenas o trecho novo é convertido (o prefixo
+    só é relido para o CRC, bem mais barato que a conversão); caso contrário
+    o arquivo é relido inteiro.
+    Uma última linha sem quebra de linha (possivelmente ainda em gravação)
+    fica como "pendente" e é relida na próxima atualização.
+
+    Retorna (entrada_nova, linhas_novas, modo), com modo em
+    "inalterado", "anexado" ou "completo".
+    """
+    info = os.stat(caminho)
+    if entrada is not None and (entrada["tamanho"], entrada["mtime_ns"]) == (info.st_size, info.st_mtime_ns):
+        return entrada, None, "inalterado"
+
+    origem = os.path.basename(caminho)
+
+    with open(caminho, "rb") as f:
+        modo = "completo"
+        if entrada is not None and entrada["colunas"] and info.st_size >= entrada["offset"]:
+            inicio_controle = max(0, entrada["offset"] - TAMANHO_CONTROLE)
+            f.seek(inicio_controle)
+            if (
+                f.read(entrada["offset"] - inicio_controle) == entrada["controle"]
+                and _crc_prefixo(f, entrada["offset"]) == entrada["crc_prefixo"]
+            ):
+                modo = "anexado"
+
+        if modo == "anexado":
+            offset = entrada["offset"]
+            colunas = entrada["colunas"]
+            crc = entrada["crc_prefixo"]
+            conteudo = f.read()
+        else:
+            f.seek(0)
+            conteudo = f.read()
+            fim_cabecalho = conteudo.find(b"\n") + 1
+            crc = zlib.crc32(memoryview(conteudo)[:fim_cabecalho])
+            if fim_cabecalho == 0:
+                # Nem o cabeçalho está completo: trata como arquivo vazio
+                colunas = []
+                offset = 0
+                conteudo = b""
+            else:
+                colunas = normalizar_colunas(pd.read_csv(io.BytesIO(conteudo[:fim_cabecalho]), nrows=0).columns)
+                offset = fim_cabecalho
+                conteudo = conteudo[fim_cabecalho:]
+
+    formato_data = entrada["formato_data"] if modo == "anexado" else None
+    if modo == "anexado" and entrada["decimal"] is not None:
+        decimal = entrada["decimal"]
+    else:
+        decimal = detectar_decimal(conteudo[:TAMANHO_AMOSTRA_DECIMAL]) if conteudo.strip() else None
+
+    fim_completo = conteudo.rfind(b"\n") + 1
+    linhas_novas, formato_data = preprocessar_bloco(
+        conteudo[:fim_completo], colunas, origem, formato_data, decimal or "."
+    )
+    # Uma linha incompleta não deve decidir o formato do arquivo
+    pendente, _ = preprocessar_bloco(conteudo[fim_completo:], colunas, origem, formato_data, decimal or ".")
+
+    blocos = list(entrada["blocos"]) if modo == "anexado" else []
+    linhas = entrada["linhas"] if modo == "anexado" else 0
+    if modo == "completo" or not linhas_novas.empty:
+        # No modo completo o bloco entra mesmo vazio, para preservar as colunas do arquivo
+        blocos.append(linhas_novas)
+
+    novo_offset = offset + fim_completo
+    with open(caminho, "rb") as f:
+        inicio_controle = max(0, novo_offset - TAMANHO_CONTROLE)
+        f.seek(inicio_controle)
+        controle = f.read(novo_offset - inicio_controle)
+
+    entrada_nova = {
+        "tamanho": info.st_size,
+        "mtime_ns": info.st_mtime_ns,
+        "offset": novo_offset,
+        "linhas": linhas + len(linhas_novas),
+        "colunas": colunas,
+        "formato_data": formato_data,
+        "decimal": decimal,
+        "controle": controle,
+        "crc_prefixo": zlib.crc32(memoryview(conteudo)[:fim_completo], crc),
+        "blocos": blocos,
+        "pendente": pendente,
+    }
+    return entrada_nova, linhas_novas, modo
+
+
+def _ordenar_por_data(df):
+    """
+    Ordena por data de forma estável (mantém a ordem de chegada no mesmo dia)
+    e usa a própria data como índice (DatetimeIndex), o que permite recortar
+    períodos por busca binária em `fatiar_periodo`.
+    A coluna `data` é mantida; o índice fica sem nome para não conflitar com ela.
+    """
+    if "data" not in df.columns:
+        return df
+    if not df["data"].is_monotonic_increasing:
+        df = df.sort_values("data", kind="mergesort", ignore_index=True)
+    return df.set_axis(pd.DatetimeIndex(df["data"].to_numpy()), axis=0)
+
+
+def limites_periodo(df, ini, fim):
+    """
+    Posições [inicio, fim_excl) do intervalo de datas [ini, fim] (inclusivo)
+    em um DataFrame ordenado e indexado por data (ver `_ordenar_por_data`).
+    Usa `searchsorted` no índice: custo logarítmico no tamanho do histórico.
+    """
+    inicio = df.index.searchsorted(pd.Timestamp(ini), side="left")
+    fim_excl = df.index.searchsorted(pd.Timestamp(fim) + pd.Timedelta(days=1), side="left")
+    return inicio, fim_excl
+
+
+def fatiar_periodo(df, ini, fim):
+    """Recorta [ini, fim] como fatia posicional (sem cópia dos dados)."""
+    inicio, fim_excl = limites_periodo(df, ini, fim)
+    return df.iloc[inicio:fim_excl]
+
+
+# -------------------- Índice de somas acumuladas (KPIs em O(1)) --------------------
+# Colunas com soma e contagem acumuladas: qualquer soma/média de período sai
+# de duas consultas ao índice, sem percorrer as linhas do período.
+COLUNAS_INDICE = [
+    "consumo_g_ave_dia",
+    "ovos_granja",
+    "ovos_escola",
+    "perda_ovos",
+    "ovos_defeituosos",
+    "pct_defeituosos",
+    "aves_doentes",
+    "duzias_ovos",
+    "racao_kg",
+    "racao_kg_ave",
+]
+
+
+def construir_indice_acumulado(df, anterior=None, folga=False):
+    """
+    Monta, para cada coluna de COLUNAS_INDICE, os vetores de soma e de
+    contagem (valores não nulos) acumuladas, com um zero inicial:
+    soma[i] = soma das linhas [0, i).
+
+    Se `anterior` for o índice de um prefixo de `df` (mesmas linhas no início),
+    só as linhas novas são acumuladas a partir do último valor.
+
+    Com `folga`, os vetores são views de vetores maiores (ver
+    `_capacidade_reserva`) guardados em "reserva": se `anterior` também foi
+    montado assim e é a versão mais longa já estendida, as linhas novas são
+    gravadas no espaço livre, sem copiar o prefixo.
+    """
+    inicio = anterior["linhas"] if anterior is not None else 0
+    indice = {"linhas": len(df), "soma": {}, "cont": {}}
+    reserva = anterior.get("reserva") if anterior is not None else None
+    if folga:
+        if reserva is None or reserva["linhas"] != inicio:
+            reserva = {"linhas": inicio, "soma": {}, "cont": {}}
+        indice["reserva"] = reserva
+    for col in COLUNAS_INDICE:
+        if col not in df.columns:
+            continue
+        valores = df[col].iloc[inicio:].to_numpy(dtype="float64", na_value=np.nan)
+        validos = ~np.isnan(valores)
+        if anterior is not None and col in anterior["soma"]:
+            soma0, cont0 = anterior["soma"][col], anterior["cont"][col]
+        else:
+            # Coluna nova (ou índice do zero): o prefixo não contribui
+            soma0, cont0 = np.zeros(inicio + 1), np.zeros(inicio + 1, dtype="int64")
+        soma = soma0[-1] + np.cumsum(np.where(validos, valores, 0.0))
+        cont = cont0[-1] + np.cumsum(validos)
+        if not folga:
+            indice["soma"][col] = np.concatenate([soma0, soma])
+            indice["cont"][col] = np.concatenate([cont0, cont])
+            continue
+        for tipo, prefixo, novos in (("soma", soma0, soma), ("cont", cont0, cont)):
+            vetor = reserva[tipo].get(col)
+            if vetor is None or len(vetor) < len(df) + 1:
+                vetor = _realocar(prefixo, inicio + 1, _capacidade_reserva(len(df) + 1))
+                reserva[tipo][col] = vetor
+            vetor[inicio + 1:len(df) + 1] = novos
+            indice[tipo][col] = vetor[:len(df) + 1]
+    if folga:
+        reserva["linhas"] = len(df)
+    return indice
+
+
+def resumo_periodo(indice, inicio, fim_excl, col):
+    """
+    Soma, contagem de valores válidos e média de `col` nas linhas
+    [inicio, fim_excl), obtidas por duas consultas ao índice acumulado.
+    Coluna inexistente: (0.0, 0, NaN), como `.sum()`/`.mean()` de série vazia.
+    """
+    if indice is None or col not in indice["soma"]:
+        return 0.0, 0, np.nan
+    soma = indice["soma"][col][fim_excl] - indice["soma"][col][inicio]
+    cont = int(indice["cont"][col][fim_excl] - indice["cont"][col][inicio])
+    return soma, cont, (soma / cont if cont else np.nan)
+
+
+# -------------------- Estatísticas móveis e anomalias --------------------
+# Por lote (arquivo de origem), em ordem de data: média e desvio móveis das
+# últimas JANELA_TENDENCIA linhas, média móvel exponencial (EWMA) e o z-score
+# de cada valor contra a janela anterior; |z| > LIMITE_Z marca anomalia.
+COLUNAS_TENDENCIA = ["consumo_g_ave_dia", "ovos_granja", "perda_ovos", "pct_defeituosos", "aves_doentes"]
+JANELA_TENDENCIA = 14  # duas semanas de registros
+ALFA_EWMA = 2 / (JANELA_TENDENCIA + 1)
+LIMITE_Z = 3.5
+MIN_PONTOS_Z = 3  # valores válidos na janela anterior para calcular o z-score
+# Dias lidos antes do período quando as tendências vêm do banco: cobrem a
+# janela anterior do z-score e o aquecimento da EWMA (peso < 1% do que fica de fora)
+DIAS_AQUECIMENTO_BANCO = max(JANELA_TENDENCIA, int(np.ceil(np.log(0.01) / np.log(1 - ALFA_EWMA))))
+
+
+def _estatisticas_janela(valores, inicio_grupo):
+    """
+    Média/desvio móveis (janela terminando na linha, inclusive) e z-score de
+    cada valor contra a janela anterior, para todas as colunas de `valores`
+    (n x C, já agrupados e em ordem de data) de uma vez, por somas acumuladas:
+    a janela de cada linha nunca passa do início do seu grupo (`inicio_grupo`).
+    """
+    n = len(valores)
+    validos = ~np.isnan(valores)
+    x = np.where(validos, valores, 0.0)
+    zero = np.zeros((1, valores.shape[1]))
+    soma = np.vstack([zero, np.cumsum(x, axis=0)])
+    soma2 = np.vstack([zero, np.cumsum(x * x, axis=0)])
+    cont = np.vstack([zero, np.cumsum(validos, axis=0)])
+
+    def janela(ini, fim):
+        c = cont[fim] - cont[ini]
+        s = soma[fim] - soma[ini]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            media = s / c
+            var = (soma2[fim] - soma2[ini] - s * media) / (c - 1)
+        desvio = np.where(c > 1, np.sqrt(np.maximum(var, 0.0)), np.nan)
+        return c, media, desvio
+
+    pos = np.arange(n)
+    _, media, desvio = janela(np.maximum(pos - JANELA_TENDENCIA + 1, inicio_grupo), pos + 1)
+    c_ant, media_ant, desvio_ant = janela(np.maximum(pos - JANELA_TENDENCIA, inicio_grupo), pos)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = np.where((c_ant >= MIN_PONTOS_Z) & (desvio_ant > 0), (valores - media_ant) / desvio_ant, np.nan)
+    return media, desvio, z
+
+
+def calcular_tendencias(df, anterior=None):
+    """
+    Estatísticas móveis de COLUNAS_TENDENCIA para todas as linhas de `df`,
+    numa única passada vetorizada (todas as colunas e lotes juntos).
+
+    `anterior` pode ser o resultado de qualquer versão anterior dos dados:
+    em cada lote cujas primeiras linhas continuam as mesmas (conferidas pela
+    soma e pela contagem de cada coluna e das datas), só as linhas novas são
+    calculadas, a partir do estado guardado (últimas JANELA_TENDENCIA linhas
+    e último valor da EWMA); os demais lotes são recalculados do início.
+    Retorna {"linhas", "media", "desvio", "ewma", "z" (n x C, float32),
+    "ordem", "lotes"}.
+    """
+    n_col = len(COLUNAS_TENDENCIA)
+    valores = np.column_stack([
+        df[col].to_numpy(dtype="float64", na_value=np.nan) if col in df.columns else np.full(len(df), np.nan)
+        for col in COLUNAS_TENDENCIA
+    ]).reshape(len(df), n_col)
+    lotes = df["__arquivo_origem"].to_numpy() if "__arquivo_origem" in df.columns else np.zeros(len(df))
+    codigos, nomes = pd.factorize(lotes)
+    ordem = np.argsort(codigos, kind="stable")
+    fronteiras = np.searchsorted(codigos[ordem], np.arange(len(nomes) + 1))
+    valores = valores[ordem]
+
+    # Somas e contagens acumuladas (na ordem por lote) para conferir prefixos
+    dias = (
+        df["data"].to_numpy(dtype="datetime64[ns]").astype("int64")[ordem] / 86_400e9
+        if "data" in df.columns
+        else np.zeros(len(df))
+    )
+    controle = np.column_stack([valores, dias])
+    validos = ~np.isnan(controle)
+    zero = np.zeros((1, controle.shape[1]))
+    soma_controle = np.vstack([zero, np.cumsum(np.where(validos, controle, 0.0), axis=0)])
+    cont_controle = np.vstack([zero, np.cumsum(validos, axis=0)]).astype("int64")
+
+    # Cada lote com linhas novas: [linhas de contexto guardadas; linhas
+    # novas], e a EWMA partindo de uma linha-semente com o último valor
+    vazio = np.empty((0, n_col))
+    lotes_anteriores = anterior["lotes"] if anterior is not None else {}
+    info_lotes, reaproveitadas, calcular = {}, [], []
+    partes, sementes, grupos, novas = [], [], [], []
+    for k, lote in enumerate(nomes):
+        ini, fim = fronteiras[k], fronteiras[k + 1]
+        info = lotes_anteriores.get(lote)
+        feitas, estado = 0, (vazio, np.full(n_col, np.nan))
+        if info is not None and info["linhas"] <= fim - ini:
+            corte = ini + info["linhas"]
+            if (cont_controle[corte] - cont_controle[ini] == info["cont"]).all() and np.allclose(
+                soma_controle[corte] - soma_controle[ini], info["soma"], rtol=1e-12, atol=1e-9
+            ):
+                feitas, estado = info["linhas"], info["estado"]
+        reaproveitadas.append(
+            anterior["ordem"][info["inicio"]:info["inicio"] + feitas] if feitas else np.empty(0, dtype="int64")
+        )
+        info_lotes[lote] = {
+            "linhas": fim - ini,
+            "inicio": ini,
+            "soma": soma_controle[fim] - soma_controle[ini],
+            "cont": cont_controle[fim] - cont_controle[ini],
+            "estado": estado,
+        }
+        if feitas < fim - ini:
+            contexto, ewma0 = estado
+            bloco = valores[ini + feitas:fim]
+            calcular.append((lote, len(contexto), len(bloco)))
+            partes += [contexto, bloco]
+            novas += [np.zeros(len(contexto), dtype=bool), np.ones(len(bloco), dtype=bool)]
+            sementes += [ewma0[None, :], bloco]
+            grupos.append(np.full(len(bloco) + 1, len(calcular) - 1))
+
+    calculadas = {}
+    if calcular:
+        juntos, novas = np.concatenate(partes), np.concatenate(novas)
+        tamanhos = np.array([n_contexto + n_bloco for _, n_contexto, n_bloco in calcular])
+        inicio_grupo = np.repeat(np.concatenate([[0], np.cumsum(tamanhos)[:-1]]), tamanhos)
+        media, desvio, z = (m[novas] for m in _estatisticas_janela(juntos, inicio_grupo))
+        ewma = (
+            pd.DataFrame(np.concatenate(sementes))
+            .groupby(np.concatenate(grupos), sort=False)
+            .ewm(alpha=ALFA_EWMA, adjust=False, ignore_na=True)
+            .mean()
+            .droplevel(0)
+            .sort_index()
+            .to_numpy()
+        )
+        sem_semente = np.ones(len(ewma), dtype=bool)
+        sem_semente[np.concatenate([[0], np.cumsum([len(g) for g in grupos])[:-1]])] = False
+        ewma = ewma[sem_semente]
+        fim_novas = np.cumsum([n_bloco for *_, n_bloco in calcular])
+        for (lote, _, n_bloco), tamanho, fim, fim_novo in zip(calcular, tamanhos, np.cumsum(tamanhos), fim_novas):
+            contexto = juntos[max(fim - JANELA_TENDENCIA, fim - tamanho):fim]
+            info_lotes[lote]["estado"] = (contexto.copy(), ewma[fim_novo - 1].copy())
+            fatia = slice(fim_novo - n_bloco, fim_novo)
+            calculadas[lote] = (media[fatia], desvio[fatia], ewma[fatia], z[fatia])
+
+    # Linhas reaproveitadas + calculadas de cada lote, de volta à ordem de `df`
+    resultado = {"linhas": len(df), "ordem": ordem, "lotes": info_lotes}
+    for j, nome in enumerate(("media", "desvio", "ewma", "z")):
+        em_ordem = [vazio.astype("float32")]
+        for lote, posicoes in zip(nomes, reaproveitadas):
+            em_ordem.append(anterior[nome][posicoes] if len(posicoes) else vazio.astype("float32"))
+            if lote in calculadas:
+                em_ordem.append(calculadas[lote][j].astype("float32"))
+        linhas = np.empty((len(df), n_col), dtype="float32")
+        linhas[ordem] = np.concatenate(em_ordem)
+        resultado[nome] = linhas
+    return resultado
+
+
+def quadro_tendencia(df, tendencias, col, inicio=0, extras=()):
+    """
+    `data`, `col` e `extras` de `df` com a EWMA, o z-score e a marca de
+    anomalia de `col` (colunas `<col>_ewma`, `<col>_z`, `<col>_anomalia`),
+    sendo `df` a fatia que começa na linha `inicio` do quadro de `tendencias`.
+    Sem `tendencias` (cálculo indisponível), EWMA e z-score ficam NaN.
+    """
+    j = COLUNAS_TENDENCIA.index(col)
+    fatia = slice(inicio, inicio + len(df))
+    sem_valor = np.full(len(df), np.nan)
+    z = tendencias["z"][fatia, j] if tendencias is not None else sem_valor
+    return df[["data", col, *extras]].assign(**{
+        f"{col}_ewma": tendencias["ewma"][fatia, j] if tendencias is not None else sem_valor,
+        f"{col}_z": z,
+        f"{col}_anomalia": np.abs(z) > LIMITE_Z,
+    })
+
+
+# -------------------- Previsão por lote (Holt-Winters) --------------------
+# Modelo aditivo com tendência amortecida e sazonalidade semanal, por lote e
+# coluna, sobre a série diária (ovos: soma do dia; consumo: média do dia).
+# Os parâmetros saem de uma busca em grade vetorizada (todas as combinações
+# e séries de uma vez), refeita a cada REAJUSTE_DIAS dias novos; entre um
+# ajuste e outro, cada dia novo só avança o estado.
+COLUNAS_PREVISAO = {"ovos_granja": "soma", "consumo_g_ave_dia": "media"}
+SAZONALIDADE = 7
+AMORTECIMENTO = 0.98
+GRADE_PREVISAO = np.array(
+    [(a, b, g) for a in (0.1, 0.3, 0.5, 0.8) for b in (0.01, 0.05, 0.2) for g in (0.05, 0.2, 0.5)]
+)
+MIN_DIAS_AJUSTE = 28  # com menos dias, o lote é reajustado a cada dia novo
+REAJUSTE_DIAS = 7  # depois, a busca em grade é refeita a cada semana de dados
+Z_FAIXA = 1.96  # faixa de ~95% (erro de um passo crescendo com √h)
+
+
+def _estado_inicial(n_grade, n_series):
+    """Estado vazio do Holt-Winters (nível NaN = série ainda sem valor)."""
+    forma = (n_grade, n_series)
+    return {
+        "nivel": np.full(forma, np.nan),
+        "tendencia": np.zeros(forma),
+        "sazonal": np.zeros((*forma, SAZONALIDADE)),
+        "sse": np.zeros(forma),
+        "n": np.zeros(forma, dtype="int64"),
+    }
+
+
+def _suavizar(y, fase, comprimentos, params, estado):
+    """
+    Avança o Holt-Winters por `y` (T x S, um dia por linha, NaN = dia sem
+    registro) para G conjuntos de parâmetros ao mesmo tempo.
+    `fase`: dia da semana do primeiro dia de cada série; `comprimentos`: nº
+    de dias válidos de cada série (as demais linhas são enchimento);
+    `params`: (G, S, 3) com alfa, beta e gama; `estado`: arrays (G, S) e
+    "sazonal" (G, S, 7). Devolve um estado novo (o de entrada não é alterado).
+    """
+    alfa, beta, gama = params[..., 0], params[..., 1], params[..., 2]
+    estado = {chave: valor.copy() for chave, valor in estado.items()}
+    nivel, tendencia, sazonal = estado["nivel"], estado["tendencia"], estado["sazonal"]
+    g_idx = np.arange(nivel.shape[0])[:, None]
+    s_idx = np.arange(nivel.shape[1])[None, :]
+    for t in range(len(y)):
+        k = ((fase + t) % SAZONALIDADE)[None, :]
+        saz = sazonal[g_idx, s_idx, k]
+        valor = y[t][None, :]
+        ativo = (t < comprimentos)[None, :]
+        valido = ~np.isnan(valor) & ativo
+        iniciado = ~np.isnan(nivel)
+        atualiza = valido & iniciado
+        primeiro = valido & ~iniciado
+
+        projetado = nivel + AMORTECIMENTO * tendencia
+        erro = valor - projetado - saz
+        novo_nivel = alfa * (valor - saz) + (1 - alfa) * projetado
+        nova_tendencia = beta * (novo_nivel - nivel) + (1 - beta) * AMORTECIMENTO * tendencia
+        novo_saz = gama * (valor - novo_nivel) + (1 - gama) * saz
+
+        estado["sse"] = np.where(atualiza, estado["sse"] + erro * erro, estado["sse"])
+        estado["n"] = estado["n"] + atualiza
+        # Dia sem registro (dentro da série): só projeta nível e tendência
+        nivel_dia = np.where(atualiza, novo_nivel, np.where(primeiro, valor, projetado))
+        tendencia_dia = np.where(atualiza, nova_tendencia, np.where(primeiro, 0.0, AMORTECIMENTO * tendencia))
+        sazonal[g_idx, s_idx, k] = np.where(atualiza, novo_saz, saz)
+        nivel = np.where(ativo, nivel_dia, nivel)
+        tendencia = np.where(ativo, tendencia_dia, tendencia)
+    estado["nivel"], estado["tendencia"] = nivel, tendencia
+    return estado
+
+
+def _empilhar(series):
+    """Séries de tamanhos diferentes alinhadas à esquerda (T x S, NaN no fim) e seus comprimentos."""
+    comprimentos = np.array([len(s) for s in series])
+    y = np.full((max(comprimentos), len(series)), np.nan)
+    for j, s in enumerate(series):
+        y[: len(s), j] = s
+    return y, comprimentos
+
+
+def _ajustar(series, fases):
+    """
+    Escolhe, para cada série, a combinação de GRADE_PREVISAO com menor erro
+    quadrático médio de um passo, rodando todas as combinações e séries numa
+    só passada. Devolve (params (S, 3), estado final com G = 1).
+    """
+    y, comprimentos = _empilhar(series)
+    n_grade, n_series = len(GRADE_PREVISAO), len(series)
+    params = np.broadcast_to(GRADE_PREVISAO[:, None, :], (n_grade, n_series, 3))
+    estado = _suavizar(y, fases, comprimentos, params, _estado_inicial(n_grade, n_series))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        erro_medio = np.where(estado["n"] > 0, estado["sse"] / estado["n"], np.inf)
+    melhor = erro_medio.argmin(axis=0)
+    colunas = np.arange(n_series)
+    return GRADE_PREVISAO[melhor], {chave: valor[melhor, colunas][None] for chave, valor in estado.items()}
+
+
+def marco_ajuste(n):
+    """
+    Nº de dias, do início da série, sobre os quais são escolhidos os
+    parâmetros de uma série com `n` dias completos: todos enquanto a série
+    é curta (menos de MIN_DIAS_AJUSTE) e, depois, o último marco de
+    REAJUSTE_DIAS em REAJUSTE_DIAS dias. Só depende de `n`.
+    """
+    return n if n < MIN_DIAS_AJUSTE else n - (n - MIN_DIAS_AJUSTE) % REAJUSTE_DIAS
+
+
+def diarios_previsao(df):
+    """
+    Soma e contagem diárias de cada coluna de COLUNAS_PREVISAO por lote, em
+    formato longo (lote, coluna, dia, soma, cont), só com dias que têm valor.
+    """
+    return acumular_diarios(df)["diarios"]
+
+
+def acumular_diarios(df, anterior=None):
+    """
+    Totais diários de `diarios_previsao` mantidos entre versões dos dados.
+
+    `anterior` pode ser o resultado desta função para qualquer versão
+    anterior: em cada lote cujas primeiras linhas continuam as mesmas
+    (conferidas pela soma e pela contagem de cada coluna e das datas, como
+    em `calcular_tendencias`), só as linhas novas são agrupadas por dia e
+    somadas aos dias guardados (o último dia pode receber mais linhas); os
+    demais lotes são agrupados do início. As linhas de cada lote têm de
+    estar em ordem de data (como em "dados").
+    Retorna {"colunas", "lotes", "diarios"}.
+    """
+    colunas = [c for c in COLUNAS_PREVISAO if c in df.columns]
+    if "__arquivo_origem" not in df.columns or "data" not in df.columns or not colunas:
+        return {"colunas": colunas, "lotes": {}, "diarios": pd.DataFrame(columns=["lote", "coluna", "dia", "soma", "cont"])}
+    if anterior is not None and anterior["colunas"] != colunas:
+        anterior = None
+
+    codigos, nomes = df["__arquivo_origem"].factorize()
+    # Poucos lotes: códigos pequenos ordenam por radix (linear)
+    ordem = np.argsort(codigos.astype("int16") if len(nomes) < 2**15 else codigos, kind="stable")
+    fronteiras = np.searchsorted(codigos[ordem], np.arange(len(nomes) + 1))
+    valores = np.column_stack([df[c].to_numpy(dtype="float64", na_value=np.nan) for c in colunas])[ordem]
+    dias = df["data"].to_numpy(dtype="datetime64[D]").astype("int64")[ordem]
+    validos = ~np.isnan(valores)
+    valores = np.where(validos, valores, 0.0)
+
+    # Somas e contagens acumuladas (na ordem por lote) para conferir prefixos
+    controle = np.column_stack([valores, dias])
+    zero = np.zeros((1, controle.shape[1]))
+    soma_controle = np.vstack([zero, np.cumsum(controle, axis=0)])
+    cont_controle = np.vstack([zero[:, :-1], np.cumsum(validos, axis=0)]).astype("int64")
+
+    lotes_anteriores = anterior["lotes"] if anterior is not None else {}
+    lotes, calcular = {}, []
+    for k, lote in enumerate(nomes):
+        ini, fim = fronteiras[k], fronteiras[k + 1]
+        info = lotes_anteriores.get(lote)
+        feitas = 0
+        if info is not None and 0 < info["linhas"] <= fim - ini:
+            corte = ini + info["linhas"]
+            if (
+                (cont_controle[corte] - cont_controle[ini] == info["cont_controle"]).all()
+                and np.allclose(soma_controle[corte] - soma_controle[ini], info["soma_controle"], rtol=1e-12, atol=1e-9)
+                and (corte == fim or dias[corte] >= info["dias"][-1])
+            ):
+                feitas = info["linhas"]
+        lotes[lote] = {
+            "linhas": fim - ini,
+            "soma_controle": soma_controle[fim] - soma_controle[ini],
+            "cont_controle": cont_controle[fim] - cont_controle[ini],
+            **({chave: info[chave] for chave in ("dias", "soma", "cont")} if feitas else {}),
+        }
+        if feitas < fim - ini:
+            calcular.append((lote, ini + feitas, fim))
+
+    if calcular:
+        # Linhas novas de todos os lotes num só agrupamento: (lote, dia) já
+        # vêm em ordem, então cada dia é um trecho contínuo somado por reduceat
+        posicoes = np.concatenate([np.arange(a, b) for _, a, b in calcular])
+        grupo = np.repeat(np.arange(len(calcular)), [b - a for _, a, b in calcular])
+        dia = dias[posicoes]
+        inicio_dia = np.flatnonzero(np.r_[True, (grupo[1:] != grupo[:-1]) | (dia[1:] != dia[:-1])])
+        soma_dia = np.add.reduceat(valores[posicoes], inicio_dia, axis=0)
+        cont_dia = np.add.reduceat(validos[posicoes].astype("int64"), inicio_dia, axis=0)
+        limites = np.searchsorted(grupo[inicio_dia], np.arange(len(calcular) + 1))
+        for j, (lote, _, _) in enumerate(calcular):
+            trecho = slice(limites[j], limites[j + 1])
+            novos = {"dias": dia[inicio_dia[trecho]], "soma": soma_dia[trecho], "cont": cont_dia[trecho]}
+            info = lotes[lote]
+            if "dias" in info and info["dias"][-1] == novos["dias"][0]:
+                # O último dia guardado recebeu mais linhas
+                novos["soma"] = novos["soma"].copy()
+                novos["cont"] = novos["cont"].copy()
+                novos["soma"][0] += info["soma"][-1]
+                novos["cont"][0] += info["cont"][-1]
+                info.update({chave: np.concatenate([info[chave][:-1], novos[chave]]) for chave in novos})
+            elif "dias" in info:
+                info.update({chave: np.concatenate([info[chave], novos[chave]]) for chave in novos})
+            else:
+                info.update(novos)
+
+    # Formato longo: por coluna, lotes em ordem de nome e dias em ordem
+    chaves, partes = [], {"dia": [], "soma": [], "cont": []}
+    for j, col in enumerate(colunas):
+        for lote in sorted(lotes, key=str):
+            info = lotes[lote]
+            com_valor = info["cont"][:, j] > 0
+            chaves.append((lote, col, int(com_valor.sum())))
+            partes["dia"].append(info["dias"][com_valor])
+            partes["soma"].append(info["soma"][com_valor, j])
+            partes["cont"].append(info["cont"][com_valor, j])
+    tamanhos = [n for *_, n in chaves]
+    diarios = pd.DataFrame({
+        "lote": np.repeat(np.array([lote for lote, _, _ in chaves], dtype=object), tamanhos),
+        "coluna": np.repeat(np.array([col for _, col, _ in chaves], dtype=object), tamanhos),
+        "dia": np.concatenate(partes["dia"]).astype("datetime64[D]").astype("datetime64[ns]"),
+        "soma": np.concatenate(partes["soma"]),
+        "cont": np.concatenate(partes["cont"]),
+    }) if chaves else pd.DataFrame(columns=["lote", "coluna", "dia", "soma", "cont"])
+    return {"colunas": colunas, "lotes": lotes, "diarios": diarios}
+
+
+def _valor_diario(col, soma, cont):
+    if COLUNAS_PREVISAO[col] == "soma":
+        return soma
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(cont > 0, soma / cont, np.nan)
+
+
+def atualizar_modelos(modelos, diarios):
+    """
+    Modelos {(lote, coluna): modelo} para os totais diários `diarios` (ver
+    `diarios_previsao`; histórico inteiro de cada lote), aproveitando os
+    `modelos` de uma versão anterior dos dados (não são alterados).
+
+    O último dia de cada série fica "pendente" (ainda pode receber linhas)
+    e só entra no estado quando chega um dia posterior. Com n dias
+    completos, os parâmetros são os da busca em grade sobre os primeiros
+    `marco_ajuste(n)` dias e o estado é o do Holt-Winters com esses
+    parâmetros sobre os n dias: o resultado não depende de como os dados
+    chegaram (de uma vez ou em partes).
+
+    Um modelo anterior com o mesmo marco e cujos dias já processados não
+    mudaram (conferidos pelo nº de dias com valor, soma e contagem) só
+    avança pelos dias novos; as demais séries são reajustadas. Todas as
+    séries a ajustar passam por uma só busca e todas avançam numa só passada.
+    """
+    novos, ajustar, avancar = {}, [], []
+    for (lote, col), grupo in diarios.groupby(["lote", "coluna"], sort=False, observed=True):
+        dias = pd.DatetimeIndex(grupo["dia"].to_numpy())
+        soma = grupo["soma"].to_numpy(dtype="float64")
+        cont = grupo["cont"].to_numpy(dtype="int64")
+
+        # Dias completos (em calendário encadeado, NaN nos dias sem registro)
+        completos = dias[:-1]
+        valores = np.empty(0)
+        if len(completos):
+            valores = np.full((completos[-1] - dias[0]).days + 1, np.nan)
+            valores[(completos - dias[0]).days] = _valor_diario(col, soma[:-1], cont[:-1])
+        novo = {
+            "pendente": (dias[-1], soma[-1], cont[-1]),
+            "inicio": dias[0],
+            "dias": len(valores),
+            "marco": marco_ajuste(len(valores)),
+            "controle": (len(completos), soma[:-1].sum(), cont[:-1].sum()),
+            "agregacao": COLUNAS_PREVISAO[col],
+        }
+
+        modelo = modelos.get((lote, col))
+        if modelo is not None and (modelo["inicio"], modelo["marco"]) == (dias[0], novo["marco"]):
+            feitos = modelo["controle"][0]
+            if (
+                modelo["dias"] <= novo["dias"]
+                and feitos <= len(completos)
+                and (feitos == len(completos) or (completos[feitos] - dias[0]).days >= modelo["dias"])
+                and cont[:feitos].sum() == modelo["controle"][2]
+                and np.isclose(soma[:feitos].sum(), modelo["controle"][1], rtol=1e-12, atol=1e-9)
+            ):
+                avancar.append(((lote, col), novo, modelo, modelo["dias"], valores))
+                continue
+        ajustar.append(((lote, col), novo, valores))
+
+    if ajustar:
+        # Série vazia (só o dia pendente): ajusta sobre um dia sem valor
+        series = [valores[: novo["marco"]] for _, novo, valores in ajustar]
+        series = [s if len(s) else np.full(1, np.nan) for s in series]
+        params, estado = _ajustar(series, np.array([novo["inicio"].dayofweek for _, novo, _ in ajustar]))
+        for j, (chave, novo, valores) in enumerate(ajustar):
+            ajustado = {"params": params[j], **{k: v[0, j] for k, v in estado.items()}}
+            avancar.append((chave, novo, ajustado, novo["marco"], valores))
+
+    if avancar:
+        restantes = [valores[feitos:] for *_, feitos, valores in avancar]
+        y, comprimentos = _empilhar(restantes)
+        fases = np.array([(novo["inicio"] + pd.Timedelta(days=feitos)).dayofweek for _, novo, _, feitos, _ in avancar])
+        params = np.stack([base["params"] for _, _, base, _, _ in avancar])
+        estado = {
+            chave: np.stack([base[chave] for _, _, base, _, _ in avancar])[None]
+            for chave in ("nivel", "tendencia", "sazonal", "sse", "n")
+        }
+        estado = _suavizar(y, fases, comprimentos, params[None], estado)
+        for j, (chave, novo, _, _, _) in enumerate(avancar):
+            novo.update(params=params[j], **{k: v[0, j] for k, v in estado.items()})
+            novos[chave] = novo
+    return novos
+
+
+def prever(modelo, horizonte):
+    """
+    Previsão de `horizonte` dias após o último dia do lote (o dia pendente
+    entra no estado antes), com faixa ±Z_FAIXA·σ·√h, σ = erro de um passo.
+    Retorna DataFrame (data, previsto, minimo, maximo) ou None sem estado.
+    """
+    dia, soma, cont = modelo["pendente"]
+    estado = {k: np.asarray(modelo[k])[None, None] for k in ("nivel", "tendencia", "sazonal", "sse", "n")}
+    valor = soma if modelo["agregacao"] == "soma" else (soma / cont if cont else np.nan)
+    estado = _suavizar(
+        np.array([[valor]]), np.array([dia.dayofweek]), np.array([1]), np.asarray(modelo["params"])[None, None], estado
+    )
+    nivel, tendencia = estado["nivel"][0, 0], estado["tendencia"][0, 0]
+    if np.isnan(nivel):
+        return None
+    passos = np.arange(1, horizonte + 1)
+    amortecimento = np.cumsum(AMORTECIMENTO ** passos)
+    datas = dia + pd.to_timedelta(passos, unit="D")
+    previsto = nivel + amortecimento * tendencia + estado["sazonal"][0, 0][datas.dayofweek]
+    n = estado["n"][0, 0]
+    sigma = np.sqrt(estado["sse"][0, 0] / n) if n > 1 else np.nan
+    faixa = Z_FAIXA * sigma * np.sqrt(passos)
+    return pd.DataFrame({"data": datas, "previsto": previsto, "minimo": previsto - faixa, "maximo": previsto + faixa})
+
+
+def previsoes_coluna(modelos, col, horizonte, lotes=None, dias_ativos=SAZONALIDADE):
+    """
+    Previsões de `col` dos lotes ativos (último dia a até `dias_ativos` dias
+    do lote mais recente), ou só de `lotes`, em formato longo com a coluna `lote`.
+    """
+    candidatos = {lote: m for (lote, c), m in modelos.items() if c == col and (lotes is None or lote in lotes)}
+    if not candidatos:
+        return None
+    ultimo = max(m["pendente"][0] for m in candidatos.values())
+    partes = []
+    for lote, modelo in candidatos.items():
+        if (ultimo - modelo["pendente"][0]).days > dias_ativos:
+            continue
+        previsao = prever(modelo, horizonte)
+        if previsao is not None:
+            partes.append(previsao.assign(lote=lote))
+    return pd.concat(partes, ignore_index=True) if partes else None
+
+
+# -------------------- Base com folga para linhas anexadas --------------------
+# Arquivos que só crescem trazem linhas posteriores a todas as da base: em vez
+# de concatenar e reordenar a base inteira a cada atualização, cada coluna
+# fica num vetor com espaço livre no fim e "dados" é uma view das primeiras
+# linhas. Anexar copia só o trecho novo; quando o espaço acaba, os vetores
+# são realocados com FOLGA_RESERVA a mais (custo amortizado constante por
+# linha). Textos Arrow (imutáveis) ficam em pedaços, juntados dois a dois
+# quando o último alcança metade do anterior (poucos pedaços, cópia amortizada).
+FOLGA_RESERVA = 0.25
+FOLGA_MINIMA = 4096
+
+
+def _capacidade_reserva(linhas):
+    return linhas + max(FOLGA_MINIMA, int(linhas * FOLGA_RESERVA))
+
+
+def _realocar(vetor, linhas, capacidade):
+    """Vetor novo com `capacidade` posições e as primeiras `linhas` de `vetor`."""
+    novo = np.empty(capacidade, dtype=vetor.dtype)
+    novo[:linhas] = vetor[:linhas]
+    return novo
+
+
+def _coluna_reservada(serie, capacidade):
+    """
+    Armazenamento com folga de `serie`: {"tipo", "dtype", "vetores" ou
+    "pedacos"}; None se o tipo da coluna não é suportado.
+    """
+    n, dtype, valores = len(serie), serie.dtype, serie.array
+    if isinstance(dtype, pd.CategoricalDtype):
+        return {"tipo": "categoria", "dtype": dtype, "vetores": (_realocar(valores.codes, n, capacidade),)}
+    if isinstance(valores, pd.arrays.ArrowExtensionArray):
+        encadeado = valores.__arrow_array__()
+        return {"tipo": "arrow", "dtype": dtype, "tipo_arrow": encadeado.type, "pedacos": [p for p in encadeado.chunks if len(p)]}
+    if isinstance(valores, (pd.arrays.IntegerArray, pd.arrays.FloatingArray, pd.arrays.BooleanArray)):
+        dados = valores.to_numpy(dtype=dtype.numpy_dtype, na_value=0)
+        mascara = serie.isna().to_numpy()
+        return {"tipo": "mascara", "dtype": dtype, "vetores": (_realocar(dados, n, capacidade), _realocar(mascara, n, capacidade))}
+    if isinstance(dtype, np.dtype):
+        return {"tipo": "numpy", "dtype": dtype, "vetores": (_realocar(serie.to_numpy(), n, capacidade),)}
+    return None
+
+
+def _gravar_coluna(coluna, inicio, serie, linhas):
+    """
+    Grava as `linhas` de `serie` (None = coluna ausente no bloco: valores
+    nulos) a partir da posição `inicio`; False se o tipo não confere.
+    """
+    fim = inicio + linhas
+    if coluna["tipo"] == "arrow":
+        if serie is None:
+            novos = [pa.nulls(linhas, type=coluna["tipo_arrow"])]
+        elif serie.dtype != coluna["dtype"] or serie.array.__arrow_array__().type != coluna["tipo_arrow"]:
+            return False
+        else:
+            novos = serie.array.__arrow_array__().chunks
+        pedacos = coluna["pedacos"]
+        pedacos.extend(p for p in novos if len(p))
+        while len(pedacos) > 1 and 2 * len(pedacos[-1]) >= len(pedacos[-2]):
+            pedacos[-2:] = [pa.concat_arrays(pedacos[-2:])]
+        return True
+
+    if coluna["tipo"] == "categoria":
+        (codigos,) = coluna["vetores"]
+        if serie is None:
+            codigos[inicio:fim] = -1
+            return True
+        if not isinstance(serie.dtype, pd.CategoricalDtype):
+            return False
+        # Categorias novas entram no fim (os códigos já gravados continuam valendo)
+        categorias = coluna["dtype"].categories
+        novas = serie.cat.categories.difference(categorias)
+        if len(novas):
+            if len(categorias) + len(novas) > np.iinfo(codigos.dtype).max:
+                return False
+            coluna["dtype"] = pd.CategoricalDtype(categorias.append(novas), ordered=coluna["dtype"].ordered)
+        codigos[inicio:fim] = serie.cat.set_categories(coluna["dtype"].categories).cat.codes.to_numpy()
+        return True
+
+    if serie is not None and serie.dtype != coluna["dtype"]:
+        return False
+    dados = coluna["vetores"][0]
+    if coluna["tipo"] == "mascara":
+        mascara = coluna["vetores"][1]
+        if serie is None:
+            mascara[inicio:fim] = True
+        else:
+            dados[inicio:fim] = serie.array.to_numpy(dtype=dados.dtype, na_value=0)
+            mascara[inicio:fim] = serie.isna().to_numpy()
+        return True
+    if serie is None:
+        if dados.dtype.kind not in "fcmMO":
+            return False  # inteiros e booleanos do numpy não têm nulo
+        dados[inicio:fim] = np.datetime64("NaT") if dados.dtype.kind in "mM" else np.nan
+    else:
+        dados[inicio:fim] = serie.to_numpy()
+    return True
+
+
+def reservar_base(df):
+    """
+    Copia `df` (base ordenada por data) para vetores com folga.
+    Retorna (view equivalente a `df`, reserva), ou (`df`, None) se alguma
+    coluna tem tipo não suportado.
+    """
+    if df is None or "data" not in df.columns or not isinstance(df["data"].dtype, np.dtype):
+        return df, None
+    capacidade = _capacidade_reserva(len(df))
+    colunas = {}
+    for nome in df.columns:
+        coluna = _coluna_reservada(df[nome], capacidade)
+        if coluna is None:
+            return df, None
+        colunas[nome] = coluna
+    reserva = {"linhas": len(df), "capacidade": capacidade, "colunas": colunas}
+    return _quadro_reservado(reserva), reserva
+
+
+def _quadro_reservado(reserva):
+    """DataFrame (indexado por data, como em `_ordenar_por_data`) com views das linhas ocupadas da reserva."""
+    n = reserva["linhas"]
+    colunas = {}
+    for nome, coluna in reserva["colunas"].items():
+        if coluna["tipo"] == "arrow":
+            encadeado = pa.chunked_array(coluna["pedacos"], type=coluna["tipo_arrow"])
+            colunas[nome] = pd.array(encadeado, dtype=coluna["dtype"])
+        elif coluna["tipo"] == "categoria":
+            colunas[nome] = pd.Categorical.from_codes(coluna["vetores"][0][:n], dtype=coluna["dtype"], validate=False)
+        elif coluna["tipo"] == "mascara":
+            dados, mascara = coluna["vetores"]
+            colunas[nome] = coluna["dtype"].construct_array_type()(dados[:n], mascara[:n])
+        else:
+            colunas[nome] = coluna["vetores"][0][:n]
+    datas = pd.DatetimeIndex(reserva["colunas"]["data"]["vetores"][0][:n], copy=False)
+    return pd.DataFrame(colunas, index=datas, copy=False)
+
+
+def _anexar_reserva(reserva, bloco):
+    """Grava `bloco` após as linhas ocupadas; False se o bloco não cabe no formato da reserva."""
+    if not set(bloco.columns) <= set(reserva["colunas"]):
+        return False
+    inicio = reserva["linhas"]
+    if inicio + len(bloco) > reserva["capacidade"]:
+        reserva["capacidade"] = _capacidade_reserva(inicio + len(bloco))
+        for coluna in reserva["colunas"].values():
+            if "vetores" in coluna:
+                coluna["vetores"] = tuple(_realocar(v, inicio, reserva["capacidade"]) for v in coluna["vetores"])
+    for nome, coluna in reserva["colunas"].items():
+        if not _gravar_coluna(coluna, inicio, bloco[nome] if nome in bloco.columns else None, len(bloco)):
+            return False
+    reserva["linhas"] = inicio + len(bloco)
+    return True
+
+
+def anexar_linhas(df, indice, novos, reserva=None):
+    """
+    Acrescenta os blocos `novos` a `df` mantendo a ordem por data.
+
+    Se todas as linhas novas forem posteriores às existentes (caso normal de
+    arquivos que só crescem) e `df` for a view de `reserva` (ver
+    `reservar_base`), as linhas vão para o espaço livre da reserva, sem
+    reordenar nem copiar a base, e o índice acumulado é apenas estendido.
+    Linhas fora de ordem, ou colunas e tipos que a reserva não comporta,
+    remontam a base por concatenação (sem reserva). Sem `reserva`, a base
+    antiga nunca é alterada (uso para as linhas pendentes, temporárias).
+    Retorna (df, indice, reserva).
+    """
+    bloco = concatenar_blocos(novos)
+    no_fim = (
+        df is not None
+        and indice is not None
+        and "data" in bloco.columns
+        and bloco["data"].is_monotonic_increasing
+        and (df.empty or bloco.empty or bloco["data"].iloc[0] >= df["data"].iloc[-1])
+    )
+    if no_fim and reserva is not None and reserva["linhas"] == len(df) and _anexar_reserva(reserva, bloco):
+        estendido = _quadro_reservado(reserva)
+        return estendido, construir_indice_acumulado(estendido, indice, folga=True), reserva
+    partes = [df, bloco] if df is not None else [bloco]
+    combinado = _ordenar_por_data(concatenar_blocos(partes))
+    return combinado, construir_indice_acumulado(combinado, indice if no_fim else None), None
+
+
+def _ler_arquivo_seguro(caminho, entrada):
+    """
+    Versão de `ler_arquivo_incremental` para rodar no pool de leitura:
+    devolve o erro como texto em vez de propagar a exceção, para que o
+    relatório por arquivo (st.error) continue sendo feito na thread principal.
+    """
+    try:
+        return ler_arquivo_incremental(caminho, entrada) + (None,)
+    except Exception as e:
+        return None, None, None, str(e)
+
+
+@st.cache_resource(show_spinner=False)
+def estado_ingestao():
+    """
+    Estado da ingestão incremental, mantido pelo processo do Streamlit:
+    - "arquivos": por caminho, offset em bytes, nº de linhas, colunas,
+      bytes de controle e os blocos de linhas já processados;
+    - "base": DataFrame combinado com as linhas consolidadas;
+    - "indice": somas/contagens acumuladas de "base" (ver `construir_indice_acumulado`);
+    - "reserva": vetores com folga de que "base" é view, criados no primeiro
+      anexo (ver `reservar_base`); None enquanto "base" não os usa;
+    - "com_pendentes": (base, pendentes, dados, indice) da última combinação
+      da base com linhas pendentes, reaproveitada enquanto nada mudar;
+    - "lock": evita que duas sessões atualizem o estado ao mesmo tempo.
+    """
+    return {
+        "lock": threading.Lock(),
+        "arquivos": {},
+        "base": None,
+        "indice": None,
+        "reserva": None,
+        "com_pendentes": None,
+    }
+
+
+def atualizar_dados(arquivos):
+    """
+    Atualiza o DataFrame global "dados" lendo apenas o que chegou de novo.
+
+    - arquivos novos e trechos anexados são acrescentados à base existente;
+    - arquivo removido, truncado ou reescrito força a remontagem da base a
+      partir dos blocos já processados (só o arquivo alterado é relido).
+
+    Retorna (dados, indice, erros), onde `indice` é o índice acumulado de
+    "dados" e `erros` uma lista de (caminho, mensagem).
+    `dados` é None se nenhum arquivo pôde ser lido.
+    """
+    estado = estado_ingestao()
+    with estado["lock"]:
+        _blocos_da_base(estado)
+        registro = estado["arquivos"]
+        erros = []
+        remontar = estado["base"] is None or bool(set(registro) - set(arquivos))
+        for caminho in set(registro) - set(arquivos):
+            del registro[caminho]
+
+        # Leitura + conversões de cada arquivo em paralelo; `map` devolve os
+        # resultados na ordem de `arquivos`, então a montagem é determinística
+        entradas = [registro.get(c) for c in arquivos]
+        if NUM_WORKERS > 1 and len(arquivos) > 1:
+            with ThreadPoolExecutor(max_workers=NUM_WORKERS) as pool:
+                resultados = list(pool.map(_ler_arquivo_seguro, arquivos, entradas))
+        else:
+            resultados = [_ler_arquivo_seguro(c, e) for c, e in zip(arquivos, entradas)]
+
+        novos_blocos = []
+        for caminho, entrada, (entrada_nova, linhas_novas, modo, erro) in zip(arquivos, entradas, resultados):
+            if erro is not None:
+                erros.append((caminho, erro))
+                if registro.pop(caminho, None) is not None:
+                    remontar = True
+                continue
+
+            registro[caminho] = entrada_nova
+            if modo == "completo" and entrada is not None:
+                remontar = True
+            elif modo == "completo" or (linhas_novas is not None and not linhas_novas.empty):
+                novos_blocos.append(linhas_novas)
+
+        if remontar:
+            blocos = [b for c in arquivos if c in registro for b in registro[c]["blocos"]]
+            if blocos:
+                estado["base"] = _ordenar_por_data(concatenar_blocos(blocos))
+                estado["indice"] = construir_indice_acumulado(estado["base"])
+            else:
+                estado["base"], estado["indice"] = None, None
+            estado["reserva"] = None
+        elif novos_blocos:
+            if estado["reserva"] is None:
+                # Primeiro anexo desde a montagem: a base passa a ter folga
+                estado["base"], estado["reserva"] = reservar_base(estado["base"])
+            estado["base"], estado["indice"], estado["reserva"] = anexar_linhas(
+                estado["base"], estado["indice"], novos_blocos, estado["reserva"]
+            )
+
+        base, indice = estado["base"], estado["indice"]
+        pendentes = [registro[c]["pendente"] for c in arquivos if c in registro and not registro[c]["pendente"].empty]
+        if not pendentes:
+            estado["com_pendentes"] = None
+            return (base, indice, erros) if base is not None else (None, None, erros)
+
+        # Base + linhas pendentes: cópia temporária (a reserva da base não é
+        # tocada), refeita só quando a base ou alguma linha pendente muda
+        anterior = estado["com_pendentes"]
+        if (
+            anterior is not None
+            and anterior[0] is base
+            and len(anterior[1]) == len(pendentes)
+            and all(a is p for a, p in zip(anterior[1], pendentes))
+        ):
+            return anterior[2], anterior[3], erros
+        dados, indice, _ = anexar_linhas(base, indice, pendentes)
+        estado["com_pendentes"] = (base, pendentes, dados, indice)
+    return dados, indice, erros
+
+
+def ingestao_salvavel(dados, arquivos):
+    """
+    Entradas de `estado_ingestao` dos `arquivos`, para gravar com o snapshot
+    de `dados`; None se `dados` não é a própria base consolidada (havia
+    linhas pendentes, que a leitura incremental ainda vai reler).
+    """
+    estado = estado_ingestao()
+    with estado["lock"]:
+        if estado["base"] is not dados or not all(c in estado["arquivos"] for c in arquivos):
+            return None
+        return {c: estado["arquivos"][c] for c in arquivos}
+
+
+def semear_ingestao(dados, indice, ingestao):
+    """
+    Depois de um acerto no snapshot com a ingestão ainda vazia (processo
+    recém-iniciado), usa `dados` como base e as entradas salvas como estado
+    de cada arquivo: a próxima mudança nos CSV lê só os bytes novos. Os
+    blocos de cada arquivo só são separados da base se precisarem ser
+    remontados (ver `_blocos_da_base`).
+    """
+    if ingestao is None:
+        return
+    estado = estado_ingestao()
+    with estado["lock"]:
+        if estado["base"] is not None or estado["arquivos"]:
+            return
+        estado["base"], estado["indice"], estado["reserva"] = dados, indice, None
+        for caminho, entrada in ingestao.items():
+            estado["arquivos"][caminho] = {**entrada, "blocos": None, "pendente": pd.DataFrame()}
+
+
+def _blocos_da_base(estado):
+    """Blocos das entradas semeadas pelo snapshot: as linhas de cada arquivo na base (em ordem de data)."""
+    if all(entrada["blocos"] is not None for entrada in estado["arquivos"].values()):
+        return
+    base = estado["base"]
+    posicoes = (
+        base.groupby("__arquivo_origem", sort=False, observed=True).indices
+        if base is not None and "__arquivo_origem" in base.columns
+        else {}
+    )
+    for caminho, entrada in estado["arquivos"].items():
+        if entrada["blocos"] is None:
+            linhas = posicoes.get(os.path.basename(caminho))
+            entrada["blocos"] = [base.iloc[linhas].reset_index(drop=True)] if linhas is not None else []
+
+
+def formatos_data_lidos(arquivos):
+    """Formato de data detectado para cada arquivo já lido ({nome: formato})."""
+    registro = estado_ingestao()["arquivos"]
+    return {
+        os.path.basename(c): registro[c]["formato_data"]
+        for c in arquivos
+        if c in registro
+    }
+
+
+# -------------------- Snapshot colunar (opcional) --------------------
+def impressao_digital(caminho):
+    """Identifica a versão de um arquivo pelo trio (caminho, tamanho, mtime)."""
+    info = os.stat(caminho)
+    return (caminho, info.st_size, info.st_mtime_ns)
+
+
+def _caminhos_snapshot():
+    return (
+        os.path.join(PASTA_SNAPSHOT, "dados.arrow"),
+        os.path.join(PASTA_SNAPSHOT, "indice.arrow"),
+        os.path.join(PASTA_SNAPSHOT, "manifesto.json"),
+    )
+
+
+# Campos de cada arquivo em `estado_ingestao` guardados no manifesto: com
+# eles, a leitura incremental continua do offset salvo depois de um acerto
+_CAMPOS_INGESTAO = ("tamanho", "mtime_ns", "offset", "linhas", "colunas", "formato_data", "decimal", "crc_prefixo")
+
+
+def entrada_para_json(entrada):
+    """Campos de `_CAMPOS_INGESTAO` de uma entrada, com os bytes de controle em base64."""
+    return {**{k: entrada[k] for k in _CAMPOS_INGESTAO}, "controle": base64.b64encode(entrada["controle"]).decode()}
+
+
+def entrada_de_json(salva):
+    """Inverso de `entrada_para_json` (sem blocos: quem chama decide o que pôr neles)."""
+    return {**salva, "controle": base64.b64decode(salva["controle"])}
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def ler_snapshot(impressoes, colunas=None):
+    """
+    Abre o snapshot colunar via memory-map se o manifesto corresponder
+    exatamente às impressões digitais atuais dos CSV; senão retorna None.
+
+    `colunas` limita as colunas convertidas para pandas (as ausentes do
+    snapshot são ignoradas): o custo passa a depender de quantas colunas são
+    lidas, e não do tamanho do texto CSV. O índice acumulado vem pronto do
+    próprio snapshot, como views sobre o arquivo mapeado.
+    Retorna (dados, indice, formatos_data, ingestao), sendo `ingestao` as
+    entradas por arquivo para `estado_ingestao` (None se não foram salvas).
+    """
+    caminho_arrow, caminho_indice, caminho_manifesto = _caminhos_snapshot()
+    if feather is None or not all(os.path.exists(c) for c in _caminhos_snapshot()):
+        return None
+
+    try:
+        with open(caminho_manifesto, encoding="utf-8") as f:
+            manifesto = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if manifesto.get("versao") != VERSAO_CACHE or "linhas" not in manifesto:
+        return None
+    if [tuple(m) for m in manifesto.get("arquivos", [])] != list(impressoes):
+        return None
+
+    tabela = feather.read_table(caminho_arrow, memory_map=True)
+    if not set(COLUNAS_DERIVADAS).issubset(tabela.column_names) or tabela.num_rows != manifesto["linhas"]:
+        # Snapshot de uma versão anterior, sem as métricas derivadas atuais
+        return None
+    if colunas is not None:
+        tabela = tabela.select([c for c in tabela.column_names if c in colunas])
+    # Cada coluna vira seu próprio bloco e a tabela Arrow é liberada durante
+    # a conversão: sem a cópia consolidada de todas as colunas de uma vez
+    dados = _ordenar_por_data(tabela.to_pandas(split_blocks=True, self_destruct=True))
+    del tabela
+
+    tabela_indice = feather.read_table(caminho_indice, memory_map=True)
+    if tabela_indice.num_columns and tabela_indice.num_rows != len(dados) + 1:
+        return None
+    indice = {"linhas": len(dados), "soma": {}, "cont": {}}
+    for nome in tabela_indice.column_names:
+        tipo, col = nome.split(":", 1)
+        indice[tipo][col] = tabela_indice.column(nome).combine_chunks().to_numpy(zero_copy_only=True)
+
+    ingestao = manifesto.get("ingestao")
+    if ingestao is not None:
+        ingestao = {
+            caminho: entrada_de_json(entrada) for caminho, entrada in ingestao.items()
+        }
+    return dados, indice, manifesto.get("formatos_data", {}), ingestao
+
+
+def compactar_snapshot(dados, indice, impressoes, formatos, ingestao=None):
+    """
+    Grava "dados" e o índice acumulado como snapshot Arrow IPC (sem
+    compressão, para permitir memory-map) e o manifesto com as impressões
+    digitais dos CSV de origem e, se `ingestao` for dado, os offsets de cada
+    arquivo (ver `_CAMPOS_INGESTAO`). Os CSV continuam sendo a fonte da
+    verdade: o snapshot é só um cache.
+    """
+    if feather is None:
+        return
+    caminho_arrow, caminho_indice, caminho_manifesto = _caminhos_snapshot()
+    os.makedirs(PASTA_SNAPSHOT, exist_ok=True)
+
+    # Grava em arquivos temporários e troca de uma vez, para que uma leitura
+    # concorrente nunca encontre um snapshot pela metade
+    feather.write_feather(dados.reset_index(drop=True), caminho_arrow + ".tmp", compression="uncompressed")
+    colunas_indice = {
+        f"{tipo}:{col}": vetor for tipo in ("soma", "cont") for col, vetor in indice[tipo].items()
+    }
+    feather.write_feather(pa.table(colunas_indice), caminho_indice + ".tmp", compression="uncompressed")
+    manifesto = {
+        "versao": VERSAO_CACHE,
+        "arquivos": [list(i) for i in impressoes],
+        "linhas": len(dados),
+        "formatos_data": formatos,
+    }
+    if ingestao is not None:
+        manifesto["ingestao"] = {
+            caminho: entrada_para_json(entrada) for caminho, entrada in ingestao.items()
+        }
+    with open(caminho_manifesto + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifesto, f)
+    os.replace(caminho_arrow + ".tmp", caminho_arrow)
+    os.replace(caminho_indice + ".tmp", caminho_indice)
+    os.replace(caminho_manifesto + ".tmp", caminho_manifesto)
+
+
+@medir_etapa("ingestao")
+def carregar_dados(arquivos):
+    """
+    Ponto único de carga de "dados".
+
+    Com o snapshot ativo, usa o arquivo colunar (só as colunas usadas pela
+    página, as mesmas de `COLUNAS_BANCO`) enquanto nenhum CSV mudar; quando
+    algum muda, atualiza pela leitura incremental e recompacta. Depois de um
+    acerto logo ao iniciar o processo, a leitura incremental parte dos
+    offsets salvos no snapshot, e não do início dos arquivos.
+    Sem o snapshot, usa apenas a leitura incremental.
+
+    Retorna (dados, indice, erros, formatos_data).
+    """
+    if not (USAR_SNAPSHOT and feather is not None):
+        dados, indice, erros = atualizar_dados(arquivos)
+        return dados, indice, erros, formatos_data_lidos(arquivos)
+
+    impressoes = tuple(impressao_digital(c) for c in arquivos)
+    snapshot = ler_snapshot(impressoes, COLUNAS_BANCO)
+    if snapshot is not None:
+        dados, indice, formatos, ingestao = snapshot
+        semear_ingestao(dados, indice, ingestao)
+        return dados, indice, [], formatos
+
+    dados, indice, erros = atualizar_dados(arquivos)
+    formatos = formatos_data_lidos(arquivos)
+    if dados is not None and not erros:
+        try:
+            compactar_snapshot(dados, indice, impressoes, formatos, ingestao_salvavel(dados, arquivos))
+        except Exception as e:
+            erros.append((PASTA_SNAPSHOT, f"falha ao compactar snapshot: {e}"))
+    return dados, indice, erros, formatos
+
+
+if USAR_SNAPSHOT and feather is None:
+    with st.sidebar:
+        st.warning("Snapshot colunar requer o pacote `pyarrow`; usando leitura direta dos CSV.")
+
+
+if USAR_BANCO and BACKEND == "duckdb" and duckdb is None:
+    with st.sidebar:
+        st.warning("Backend DuckDB requer o pacote `duckdb`; usando SQLite.")
+
+
+# -------------------- Banco analítico embutido (opcional) --------------------
+# Colunas gravadas no banco: data, esquema numérico, métricas derivadas e texto.
+COLUNAS_DERIVADAS = ["perda_ovos", "ovos_defeituosos", "pct_defeituosos", "duzias_ovos", "racao_kg", "racao_kg_ave"]
+COLUNAS_BANCO = ["data", *colunas_num, *COLUNAS_DERIVADAS, "observacao", "__arquivo_origem"]
+
+
+@st.cache_resource(show_spinner=False)
+def banco_dados():
+    """
+    Conexão (uma por processo) com o banco local em PASTA_BANCO:
+    - "registros": uma linha por linha de CSV, já tipada e com as métricas derivadas;
+    - "arquivos": impressão digital, formato de data e colunas de cada CSV gravado,
+      mais os offsets da leitura incremental (`entrada_para_json`) e quantas
+      linhas pendentes foram gravadas, para continuar do ponto onde parou.
+    O lock serializa o uso da conexão entre as sessões e o observador.
+    """
+    os.makedirs(PASTA_BANCO, exist_ok=True)
+    if BACKEND == "duckdb" and duckdb is not None:
+        caminho = os.path.join(PASTA_BANCO, "avicultura.duckdb")
+        con = duckdb.connect(caminho)
+        tipos = {"data": "TIMESTAMP", "num": "DOUBLE", "texto": "VARCHAR"}
+    else:
+        caminho = os.path.join(PASTA_BANCO, "avicultura.sqlite")
+        con = sqlite3.connect(caminho, check_same_thread=False)
+        tipos = {"data": "TEXT", "num": "REAL", "texto": "TEXT"}
+
+    def tipo(col):
+        if col == "data":
+            return tipos["data"]
+        return tipos["texto"] if col in ("observacao", "__arquivo_origem") else tipos["num"]
+
+    # Banco gravado com outras colunas ou outra VERSAO_CACHE (versão anterior
+    # do app): é só um cache dos CSV, então recomeça do zero e a
+    # sincronização regrava tudo
+    con.execute("CREATE TABLE IF NOT EXISTS versao_cache (numero INTEGER)")
+    versao = con.execute("SELECT MAX(numero) FROM versao_cache").fetchone()[0]
+    existentes = [linha[1] for linha in con.execute("PRAGMA table_info(registros)").fetchall()]
+    if existentes and (existentes != COLUNAS_BANCO or versao != VERSAO_CACHE):
+        con.execute("DROP TABLE registros")
+        con.execute("DROP TABLE IF EXISTS arquivos")
+    if versao != VERSAO_CACHE:
+        con.execute("BEGIN TRANSACTION")
+        con.execute("DELETE FROM versao_cache")
+        con.execute("INSERT INTO versao_cache VALUES (?)", (VERSAO_CACHE,))
+        con.execute("COMMIT")
+
+    colunas = ", ".join(f'"{c}" {tipo(c)}' for c in COLUNAS_BANCO)
+    con.execute(f"CREATE TABLE IF NOT EXISTS registros ({colunas})")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_registros_data ON registros (data)")
+    con.execute(
+        f"CREATE TABLE IF NOT EXISTS arquivos (caminho {tipos['texto']} PRIMARY KEY, "
+        f"tamanho BIGINT, mtime_ns BIGINT, formato_data {tipos['texto']}, colunas {tipos['texto']}, "
+        f"ingestao {tipos['texto']})"
+    )
+    return {"con": con, "lock": threading.Lock(), "duckdb": tipos["data"] == "TIMESTAMP", "caminho": caminho}
+
+
+def _valor_data(banco, momento):
+    """Data no formato gravado no banco (TIMESTAMP no DuckDB, texto ISO no SQLite)."""
+    momento = pd.Timestamp(momento)
+    return momento.to_pydatetime() if banco["duckdb"] else momento.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _gravar_registros(banco, df):
+    """Insere as linhas de `df` em "registros" (colunas ausentes viram NULL)."""
+    tabela = valores_exatos(df.reindex(columns=COLUNAS_BANCO))
+    if banco["duckdb"]:
+        banco["con"].register("_novos_registros", tabela)
+        banco["con"].execute("INSERT INTO registros SELECT * FROM _novos_registros")
+        banco["con"].unregister("_novos_registros")
+        return
+
+    tabela["data"] = tabela["data"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    numericas = colunas_num + COLUNAS_DERIVADAS
+    tabela[numericas] = tabela[numericas].astype("float64")
+    tabela = tabela.astype(object).where(tabela.notna(), None)
+    marcadores = ", ".join("?" for _ in COLUNAS_BANCO)
+    banco["con"].executemany(
+        f"INSERT INTO registros VALUES ({marcadores})",
+        tabela.itertuples(index=False, name=None),
+    )
+
+
+def _remover_arquivo_banco(banco, caminho):
+    banco["con"].execute('DELETE FROM registros WHERE "__arquivo_origem" = ?', (os.path.basename(caminho),))
+    banco["con"].execute("DELETE FROM arquivos WHERE caminho = ?", (caminho,))
+
+
+def _remover_pendentes_banco(banco, caminho, quantidade):
+    """Apaga as `quantidade` últimas linhas gravadas de `caminho` (a linha pendente da leitura anterior)."""
+    if quantidade:
+        banco["con"].execute(
+            'DELETE FROM registros WHERE rowid IN (SELECT rowid FROM registros '
+            'WHERE "__arquivo_origem" = ? ORDER BY rowid DESC LIMIT ?)',
+            (os.path.basename(caminho), quantidade),
+        )
+
+
+def sincronizar_banco(arquivos):
+    """
+    Deixa o banco em dia com os CSV. Só arquivos novos ou com impressão
+    digital diferente são lidos, um de cada vez (a memória usada é a do
+    maior arquivo, não a do histórico); arquivos removidos saem do banco.
+    Um arquivo que só cresceu continua do offset gravado em "arquivos"
+    (ver `ler_arquivo_incremental`): só as linhas anexadas são inseridas,
+    no lugar da linha pendente da sincronização anterior.
+    Como o banco fica em disco, um novo processo não relê nada que não mudou.
+
+    Retorna a lista de erros (caminho, mensagem).
+    """
+    banco = banco_dados()
+    erros = []
+    with banco["lock"]:
+        con = banco["con"]
+        gravados = {
+            linha[0]: linha[1:]
+            for linha in con.execute("SELECT caminho, tamanho, mtime_ns, colunas, ingestao FROM arquivos").fetchall()
+        }
+        con.execute("BEGIN TRANSACTION")
+        try:
+            for caminho in set(gravados) - set(arquivos):
+                _remover_arquivo_banco(banco, caminho)
+
+            for caminho in arquivos:
+                info = os.stat(caminho)
+                tamanho, mtime_ns, colunas, ingestao = gravados.get(caminho, (None,) * 4)
+                if (tamanho, mtime_ns) == (info.st_size, info.st_mtime_ns):
+                    continue
+                anterior, pendentes = None, 0
+                if ingestao is not None:
+                    salva = json.loads(ingestao)
+                    pendentes = salva.pop("pendentes")
+                    anterior = {**entrada_de_json(salva), "blocos": []}
+                try:
+                    entrada, linhas, modo = ler_arquivo_incremental(caminho, anterior)
+                except Exception as e:
+                    _remover_arquivo_banco(banco, caminho)
+                    erros.append((caminho, str(e)))
+                    continue
+
+                if modo == "anexado":
+                    _remover_pendentes_banco(banco, caminho, pendentes)
+                    con.execute("DELETE FROM arquivos WHERE caminho = ?", (caminho,))
+                else:
+                    _remover_arquivo_banco(banco, caminho)
+                df = concatenar_blocos([linhas, entrada["pendente"]])
+                _gravar_registros(banco, df)
+                if modo != "anexado":
+                    colunas = json.dumps(list(df.columns))
+                con.execute(
+                    "INSERT INTO arquivos VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        caminho, entrada["tamanho"], entrada["mtime_ns"], entrada["formato_data"],
+                        colunas, json.dumps({**entrada_para_json(entrada), "pendentes": len(entrada["pendente"])}),
+                    ),
+                )
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+    return erros
+
+
+def consultar_banco(sql, parametros=()):
+    """Executa uma consulta no banco e devolve todas as linhas (lista de tuplas)."""
+    banco = banco_dados()
+    with banco["lock"]:
+        return banco["con"].execute(sql, parametros).fetchall()
+
+
+@medir_etapa("ingestao")
+def carregar_banco(arquivos):
+    """
+    Sincroniza o banco e devolve só os metadados do conjunto: nada das linhas
+    é carregado aqui. Retorna (erros, formatos_data, colunas, linhas, extremos),
+    onde `colunas` segue a ordem de COLUNAS_BANCO e `extremos` é
+    (data mínima, data máxima) ou None se não houver linhas com data.
+    """
+    erros = sincronizar_banco(arquivos)
+    nomes = {os.path.basename(c) for c in arquivos}
+
+    formatos, presentes = {}, set()
+    for caminho, formato, colunas in consultar_banco("SELECT caminho, formato_data, colunas FROM arquivos"):
+        if os.path.basename(caminho) in nomes:
+            formatos[os.path.basename(caminho)] = formato
+            presentes.update(json.loads(colunas))
+
+    linhas, data_min, data_max = consultar_banco(
+        "SELECT COUNT(*), MIN(data), MAX(data) FROM registros WHERE data IS NOT NULL"
+    )[0]
+    extremos = (pd.Timestamp(data_min), pd.Timestamp(data_max)) if linhas else None
+    colunas = [c for c in COLUNAS_BANCO if c in presentes]
+    return erros, formatos, colunas, linhas, extremos
+
+
+def consultar_periodo(colunas, ini, fim):
+    """
+    Linhas do período [ini, fim] (inclusivo) com apenas `colunas`, lidas do
+    banco já ordenadas e indexadas por data, como as fatias de "dados".
+    """
+    banco = banco_dados()
+    pedidas = colunas if "data" in colunas else ["data", *colunas]
+    lista = ", ".join(f'"{c}"' for c in pedidas)
+    linhas = consultar_banco(
+        f"SELECT {lista} FROM registros WHERE data >= ? AND data < ? ORDER BY data, rowid",
+        (_valor_data(banco, ini), _valor_data(banco, pd.Timestamp(fim) + pd.Timedelta(days=1))),
+    )
+    return _ordenar_por_data(_quadro_registros(linhas, pedidas))[colunas]
+
+
+def _quadro_registros(linhas, colunas):
+    """DataFrame tipado (datas e float64) a partir de linhas lidas de "registros"."""
+    df = pd.DataFrame.from_records(linhas, columns=colunas)
+    if "data" in df.columns:
+        df["data"] = pd.to_datetime(df["data"])
+    tipos = {c: "float64" for c in colunas if c in ESQUEMA_NUMERICO or c in COLUNAS_DERIVADAS}
+    return df.astype(tipos)
+
+
+def _filtro_tabela_banco(banco, ini, fim, arquivos):
+    filtro = "data >= ? AND data < ?"
+    parametros = [_valor_data(banco, ini), _valor_data(banco, pd.Timestamp(fim) + pd.Timedelta(days=1))]
+    if arquivos:
+        filtro += f' AND "__arquivo_origem" IN ({", ".join("?" for _ in arquivos)})'
+        parametros += list(arquivos)
+    return filtro, parametros
+
+
+def contar_tabela_banco(ini, fim, arquivos):
+    """Nº de linhas do período (e dos arquivos escolhidos), contado no banco."""
+    filtro, parametros = _filtro_tabela_banco(banco_dados(), ini, fim, arquivos)
+    return consultar_banco(f"SELECT COUNT(*) FROM registros WHERE {filtro}", parametros)[0][0]
+
+
+def pagina_tabela_banco(colunas, ini, fim, ordem, decrescente, arquivos, tamanho, pagina):
+    """
+    Uma página da tabela detalhada: filtro, ordenação e LIMIT/OFFSET no banco,
+    de modo que só as linhas da página são lidas e serializadas.
+    """
+    if ordem not in COLUNAS_BANCO:
+        raise ValueError(f"Coluna de ordenação desconhecida: {ordem}")
+    filtro, parametros = _filtro_tabela_banco(banco_dados(), ini, fim, arquivos)
+    lista = ", ".join(f'"{c}"' for c in colunas)
+    direcao = "DESC" if decrescente else "ASC"
+    linhas = consultar_banco(
+        f'SELECT {lista} FROM registros WHERE {filtro} '
+        f'ORDER BY "{ordem}" {direcao} NULLS LAST, data, rowid LIMIT ? OFFSET ?',
+        parametros + [tamanho, (pagina - 1) * tamanho],
+    )
+    return _quadro_registros(linhas, colunas)
+
+
+def blocos_banco(colunas, ini, fim, tamanho):
+    """
+    Linhas do período em blocos de até `tamanho` linhas, lidas por um cursor
+    em conexão própria (leitores não seguram o lock das outras sessões).
+    Sempre produz ao menos um bloco, mesmo vazio.
+    """
+    banco = banco_dados()
+    con = banco["con"].cursor() if banco["duckdb"] else sqlite3.connect(banco["caminho"])
+    try:
+        lista = ", ".join(f'"{c}"' for c in colunas)
+        cursor = con.execute(
+            f"SELECT {lista} FROM registros WHERE data >= ? AND data < ? ORDER BY data, rowid",
+            (_valor_data(banco, ini), _valor_data(banco, pd.Timestamp(fim) + pd.Timedelta(days=1))),
+        )
+        while True:
+            linhas = cursor.fetchmany(tamanho)
+            yield _quadro_registros(linhas, colunas)
+            if len(linhas) < tamanho:
+                break
+    finally:
+        con.close()
+
+
+def agregados_banco(ini, fim):
+    """
+    Número de linhas e, para cada coluna de COLUNAS_INDICE, soma e contagem de
+    valores válidos no período [ini, fim], em uma única consulta agregada.
+    """
+    banco = banco_dados()
+    partes = ", ".join(f'SUM("{c}"), COUNT("{c}")' for c in COLUNAS_INDICE)
+    linha = consultar_banco(
+        f"SELECT COUNT(*), {partes} FROM registros WHERE data >= ? AND data < ?",
+        (_valor_data(banco, ini), _valor_data(banco, pd.Timestamp(fim) + pd.Timedelta(days=1))),
+    )[0]
+    agregados = {"linhas": linha[0], "soma": {}, "cont": {}}
+    for i, col in enumerate(COLUNAS_INDICE):
+        agregados["soma"][col] = float(linha[1 + 2 * i] or 0.0)
+        agregados["cont"][col] = int(linha[2 + 2 * i])
+    return agregados
+
+# -------------------- Conjunto de dados compartilhado entre sessões --------------------
+@medir_etapa("ingestao_auxiliar")
+def preparar_mistura(caminho):
+    """
+    Lê `mistura_racao.csv` no formato usado pela seção de mistura
+    (colunas canônicas, datas convertidas, ordenado por data).
+    Retorna (df, erro); df None e erro None = arquivo inexistente.
+    """
+    if not os.path.exists(caminho):
+        return None, None
+    try:
+        df_mist = ler_csv_tipado(caminho)
+    except Exception as e:
+        return None, f"Erro ao ler `{caminho}`: {e}"
+
+    colunas_alvo_mist = ["data", "milho_pct", "calcario_pct", "farelo_soja_pct", "nucleo_pct"]
+    for destino in colunas_alvo_mist:
+        if destino not in df_mist.columns:
+            return None, (
+                f"Não encontrei coluna correspondente a '{destino}'. "
+                f"Colunas atuais em mistura_racao.csv: {list(df_mist.columns)}"
+            )
+
+    df_mist = df_mist[colunas_alvo_mist]
+    df_mist["data"], _ = converter_datas(df_mist["data"])
+    return _ordenar_por_data(df_mist.dropna(subset=["data"])), None
+
+
+@medir_etapa("ingestao_auxiliar")
+def preparar_consumo(caminho):
+    """
+    Lê `consumo_racao.csv` (consumo já numérico, aceitando vírgula), ordenado
+    e indexado por data. Retorna (df, erro); df None e erro None = arquivo inexistente.
+    """
+    if not os.path.exists(caminho):
+        return None, None
+    try:
+        df_consumo = ler_csv_tipado(caminho)
+    except Exception as e:
+        return None, f"Erro ao ler `{caminho}`: {e}"
+
+    if not {"data", "consumo_g_ave_dia"}.issubset(df_consumo.columns):
+        return None, (
+            "O arquivo `consumo_racao.csv` deve conter as colunas "
+            "`data` e `consumo_g_ave_dia`."
+        )
+
+    # Converte data (formato detectado pela amostra do arquivo)
+    df_consumo["data"], _ = converter_datas(df_consumo["data"])
+    return _ordenar_por_data(df_consumo.dropna(subset=["data"])), None
+
+
+# -------------------- Formulação vigente e desempenho por formulação --------------------
+# `mistura_racao.csv` só registra as datas de troca da formulação: cada
+# registro diário pertence à última troca feita até a sua data (junção "as-of").
+COLUNAS_FORMULACAO = ["milho_pct", "farelo_soja_pct", "calcario_pct", "nucleo_pct"]
+COLUNAS_DESEMPENHO = ["consumo_g_ave_dia", "ovos_granja", "pct_defeituosos", "perda_ovos"]
+
+
+def trocas_formulacao(df_mist):
+    """Formulações de `mistura_racao.csv`, uma por data de troca (a última registrada no dia prevalece)."""
+    return df_mist.drop_duplicates(subset="data", keep="last")
+
+
+def custo_kg_formulacoes(df_mist, precos):
+    """Custo (R$/kg de ração) de cada formulação: média dos preços ponderada pelas porcentagens."""
+    pesos = df_mist[COLUNAS_FORMULACAO].to_numpy(dtype="float64", na_value=np.nan) / 100
+    return pesos @ np.array([precos[col] for col in COLUNAS_FORMULACAO], dtype="float64")
+
+
+def _somas_formulacoes_memoria(dados, indice, trocas, colunas, inicio=0, fim_excl=None):
+    """
+    Linhas, somas e contagens de `colunas` por formulação, nas linhas
+    [inicio, fim_excl), a partir do índice acumulado. Com os dados em ordem
+    de data, a junção "as-of" é uma busca binária por troca: a formulação k
+    vale nas linhas [limites[k], limites[k + 1]).
+    """
+    fim_excl = len(dados) if fim_excl is None else fim_excl
+    limites = np.clip(np.append(dados.index.searchsorted(trocas, side="left"), fim_excl), inicio, fim_excl)
+    somas = {"linhas": np.diff(limites), "soma": {}, "cont": {}}
+    for col in colunas:
+        if col in indice["soma"]:
+            somas["soma"][col] = np.diff(indice["soma"][col][limites])
+            somas["cont"][col] = np.diff(indice["cont"][col][limites])
+    somas["sem_formulacao"] = int(limites[0] - inicio)
+    return somas
+
+
+def _somas_formulacoes_producao(dados, trocas, colunas):
+    """
+    Como `_somas_formulacoes_memoria`, mas só nas linhas de produção diária
+    (com `ovos_granja`): as linhas de `mistura_racao.csv` e de
+    `consumo_racao.csv`, que também entram em "dados", ficam de fora, e o
+    consumo de cada dia vem apenas do registro do lote. O índice acumulado
+    soma todas as linhas, então aqui as linhas são percorridas uma vez
+    (`np.bincount` pelo código da formulação de cada linha).
+    """
+    m = len(trocas)
+    somas = {"linhas": np.zeros(m, dtype="int64"), "soma": {}, "cont": {}, "sem_formulacao": 0}
+    colunas = [c for c in colunas if c in dados.columns]
+    producao = (
+        dados["ovos_granja"].notna().to_numpy() if "ovos_granja" in dados.columns else np.zeros(len(dados), dtype=bool)
+    )
+    codigos = np.searchsorted(trocas, dados.index.to_numpy()[producao], side="right") - 1
+    com_formulacao = codigos >= 0
+    somas["sem_formulacao"] = int((~com_formulacao).sum())
+    codigos = codigos[com_formulacao]
+    somas["linhas"] = np.bincount(codigos, minlength=m)
+    for col in colunas:
+        valores = dados[col].to_numpy(dtype="float64", na_value=np.nan)[producao][com_formulacao]
+        validos = ~np.isnan(valores)
+        somas["soma"][col] = np.bincount(codigos[validos], weights=valores[validos], minlength=m)
+        somas["cont"][col] = np.bincount(codigos[validos], minlength=m)
+    return somas
+
+
+def _somas_formulacoes_banco(presentes, trocas, colunas, ini=None, fim=None, apenas_producao=False):
+    """
+    Linhas, somas e contagens de `colunas` por formulação numa única consulta
+    agrupada (opcionalmente restrita ao período [ini, fim]): o código da
+    formulação de cada registro sai de um CASE com as trocas (da mais
+    recente para a mais antiga). Com `apenas_producao`, só entram as linhas
+    de produção diária (ver `_somas_formulacoes_producao`).
+    """
+    banco = banco_dados()
+    colunas = [c for c in colunas if c in presentes]
+    caso = " ".join(f"WHEN data >= ? THEN {k}" for k in range(len(trocas) - 1, -1, -1))
+    partes = "".join(f', SUM("{c}"), COUNT("{c}")' for c in colunas)
+    filtro, parametros = "data IS NOT NULL", [_valor_data(banco, t) for t in reversed(trocas)]
+    if ini is not None:
+        filtro = "data >= ? AND data < ?"
+        parametros += [_valor_data(banco, ini), _valor_data(banco, pd.Timestamp(fim) + pd.Timedelta(days=1))]
+    if apenas_producao:
+        filtro += ' AND "ovos_granja" IS NOT NULL'
+    linhas = consultar_banco(
+        f"SELECT CASE {caso} ELSE -1 END AS formulacao, COUNT(*){partes} "
+        f"FROM registros WHERE {filtro} GROUP BY formulacao",
+        tuple(parametros),
+    )
+    m = len(trocas)
+    somas = {"linhas": np.zeros(m, dtype="int64"), "soma": {}, "cont": {}, "sem_formulacao": 0}
+    for col in colunas:
+        somas["soma"][col], somas["cont"][col] = np.zeros(m), np.zeros(m, dtype="int64")
+    for k, total, *valores in linhas:
+        if k < 0:
+            somas["sem_formulacao"] = total
+            continue
+        somas["linhas"][k] = total
+        for i, col in enumerate(colunas):
+            somas["soma"][col][k] = valores[2 * i] or 0.0
+            somas["cont"][col][k] = valores[2 * i + 1]
+    return somas
+
+
+def diarios_previsao_banco(presentes):
+    """
+    Totais diários de COLUNAS_PREVISAO por lote numa consulta agrupada
+    (mesmo formato de `diarios_previsao`).
+    """
+    banco = banco_dados()
+    colunas = [c for c in COLUNAS_PREVISAO if c in presentes]
+    if not colunas or "__arquivo_origem" not in presentes:
+        return pd.DataFrame(columns=["lote", "coluna", "dia", "soma", "cont"])
+    dia = "CAST(data AS DATE)" if banco["duckdb"] else "substr(data, 1, 10)"
+    partes = "".join(f', SUM("{c}"), COUNT("{c}")' for c in colunas)
+    linhas = consultar_banco(
+        f'SELECT "__arquivo_origem", {dia} AS dia{partes} FROM registros WHERE data IS NOT NULL '
+        f'GROUP BY "__arquivo_origem", dia ORDER BY "__arquivo_origem", dia'
+    )
+    quadro = pd.DataFrame(linhas, columns=["lote", "dia", *[f"{p}_{c}" for c in colunas for p in ("soma", "cont")]])
+    quadro["dia"] = pd.to_datetime(quadro["dia"])
+    resultado = pd.concat(
+        [
+            pd.DataFrame({
+                "lote": quadro["lote"],
+                "coluna": col,
+                "dia": quadro["dia"],
+                "soma": quadro[f"soma_{col}"].astype("float64").fillna(0.0),
+                "cont": quadro[f"cont_{col}"].astype("int64"),
+            })
+            for col in colunas
+        ],
+        ignore_index=True,
+    )
+    return resultado[resultado["cont"] > 0]
+
+
+@medir_etapa("formulacoes")
+def desempenho_por_formulacao(dados, colunas, extremos, df_mist):
+    """
+    Uma linha por formulação de `mistura_racao.csv`: vigência (início e fim),
+    composição, nº de registros diários de produção (linhas com
+    `ovos_granja`) e médias de consumo, produção, % de não conformes e
+    perdas nesses registros.
+
+    Os agregados saem de uma só passada: em memória, pelas linhas de
+    produção; no banco, de uma consulta agrupada.
+    Retorna (df, nº de registros anteriores à primeira formulação), ou
+    (None, 0) sem dados diários ou sem formulações.
+    """
+    if df_mist is None or df_mist.empty or extremos is None:
+        return None, 0
+    df_mist = trocas_formulacao(df_mist)
+    trocas = df_mist["data"].to_numpy()
+    if dados is not None:
+        somas = _somas_formulacoes_producao(dados, trocas, COLUNAS_DESEMPENHO)
+    else:
+        somas = _somas_formulacoes_banco(colunas, trocas, COLUNAS_DESEMPENHO, apenas_producao=True)
+
+    inicio = df_mist["data"].reset_index(drop=True)
+    fim = pd.concat([inicio.iloc[1:] - pd.Timedelta(days=1), pd.Series([extremos[1]])], ignore_index=True)
+    resultado = pd.DataFrame({"inicio": inicio, "fim": fim.clip(lower=inicio)})
+    resultado[COLUNAS_FORMULACAO] = df_mist[COLUNAS_FORMULACAO].to_numpy()
+    resultado["registros"] = somas["linhas"]
+    for col in COLUNAS_DESEMPENHO:
+        if col in somas["soma"]:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                resultado[col] = somas["soma"][col] / somas["cont"][col]
+    return resultado, somas["sem_formulacao"]
+
+
+@st.cache_resource(show_spinner=False)
+def registro_conjuntos():
+    """
+    Registro, por processo, do conjunto de dados atual e de quantas sessões
+    usam cada versão. Todas as sessões recebem o MESMO conjunto (somente
+    leitura); cada uma guarda apenas as próprias fatias do período.
+    """
+    return {"lock": threading.Lock(), "atual": None, "impressoes": None, "versao": 0, "refs": {}}
+
+
+def obter_conjunto(arquivos):
+    """
+    Conjunto de dados compartilhado para a lista de arquivos atual.
+
+    Enquanto nenhum arquivo mudar, devolve o mesmo objeto a todas as sessões.
+    Havendo mudança, a primeira sessão que perceber monta uma nova versão
+    (as demais esperam no lock em vez de repetir a leitura).
+
+    O conjunto é um dicionário com: "versao", "dados", "indice", "erros",
+    "formatos", "colunas", "linhas", "extremos" (datas mínima e máxima),
+    "mistura" e "consumo" (estes dois como (df, erro)), "formulacoes" (ver
+    `desempenho_por_formulacao`) e "impressoes_aux" (impressões digitais
+    dos arquivos de mistura/consumo).
+    Com o banco analítico ativo, "dados" e "indice" são None.
+    Nada nele deve ser alterado no lugar. Estatísticas móveis e previsões
+    ficam fora dele, em passos à parte (ver `passo_derivado`).
+    """
+    impressoes = tuple(impressao_digital(c) for c in arquivos)
+    registro = registro_conjuntos()
+    with registro["lock"]:
+        anterior = registro["atual"]
+        if anterior is not None and registro["impressoes"] == impressoes:
+            return anterior
+
+        if USAR_BANCO:
+            # Linhas ficam no banco; o conjunto guarda só os metadados
+            dados, indice = None, None
+            erros, formatos, colunas, linhas, extremos = carregar_banco(arquivos)
+        else:
+            dados, indice, erros, formatos = carregar_dados(arquivos)
+            colunas = list(dados.columns) if dados is not None else []
+            linhas = len(dados) if dados is not None else 0
+            tem_datas = linhas and "data" in colunas
+            extremos = (dados.index[0], dados.index[-1]) if tem_datas else None
+
+        registro["versao"] += 1
+        conjunto = {
+            "versao": registro["versao"],
+            "dados": dados,
+            "indice": indice,
+            "erros": erros,
+            "formatos": formatos,
+            "colunas": colunas,
+            "linhas": linhas,
+            "extremos": extremos,
+        }
+        # Tabelas auxiliares só são refeitas se o próprio arquivo mudou
+        for chave, preparar in (("mistura", preparar_mistura), ("consumo", preparar_consumo)):
+            caminho = os.path.join(PASTA_DADOS, f"{chave}_racao.csv")
+            impressao = impressao_digital(caminho) if os.path.exists(caminho) else None
+            if anterior is not None and anterior["impressoes_aux"].get(chave) == impressao:
+                conjunto[chave] = anterior[chave]
+            else:
+                conjunto[chave] = preparar(caminho)
+            conjunto.setdefault("impressoes_aux", {})[chave] = impressao
+
+        conjunto["formulacoes"] = desempenho_por_formulacao(dados, colunas, extremos, conjunto["mistura"][0])
+
+        registro["atual"], registro["impressoes"] = conjunto, impressoes
+        return conjunto
+
+
+class _ReferenciaConjunto:
+    """Marca, no estado da sessão, a versão do conjunto que ela está usando."""
+
+    __slots__ = ("versao", "__weakref__")
+
+    def __init__(self, versao):
+        self.versao = versao
+
+
+def _liberar_conjunto(versao):
+    registro = registro_conjuntos()
+    with registro["lock"]:
+        restantes = registro["refs"].get(versao, 0) - 1
+        if restantes > 0:
+            registro["refs"][versao] = restantes
+        else:
+            registro["refs"].pop(versao, None)
+
+
+def usar_conjunto(conjunto):
+    """
+    Registra que a sessão atual usa `conjunto` e devolve quantas sessões
+    usam essa versão. A referência anterior da sessão é liberada quando
+    substituída, e a atual quando a sessão termina (o estado é descartado).
+    """
+    registro = registro_conjuntos()
+    ref = st.session_state.get("_conjunto_ref")
+    if ref is None or ref.versao != conjunto["versao"]:
+        with registro["lock"]:
+            registro["refs"][conjunto["versao"]] = registro["refs"].get(conjunto["versao"], 0) + 1
+        ref = _ReferenciaConjunto(conjunto["versao"])
+        weakref.finalize(ref, _liberar_conjunto, conjunto["versao"])
+        st.session_state["_conjunto_ref"] = ref
+    return registro["refs"].get(conjunto["versao"], 0)
+
+
+# -------------------- Passos derivados do conjunto --------------------
+# Cálculos sobre o conjunto que não entram nos KPIs (estatísticas móveis,
+# previsões):
+# cada passo roda uma vez por versão, quando alguma seção pede, partindo do
+# último resultado bem-sucedido. Uma falha fica no próprio passo (a seção
+# avisa e segue sem ele), sem impedir a montagem do conjunto nem os KPIs.
+CACHE_DERIVADOS_MAX_VERSOES = 2  # por passo (sessões em versões vizinhas)
+
+
+@st.cache_resource(show_spinner=False)
+def registro_derivados():
+    """Resultados por passo, em ordem LRU: nome -> {versão: (resultado, erro)}, e o último sucesso de cada passo."""
+    return {"lock": threading.Lock(), "locks": {}, "itens": {}, "ultimo": {}}
+
+
+def passo_derivado(nome, conjunto, calcular):
+    """
+    (resultado, erro) do passo `nome` para a versão de `conjunto`:
+    `calcular(conjunto, anterior)`, com `anterior` = último resultado
+    bem-sucedido do passo (de qualquer versão) ou None. Se `calcular` falhar,
+    devolve (None, mensagem) e a falha vale para a versão inteira.
+    """
+    registro = registro_derivados()
+    with registro["lock"]:
+        lock = registro["locks"].setdefault(nome, threading.Lock())
+        itens = registro["itens"].setdefault(nome, OrderedDict())
+    with lock:
+        if conjunto["versao"] in itens:
+            itens.move_to_end(conjunto["versao"])
+            return itens[conjunto["versao"]]
+        try:
+            item = (calcular(conjunto, registro["ultimo"].get(nome)), None)
+            registro["ultimo"][nome] = item[0]
+        except Exception as e:
+            item = (None, f"{type(e).__name__}: {e}")
+        itens[conjunto["versao"]] = item
+        while len(itens) > CACHE_DERIVADOS_MAX_VERSOES:
+            itens.popitem(last=False)
+        return item
+
+
+def _calcular_tendencias_conjunto(conjunto, anterior):
+    df_consumo = conjunto["consumo"][0]
+    return {
+        "dados": calcular_tendencias(conjunto["dados"], anterior and anterior["dados"])
+        if conjunto["dados"] is not None
+        else None,
+        "consumo": calcular_tendencias(df_consumo, anterior and anterior["consumo"])
+        if df_consumo is not None
+        else None,
+    }
+
+
+@medir_etapa("tendencias")
+def tendencias_conjunto(conjunto):
+    """
+    ({"dados", "consumo"}, erro): estatísticas móveis (ver
+    `calcular_tendencias`) das linhas do conjunto em memória (None no banco)
+    e do arquivo de consumo.
+    """
+    return passo_derivado("tendencias", conjunto, _calcular_tendencias_conjunto)
+
+
+def _calcular_previsoes_conjunto(conjunto, anterior):
+    modelos = anterior["modelos"] if anterior is not None else {}
+    if conjunto["dados"] is not None:
+        acumulados = acumular_diarios(conjunto["dados"], anterior and anterior["diarios"])
+        return {"modelos": atualizar_modelos(modelos, acumulados["diarios"]), "diarios": acumulados}
+    if USAR_BANCO:
+        return {"modelos": atualizar_modelos(modelos, diarios_previsao_banco(set(conjunto["colunas"]))), "diarios": None}
+    return {"modelos": {}, "diarios": None}
+
+
+@medir_etapa("previsoes")
+def previsoes_conjunto(conjunto):
+    """
+    (modelos, erro): modelos de previsão por lote e coluna (ver
+    `atualizar_modelos`) sobre os totais diários do histórico inteiro,
+    partindo dos modelos e dos totais diários (ver `acumular_diarios`) da
+    versão anterior.
+    """
+    resultado, erro = passo_derivado("previsoes", conjunto, _calcular_previsoes_conjunto)
+    return (resultado["modelos"] if resultado is not None else None), erro
+
+
+# -------------------- Observador da pasta de dados --------------------
+# Uma thread em segundo plano percebe CSV novos/alterados e monta a nova versão
+# do conjunto fora das requisições; as sessões abertas só trocam de versão.
+# Usa eventos do sistema de arquivos (watchdog/inotify) quando disponível e,
+# senão, verifica a pasta a cada INTERVALO_OBSERVADOR segundos.
+# Desative com AVICULTURA_OBSERVADOR=0.
+USAR_OBSERVADOR = os.environ.get("AVICULTURA_OBSERVADOR", "1") == "1"
+INTERVALO_OBSERVADOR = numero_ambiente("AVICULTURA_INTERVALO_OBSERVADOR", 2.0, float)
+
+
+def _vigiar_pasta(evento):
+    """
+    Laço da thread do observador: espera um aviso do watchdog (ou o tempo de
+    verificação) e remonta o conjunto se algum CSV mudou. Com eventos, ainda
+    verifica a pasta de tempos em tempos, caso algum evento se perca.
+    """
+    espera = INTERVALO_OBSERVADOR * (15 if Observer is not None else 1)
+    while True:
+        if evento.wait(espera):
+            # Agrupa rajadas de eventos (cópia de arquivo em vários writes)
+            time.sleep(0.5)
+        evento.clear()
+        try:
+            obter_conjunto(listar_csv())
+        except Exception:
+            # Erros por arquivo já ficam em conjunto["erros"]; qualquer outra
+            # falha (ex.: arquivo sumiu no meio da leitura) é tentada de novo
+            # na próxima volta
+            pass
+
+
+@st.cache_resource(show_spinner=False)
+def observador_dados():
+    """
+    Inicia (uma vez por processo) a thread que acompanha a pasta de dados.
+    Retorna "eventos" (watchdog/inotify) ou "verificação periódica".
+    """
+    evento = threading.Event()
+    modo = "verificação periódica"
+    if Observer is not None:
+        class _AvisoCsv(FileSystemEventHandler):
+            def on_any_event(self, ev):
+                caminhos = (ev.src_path, getattr(ev, "dest_path", "") or "")
+                if any(str(c).endswith(".csv") for c in caminhos):
+                    evento.set()
+
+        try:
+            observador = Observer()
+            observador.schedule(_AvisoCsv(), PASTA_DADOS, recursive=False)
+            observador.daemon = True
+            observador.start()
+            modo = "eventos"
+        except Exception:
+            pass
+
+    threading.Thread(target=_vigiar_pasta, args=(evento,), name="observador-dados", daemon=True).start()
+    return modo
+
+
+@st.fragment(run_every=INTERVALO_OBSERVADOR)
+def aviso_nova_versao():
+    """
+    Verifica, a cada INTERVALO_OBSERVADOR segundos, se o observador publicou
+    uma versão nova do conjunto; se sim, reexecuta a página da sessão (a
+    leitura já foi feita em segundo plano, então o rerun só pega o resultado).
+    """
+    ref = st.session_state.get("_conjunto_ref")
+    atual = registro_conjuntos()["atual"]
+    if ref is not None and atual is not None and atual["versao"] != ref.versao:
+        st.rerun()
+
+
+if USAR_OBSERVADOR:
+    modo_observador = observador_dados()
+
+
+# Lê todos os CSV (ou o snapshot colunar) uma vez por processo e versão dos arquivos
+conjunto = obter_conjunto(arquivos_csv)
+sessoes_na_versao = usar_conjunto(conjunto)
+erros_leitura, formatos_data = conjunto["erros"], conjunto["formatos"]
+
+with st.sidebar:
+    st.write("Arquivos (formato de data detectado):")
+    for arq in arquivos_csv:
+        nome = os.path.basename(arq)
+        if nome in formatos_data:
+            st.text(f"- {nome} · {descricao_formato_data(formatos_data[nome])}")
+        else:
+            st.text(f"- {nome} · não lido")
+    st.caption(f"Versão dos dados: {conjunto['versao']} · sessões usando esta versão: {sessoes_na_versao}")
+    if USAR_OBSERVADOR:
+        st.caption(f"Atualização automática: {modo_observador}")
+
+for caminho, erro in erros_leitura:
+    st.error(f"Erro ao ler `{caminho}`: {erro}")
+
+if not conjunto["colunas"]:
+    st.error("Não foi possível carregar nenhum CSV.")
+    st.stop()
+
+if "data" not in conjunto["colunas"]:
+    st.error("Coluna obrigatória 'data' não encontrada nos CSV.")
+    st.stop()
+
+if conjunto["extremos"] is None:
+    st.error("Nenhuma linha com data válida nos CSV.")
+    st.stop()
+
+
+# =============================================================================
+# PARTE 3 – FILTRO DE PERÍODO, CARDS RESUMO E MENU LATERAL
+# =============================================================================
+CONSUMO_MIN = 105.0
+CONSUMO_MAX = 115.0
+
+def filtro_periodo(conjunto):
+    """
+    Seletor do intervalo de datas (desenhado no painel do período, não na
+    barra lateral, para que mudar o período reexecute só esse painel).
+    Retorna (ini, fim).
+    """
+    # Extremos calculados uma vez por versão do conjunto
+    data_min = conjunto["extremos"][0].date()
+    data_max = conjunto["extremos"][1].date()
+
+    default_ini = max(data_min, data_max - timedelta(days=30))
+
+    periodo = st.date_input(
+        "Filtro de período",
+        value=(data_min, data_max),
+        min_value=data_min,
+        max_value=data_max,
+        key="periodo",
+    )
+
+    if isinstance(periodo, tuple) and len(periodo) == 2:
+        ini, fim = periodo
+    elif isinstance(periodo, tuple):
+        # Intervalo ainda sendo escolhido (só a data inicial)
+        ini = fim = periodo[0]
+    else:
+        ini = periodo
+        fim = periodo
+    return ini, fim
+
+
+@medir_etapa("periodo")
+def montar_periodo(conjunto, ini, fim):
+    """
+    Reúne tudo o que as seções dependentes do período precisam: datas,
+    posições no índice, a fatia "dados" do período (uma view do conjunto
+    compartilhado), o índice acumulado, nº de linhas, colunas e o próprio conjunto.
+
+    Com o banco analítico, "dados" fica None: as seções pedem só as colunas
+    que usam (`colunas_periodo`) e os KPIs vêm de uma consulta agregada.
+    """
+    periodo = {
+        "ini": ini,
+        "fim": fim,
+        "colunas": conjunto["colunas"],
+        "indice": conjunto["indice"],
+        "agregados": None,
+        "conjunto": conjunto,
+    }
+    dados = conjunto["dados"]
+    if dados is None:
+        periodo["agregados"] = agregados_banco(ini, fim)
+        periodo.update(inicio=None, fim_excl=None, dados=None, linhas=periodo["agregados"]["linhas"])
+    else:
+        inicio, fim_excl = limites_periodo(dados, ini, fim)
+        periodo.update(inicio=inicio, fim_excl=fim_excl, dados=dados.iloc[inicio:fim_excl], linhas=fim_excl - inicio)
+    return periodo
+
+
+@medir_etapa("periodo")
+def colunas_periodo(periodo, colunas):
+    """Linhas do período com apenas `colunas` (no banco, só elas são lidas)."""
+    if periodo["dados"] is None:
+        return consultar_periodo(colunas, periodo["ini"], periodo["fim"])
+    return periodo["dados"][colunas]
+
+
+FALHAS_DERIVADOS = {"tendencias": "Médias móveis e anomalias indisponíveis", "previsoes": "Previsões indisponíveis"}
+
+
+def avisar_falha(periodo, passo, erro):
+    """Mostra (uma vez por execução da página) que o passo derivado `passo` falhou."""
+    avisados = periodo.setdefault("falhas", set())
+    if erro is not None and passo not in avisados:
+        avisados.add(passo)
+        st.warning(f"{FALHAS_DERIVADOS[passo]} nesta versão dos dados ({erro}).")
+
+
+def _tendencias_periodo(periodo):
+    """
+    (linhas, tendências, posição inicial) do período; tendências None se o
+    cálculo falhou (com aviso). Em memória, vêm do passo derivado do
+    conjunto (histórico inteiro de cada lote); no banco, são calculadas uma
+    vez por período sobre o período mais DIAS_AQUECIMENTO_BANCO dias antes
+    dele, para que as primeiras linhas já tenham janela e EWMA aquecidas.
+    """
+    if periodo["dados"] is not None:
+        tendencias, erro = tendencias_conjunto(periodo["conjunto"])
+        avisar_falha(periodo, "tendencias", erro)
+        return periodo["dados"], tendencias and tendencias["dados"], periodo["inicio"]
+    if "tendencias" not in periodo:
+        colunas = ["data", "__arquivo_origem", *(c for c in COLUNAS_INDICE if c in periodo["colunas"])]
+        with etapa("tendencias") as medida:
+            ini = pd.Timestamp(periodo["ini"]) - pd.Timedelta(days=DIAS_AQUECIMENTO_BANCO)
+            dados = consultar_periodo(colunas, ini, periodo["fim"])
+            try:
+                tendencias, erro = calcular_tendencias(dados), None
+            except Exception as e:
+                tendencias, erro = None, f"{type(e).__name__}: {e}"
+            inicio, _ = limites_periodo(dados, periodo["ini"], periodo["fim"])
+            periodo["tendencias"] = (dados.iloc[inicio:], tendencias, inicio, erro)
+            medida["linhas"] = len(dados)
+    *resultado, erro = periodo["tendencias"]
+    avisar_falha(periodo, "tendencias", erro)
+    return tuple(resultado)
+
+
+def tendencia_periodo(periodo, col, extras=()):
+    """Linhas do período com `col`, `extras` e as tendências de `col` (ver `quadro_tendencia`)."""
+    dados, tendencias, inicio = _tendencias_periodo(periodo)
+    return quadro_tendencia(dados, tendencias, col, inicio, extras)
+
+
+def anomalias_periodo(periodo):
+    """Nº de registros com |z| > LIMITE_Z no período, por coluna de COLUNAS_TENDENCIA presente."""
+    dados, tendencias, inicio = _tendencias_periodo(periodo)
+    if tendencias is None:
+        return {}
+    z = tendencias["z"][inicio:inicio + len(dados)]
+    contagens = (np.abs(z) > LIMITE_Z).sum(axis=0)
+    return {col: int(n) for col, n in zip(COLUNAS_TENDENCIA, contagens) if col in periodo["colunas"]}
+
+
+def previsao_periodo(periodo, col, horizonte, lotes=None):
+    """
+    Previsão de `col` para os `horizonte` dias seguintes ao último dia dos
+    lotes ativos (ou de `lotes`), ver `previsoes_coluna`. None se o período
+    selecionado não chega ao último dia registrado: a previsão só continua
+    a série quando o gráfico mostra o fim dela.
+    """
+    modelos, erro = previsoes_conjunto(periodo["conjunto"])
+    avisar_falha(periodo, "previsoes", erro)
+    if modelos is None:
+        return None
+    ultimos = [m["pendente"][0] for (lote, c), m in modelos.items() if c == col and (lotes is None or lote in lotes)]
+    if not ultimos or pd.Timestamp(periodo["fim"]) < max(ultimos):
+        return None
+    return previsoes_coluna(modelos, col, horizonte, lotes)
+
+
+def colunas_tabela_detalhada(colunas):
+    """Colunas exibidas (e exportadas) na tabela detalhada, na ordem da tabela."""
+    if "__arquivo_origem" not in colunas:
+        return colunas
+    return [
+        "data",
+        "milho_pct",
+        "farelo_soja_pct",
+        "calcario_pct",
+        "nucleo_pct",
+        "consumo_g_ave_dia",
+        "ovos_granja",
+        "ovos_escola",
+        "perda_ovos",
+        "ovos_quebrados",
+        "ovos_sem_casca",
+        "ovos_deformados",
+        "ovos_defeituosos",
+        "pct_defeituosos",
+        "aves_doentes",
+        "__arquivo_origem",
+    ]
+
+
+def _posicoes_tabela(periodo, arquivos):
+    """Posições (dentro do período) das linhas dos arquivos escolhidos; vazio = todos."""
+    dados = periodo["dados"]
+    if arquivos and "__arquivo_origem" in dados.columns:
+        return np.flatnonzero(dados["__arquivo_origem"].isin(arquivos).to_numpy())
+    return np.arange(len(dados))
+
+
+def contar_linhas_tabela(periodo, arquivos):
+    """Total de linhas da tabela detalhada com o filtro de arquivos (sem montar linhas)."""
+    if periodo["dados"] is None:
+        return contar_tabela_banco(periodo["ini"], periodo["fim"], arquivos)
+    if not arquivos:
+        return periodo["linhas"]
+    return len(_posicoes_tabela(periodo, arquivos))
+
+
+def pagina_tabela(periodo, colunas, ordem="data", decrescente=False, arquivos=None, tamanho=100, pagina=1):
+    """
+    Uma página da tabela detalhada. Filtro por arquivo e ordenação são feitos
+    no servidor, sobre o conjunto em cache; só as linhas da página (com as
+    `colunas` pedidas) são montadas e enviadas ao navegador.
+    """
+    if periodo["dados"] is None:
+        return pagina_tabela_banco(colunas, periodo["ini"], periodo["fim"], ordem, decrescente, arquivos, tamanho, pagina)
+
+    dados = periodo["dados"]
+    posicoes = _posicoes_tabela(periodo, arquivos)
+    if ordem != "data" or decrescente:
+        # Ordena só a coluna escolhida; empates mantêm a ordem por data
+        chave = dados[ordem].iloc[posicoes].reset_index(drop=True)
+        ordenadas = chave.sort_values(ascending=not decrescente, kind="stable", na_position="last").index
+        posicoes = posicoes[ordenadas.to_numpy()]
+    inicio = (pagina - 1) * tamanho
+    return dados.iloc[posicoes[inicio:inicio + tamanho]][colunas]
+
+
+def resumo(periodo, col):
+    """(soma, contagem, média) de `col` no período, via índice acumulado ou consulta agregada."""
+    agregados = periodo["agregados"]
+    if agregados is None:
+        return resumo_periodo(periodo["indice"], periodo["inicio"], periodo["fim_excl"], col)
+    if col not in periodo["colunas"] or col not in agregados["soma"]:
+        return 0.0, 0, np.nan
+    soma, cont = agregados["soma"][col], agregados["cont"][col]
+    return soma, cont, (soma / cont if cont else np.nan)
+
+
+def somas_formulacoes_periodo(periodo, trocas, colunas):
+    """Somas de `colunas` por formulação no período (ver `_somas_formulacoes_memoria`)."""
+    if periodo["dados"] is None:
+        return _somas_formulacoes_banco(periodo["colunas"], trocas, colunas, periodo["ini"], periodo["fim"])
+    return _somas_formulacoes_memoria(
+        periodo["conjunto"]["dados"], periodo["indice"], trocas, colunas, periodo["inicio"], periodo["fim_excl"]
+    )
+
+
+def conversao_periodo(periodo, precos, plantel):
+    """
+    Conversão alimentar (kg de ração por dúzia) e custo da ração por dúzia
+    no período. A ração vem das somas do índice (ver `metricas_derivadas`);
+    o custo, da ração consumida sob cada formulação (junção "as-of") vezes o
+    custo por kg dessa formulação, contando só os registros com formulação.
+    Retorna (conversao, custo_duzia), NaN quando não há como calcular.
+    """
+    racao_plantel, _, _ = resumo(periodo, "racao_kg")
+    racao_ave, _, _ = resumo(periodo, "racao_kg_ave")
+    duzias, _, _ = resumo(periodo, "duzias_ovos")
+    conversao = (racao_plantel + plantel * racao_ave) / duzias if duzias else np.nan
+
+    custo_duzia = np.nan
+    df_mist, _ = periodo["conjunto"]["mistura"]
+    if df_mist is not None and not df_mist.empty:
+        df_mist = trocas_formulacao(df_mist)
+        somas = somas_formulacoes_periodo(periodo, df_mist["data"].to_numpy(), ["racao_kg", "racao_kg_ave", "duzias_ovos"])
+        zeros = np.zeros(len(df_mist))
+        racao = somas["soma"].get("racao_kg", zeros) + plantel * somas["soma"].get("racao_kg_ave", zeros)
+        duzias_formulacao = somas["soma"].get("duzias_ovos", zeros).sum()
+        if duzias_formulacao:
+            custo_duzia = racao @ custo_kg_formulacoes(df_mist, precos) / duzias_formulacao
+    return conversao, custo_duzia
+
+
+@medir_etapa("conversao")
+def conversao_diaria(periodo, precos, plantel):
+    """
+    Conversão alimentar e custo por dúzia de cada dia do período (todos os
+    lotes do dia somados). O custo por kg de cada registro é o da formulação
+    em vigor na sua data, por busca binária nas datas de troca. Um dia com
+    algum registro sem formulação (ou sem custo) fica sem custo por dúzia:
+    o custo dos demais dividido por todas as dúzias o subestimaria.
+    """
+    df = colunas_periodo(periodo, ["data", "racao_kg", "racao_kg_ave", "duzias_ovos"]).dropna(subset=["duzias_ovos"])
+    racao = df["racao_kg"].fillna(df["racao_kg_ave"] * plantel).to_numpy(dtype="float64")
+    custo_kg = np.full(len(df), np.nan)
+    df_mist, _ = periodo["conjunto"]["mistura"]
+    if df_mist is not None and not df_mist.empty:
+        df_mist = trocas_formulacao(df_mist)
+        vigente = np.searchsorted(df_mist["data"].to_numpy(), df["data"].to_numpy(), side="right") - 1
+        custo_kg = np.where(vigente >= 0, custo_kg_formulacoes(df_mist, precos)[vigente.clip(0)], np.nan)
+
+    por_dia = (
+        pd.DataFrame({
+            "data": df["data"].dt.normalize().to_numpy(),
+            "racao": racao,
+            "duzias": df["duzias_ovos"].to_numpy(dtype="float64"),
+            "custo": racao * custo_kg,
+            "sem_custo": np.isnan(custo_kg),
+        })
+        .groupby("data", sort=False)
+        .sum(min_count=1)
+        .reset_index()
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        por_dia["conversao_kg_duzia"] = por_dia["racao"] / por_dia["duzias"].where(por_dia["duzias"] > 0)
+        por_dia["custo_duzia"] = (por_dia["custo"] / por_dia["duzias"].where(por_dia["duzias"] > 0)).where(
+            por_dia["sem_custo"] == 0
+        )
+    return por_dia[["data", "conversao_kg_duzia", "custo_duzia"]]
+
+
+@medir_etapa("cards_resumo")
+def cards_resumo(periodo):
+    """Cards resumo do período (consumo, produção, perdas, não conformes, conversão e custo)."""
+    colunas = periodo["colunas"]
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        _, _, consumo_medio = resumo(periodo, "consumo_g_ave_dia")
+        if not np.isnan(consumo_medio):
+            delta = consumo_medio - CONSUMO_MIN
+            st.metric(
+                "Consumo médio (g/ave/dia)",
+                f"{consumo_medio:.1f}",
+                f"{delta:+.1f} vs. limite mínimo 105",
+            )
+        else:
+            st.metric("Consumo médio", "N/A")
+
+    with col2:
+        if "ovos_granja" in colunas:
+            _, _, prod_media = resumo(periodo, "ovos_granja")
+            st.metric("Produção média (ovos/dia - granja)", f"{prod_media:.0f}")
+        else:
+            st.metric("Produção média", "N/A")
+
+    with col3:
+        if "perda_ovos" in colunas:
+            _, _, perda_media = resumo(periodo, "perda_ovos")
+            st.metric("Perda média (granja → escola)", f"{perda_media:.1f} ovos/dia")
+        else:
+            st.metric("Perda média", "N/A")
+
+    with col4:
+        if "pct_defeituosos" in colunas:
+            _, _, pct_medio_def = resumo(periodo, "pct_defeituosos")
+            if not np.isnan(pct_medio_def):
+                st.metric("Ovos não conformes (média)", f"{pct_medio_def:.1f}%")
+            else:
+                st.metric("Ovos não conformes (média)", "N/A")
+        else:
+            st.metric("Ovos não conformes (média)", "N/A")
+
+    conversao, custo_duzia = conversao_periodo(periodo, precos_racao, plantel)
+    col5, col6, _, _ = st.columns(4)
+    with col5:
+        st.metric("Conversão alimentar (kg/dúzia)", "N/A" if np.isnan(conversao) else f"{conversao:.2f}")
+    with col6:
+        st.metric("Custo da ração por dúzia", "N/A" if np.isnan(custo_duzia) else f"R$ {custo_duzia:.2f}")
+
+    st.markdown("---")
+
+
+# -------------------- Função de navegação (scroll por âncora) ----------------
+def scroll_to(anchor: str):
+    """
+    Rola até o elemento com o id fornecido.
+    O deslocamento para não cortar o título será feito no próprio <div id='...'>.
+    """
+    components.html(
+        f"""
+        <script>
+        const frameWin = window.parent;
+        const frameDoc = frameWin.document;
+        const el = frameDoc.getElementById('{anchor}');
+        if (el) {{
+            el.scrollIntoView({{ behavior: 'smooth', block: 'start' }});
+        }}
+        </script>
+        """,
+        height=0,
+    )
+
+
+# -------------------- Menu lateral de navegação rápida -----------------------
+with st.sidebar:
+    st.markdown("---")
+    st.subheader("Navegação rápida")
+    secao = st.radio(
+        "Ir para a seção:",
+        [
+            "Topo",
+            "Consumo",
+            "Produção e perdas",
+            "Qualidade & sanidade",
+            "Efeitos defasados",
+            "Mistura da ração",
+            "Exportar dados",
+        ],
+        index=0,
+    )
+    somente_secao = st.checkbox(
+        "Mostrar só a seção escolhida",
+        value=False,
+        help="Calcula e envia apenas a seção selecionada, em vez da página inteira.",
+    )
+
+
+# -------------------- Opções dos gráficos (séries longas) ---------------------
+# Ao reduzir pontos, envia no máximo ~1 ponto a cada PIXELS_POR_PONTO px de largura
+PIXELS_POR_PONTO = 3
+
+with st.sidebar:
+    st.markdown("---")
+    st.subheader("Gráficos")
+    reduzir_graficos = st.checkbox(
+        "Reduzir pontos em séries longas",
+        value=False,
+        help="Mantém mínimos e máximos de cada trecho, limitando os pontos enviados ao navegador.",
+    )
+    largura_graficos = st.number_input(
+        "Largura útil dos gráficos (px)",
+        min_value=300,
+        max_value=4000,
+        value=1200,
+        step=100,
+        disabled=not reduzir_graficos,
+    )
+    mostrar_previsao = st.checkbox(
+        "Mostrar previsão",
+        value=True,
+        help="Faixa prevista (Holt-Winters por lote) de produção e consumo após o último dia registrado.",
+    )
+    horizonte_previsao = st.slider(
+        "Horizonte da previsão (dias)",
+        min_value=7,
+        max_value=30,
+        value=14,
+        disabled=not mostrar_previsao,
+    )
+
+max_pontos_grafico = int(largura_graficos // PIXELS_POR_PONTO) if reduzir_graficos else None
+
+
+# -------------------- Custos da ração e plantel (conversão alimentar) ---------
+# Preços de referência (R$/kg) de cada ingrediente da formulação
+PRECOS_PADRAO = {"milho_pct": 1.20, "farelo_soja_pct": 2.50, "calcario_pct": 0.40, "nucleo_pct": 6.00}
+NOMES_INGREDIENTES = {"milho_pct": "Milho", "farelo_soja_pct": "Farelo de soja", "calcario_pct": "Calcário", "nucleo_pct": "Núcleo"}
+PLANTEL_PADRAO = 250
+
+with st.sidebar:
+    st.markdown("---")
+    st.subheader("Custos e conversão")
+    plantel = st.number_input(
+        "Aves alojadas",
+        min_value=1,
+        value=PLANTEL_PADRAO,
+        step=10,
+        key="plantel",
+        help="Usado nos registros cujo lote não tem a coluna `aves_alojadas`.",
+    )
+    precos_racao = {
+        col: st.number_input(
+            f"{nome} (R$/kg)",
+            min_value=0.0,
+            value=PRECOS_PADRAO[col],
+            step=0.05,
+            format="%.2f",
+            key=f"preco_{col}",
+        )
+        for col, nome in NOMES_INGREDIENTES.items()
+    }
+
+
+# =============================================================================
+# PARTE 4 – FUNÇÕES AUXILIARES (GRÁFICO E DIAGNÓSTICO)
+# =============================================================================
+def _build_x_axis_and_scale(df_plot, ate=None):
+    """
+    Constrói eixo X padronizado (datas) para todos os gráficos Altair:
+    - Domínio: últimos 30 dias até a data de hoje (ou até `ate`, se for
+      depois de hoje, para caber a previsão);
+    - Ticks explícitos a cada 7 dias, SEMPRE passando por hoje;
+    - Formato 'dia mês' (ex.: 05 Dez) com meses em português.
+    """
+    # Janela fixa: últimos 30 dias até hoje
+    hoje = pd.Timestamp.today().normalize()
+    dmin = hoje - pd.Timedelta(days=30)
+    dmax = max(hoje, pd.Timestamp(ate).normalize()) if ate is not None else hoje
+
+    # Ticks semanais: hoje, hoje-7, hoje-14, ... dentro do domínio
+    valores_ticks = []
+    dia = hoje
+    while dia >= dmin:
+        valores_ticks.append(dia)
+        dia -= pd.Timedelta(days=7)
+    valores_ticks = list(reversed(valores_ticks))  # em ordem crescente
+    dia = hoje + pd.Timedelta(days=7)
+    while dia <= dmax:
+        valores_ticks.append(dia)
+        dia += pd.Timedelta(days=7)
+
+    label_expr = (
+        "replace("
+        "replace("
+        "replace("
+        "replace("
+        "replace("
+        "replace("
+        "replace("
+        "replace("
+        "replace("
+        "replace("
+        "replace("
+        "replace(datum.label,"
+        "'Jan','Jan'),"
+        "'Feb','Fev'),"
+        "'Mar','Mar'),"
+        "'Apr','Abr'),"
+        "'May','Mai'),"
+        "'Jun','Jun'),"
+        "'Jul','Jul'),"
+        "'Aug','Ago'),"
+        "'Sep','Set'),"
+        "'Oct','Out'),"
+        "'Nov','Nov'),"
+        "'Dec','Dez')"
+    )
+
+    x_axis = alt.Axis(
+        title="",
+        format="%d %b",
+        values=valores_ticks,  # ticks explícitos (hoje, -7, -14, ...)
+        labelExpr=label_expr,
+    )
+
+    x_scale = alt.Scale(domain=[dmin, dmax])
+
+    return x_axis, x_scale
+
+
+
+
+def reduzir_pontos(df, cols, max_pontos):
+    """
+    Reduz uma série longa para no máximo ~`max_pontos` linhas por min/max em
+    faixas: as linhas são divididas em faixas consecutivas de mesmo tamanho e,
+    de cada faixa, ficam a linha de menor e a de maior valor de cada coluna em
+    `cols`. Assim picos e vales (que decidem se a série saiu da faixa de
+    referência) continuam visíveis. A primeira e as duas últimas linhas
+    (usadas na tendência recente dos diagnósticos) são sempre mantidas.
+
+    Com `max_pontos` None, ou série curta, devolve `df` sem alterações.
+    """
+    n = len(df)
+    if max_pontos is None or n <= max_pontos:
+        return df
+
+    cols = [cols] if isinstance(cols, str) else list(cols)
+    n_faixas = max(1, (max_pontos - 3) // (2 * len(cols)))
+    tamanho = int(np.ceil(n / n_faixas))
+    n_faixas = int(np.ceil(n / tamanho))
+    sobra = n_faixas * tamanho - n
+    inicio_faixa = np.arange(n_faixas) * tamanho
+
+    manter = [np.array([0, n - 2, n - 1])]
+    for col in cols:
+        y = df[col].to_numpy(dtype="float64", na_value=np.nan)
+        y_min = np.pad(np.where(np.isnan(y), np.inf, y), (0, sobra), constant_values=np.inf)
+        y_max = np.pad(np.where(np.isnan(y), -np.inf, y), (0, sobra), constant_values=-np.inf)
+        manter.append(inicio_faixa + y_min.reshape(n_faixas, tamanho).argmin(axis=1))
+        manter.append(inicio_faixa + y_max.reshape(n_faixas, tamanho).argmax(axis=1))
+
+    posicoes = np.unique(np.concatenate(manter))
+    return df.iloc[posicoes[posicoes < n]]
+
+
+def _camadas_previsao(previsao, x_axis, x_scale, scale_y, value_format, cor="gray"):
+    """
+    Faixa prevista (área entre `minimo` e `maximo`) e linha tracejada do
+    valor previsto, uma por lote, a partir do resultado de `previsoes_coluna`.
+    """
+    base = alt.Chart(previsao).encode(
+        x=alt.X("data:T", axis=x_axis, scale=x_scale),
+        detail="lote:N",
+    )
+    faixa = base.mark_area(opacity=0.2, color=cor).encode(
+        y=alt.Y("minimo:Q", scale=scale_y),
+        y2=alt.Y2("maximo:Q"),
+    )
+    linha = base.mark_line(strokeDash=[2, 2], color=cor).encode(
+        y=alt.Y("previsto:Q", scale=scale_y),
+        tooltip=[
+            alt.Tooltip("data:T", title="Data"),
+            alt.Tooltip("lote:N", title="Lote"),
+            alt.Tooltip("previsto:Q", title="Previsto", format=value_format),
+            alt.Tooltip("minimo:Q", title="Mínimo (95%)", format=value_format),
+            alt.Tooltip("maximo:Q", title="Máximo (95%)", format=value_format),
+        ],
+    )
+    return [faixa, linha]
+
+
+def chart_serie_altair(
+    df,
+    col,
+    titulo,
+    ref_min=None,
+    ref_max=None,
+    ylim=None,
+    y_label=None,
+    value_format=".1f",
+    tooltip_label=None,
+    max_pontos=None,
+    previsao=None,
+):
+    """
+    Cria um gráfico Altair de série temporal com:
+      - eixo X padronizado (datas em PT-BR, ticks a cada 5 dias);
+      - faixa de referência opcional [ref_min, ref_max];
+      - personalização do rótulo do eixo Y e formatação de valores;
+      - redução opcional de pontos (`max_pontos`, ver `reduzir_pontos`);
+      - se `df` trouxer as colunas de `quadro_tendencia`, a EWMA tracejada e
+        as anomalias circuladas em vermelho (sempre todas, mesmo com redução);
+      - `previsao` opcional (ver `previsoes_coluna`) como faixa após a série.
+
+    Só as colunas `data`, `col` (e a EWMA) vão para a especificação do
+    gráfico; a faixa de referência usa uma tabela de uma linha com as
+    constantes e as anomalias, uma tabela só com as linhas marcadas.
+    """
+    if df.empty or col not in df.columns:
+        return None
+
+    col_ewma, col_z, col_anomalia = f"{col}_ewma", f"{col}_z", f"{col}_anomalia"
+    extras = [col_ewma] if col_ewma in df.columns else []
+    df_plot = reduzir_pontos(df[["data", col, *extras]], col, max_pontos)
+
+    if y_label is None:
+        y_label = "%"
+    if tooltip_label is None:
+        tooltip_label = "Valor"
+
+    ate = previsao["data"].max() if previsao is not None else None
+    x_axis, x_scale = _build_x_axis_and_scale(df_plot, ate)
+    scale_y = alt.Scale(domain=ylim, nice=False) if ylim else alt.Undefined
+
+    base = alt.Chart(df_plot).encode(
+        x=alt.X("data:T", axis=x_axis, scale=x_scale)
+    )
+
+    camadas = []
+
+    # Faixa de referência, se fornecida (ocupa toda a largura do gráfico)
+    if (ref_min is not None) and (ref_max is not None):
+        faixa = (
+            alt.Chart(pd.DataFrame({"ref_min": [ref_min], "ref_max": [ref_max]}))
+            .mark_rect(opacity=0.15)
+            .encode(
+                y=alt.Y("ref_min:Q", scale=scale_y),
+                y2=alt.Y2("ref_max:Q"),
+            )
+        )
+        camadas.append(faixa)
+
+    # Linha principal
+    linha = base.mark_line().encode(
+        y=alt.Y(f"{col}:Q", title=y_label, scale=scale_y),
+    )
+    camadas.append(linha)
+
+    # Média móvel exponencial (tendência do lote)
+    if extras:
+        ewma = base.mark_line(strokeDash=[4, 3], color="gray", opacity=0.8).encode(
+            y=alt.Y(f"{col_ewma}:Q", scale=scale_y),
+            tooltip=[
+                alt.Tooltip("data:T", title="Data"),
+                alt.Tooltip(f"{col_ewma}:Q", title="Média móvel (EWMA)", format=value_format),
+            ],
+        )
+        camadas.append(ewma)
+
+    # Pontos
+    pontos = base.mark_point(size=60).encode(
+        y=alt.Y(f"{col}:Q", scale=scale_y),
+        tooltip=[
+            alt.Tooltip("data:T", title="Data"),
+            alt.Tooltip(f"{col}:Q", title=tooltip_label, format=value_format),
+        ],
+    )
+    camadas.append(pontos)
+
+    # Rótulos numéricos sobre os pontos
+    textos = base.mark_text(dy=-20, fontSize=10, color="white").encode(
+        y=alt.Y(f"{col}:Q", scale=scale_y),
+        text=alt.Text(f"{col}:Q", format=value_format),
+    )
+    camadas.append(textos)
+
+    # Anomalias: |z| acima de LIMITE_Z em relação à janela anterior do lote
+    if col_anomalia in df.columns and df[col_anomalia].any():
+        df_anomalias = df.loc[df[col_anomalia], ["data", col, col_z]]
+        anomalias = (
+            alt.Chart(df_anomalias)
+            .mark_point(size=180, filled=False, color="red", strokeWidth=2)
+            .encode(
+                x=alt.X("data:T", axis=x_axis, scale=x_scale),
+                y=alt.Y(f"{col}:Q", scale=scale_y),
+                tooltip=[
+                    alt.Tooltip("data:T", title="Data"),
+                    alt.Tooltip(f"{col}:Q", title=tooltip_label, format=value_format),
+                    alt.Tooltip(f"{col_z}:Q", title="Anomalia (z-score)", format=".1f"),
+                ],
+            )
+        )
+        camadas.append(anomalias)
+
+    if previsao is not None:
+        camadas.extend(_camadas_previsao(previsao, x_axis, x_scale, scale_y, value_format))
+
+    chart = alt.layer(*camadas).properties(
+        height=250,
+        title=titulo,
+    )
+
+    return chart.interactive()
+
+
+def chart_producao(df, max_pontos=None, previsao=None):
+    """
+    Gráfico de produção diária granja vs. escola (linhas + pontos), a partir
+    de um DataFrame com as colunas `data`, `ovos_granja` e `ovos_escola`.
+    Com `ovos_granja_anomalia`/`ovos_granja_z` (ver `quadro_tendencia`), as
+    anomalias da produção da granja aparecem circuladas em vermelho; com
+    `previsao` (ver `previsoes_coluna`), a faixa prevista da granja.
+    """
+    df_prod = reduzir_pontos(df, ["ovos_granja", "ovos_escola"], max_pontos)
+    df_long = df_prod.melt(id_vars="data", value_vars=["ovos_granja", "ovos_escola"], var_name="origem", value_name="ovos")
+
+    ate = previsao["data"].max() if previsao is not None else None
+    x_axis, x_scale = _build_x_axis_and_scale(df_long, ate)
+
+    chart_prod = (
+        alt.Chart(df_long)
+        .encode(
+            x=alt.X("data:T", axis=x_axis, scale=x_scale),
+            y=alt.Y("ovos:Q", title="Produção de ovos (unid./dia)"),
+            color=alt.Color(
+                "origem:N",
+                title="Origem",
+                scale=alt.Scale(domain=["ovos_granja", "ovos_escola"],
+                                range=["#1f77b4", "#ff7f0e"]),
+                legend=alt.Legend(labelExpr="replace(replace(datum.label,'ovos_granja','Granja'),'ovos_escola','Escola')"),
+            ),
+            tooltip=[
+                alt.Tooltip("data:T", title="Data"),
+                alt.Tooltip("origem:N", title="Origem"),
+                alt.Tooltip("ovos:Q", title="Ovos", format=".0f"),
+            ],
+        )
+        .mark_line()
+    )
+
+    pontos_prod = (
+        alt.Chart(df_long)
+        .encode(
+            x=alt.X("data:T", axis=x_axis, scale=x_scale),
+            y=alt.Y("ovos:Q"),
+            color="origem:N",
+        )
+        .mark_point(size=50)
+    )
+
+    camadas = [chart_prod, pontos_prod]
+    if "ovos_granja_anomalia" in df.columns and df["ovos_granja_anomalia"].any():
+        df_anomalias = df.loc[df["ovos_granja_anomalia"], ["data", "ovos_granja", "ovos_granja_z"]]
+        camadas.append(
+            alt.Chart(df_anomalias)
+            .mark_point(size=180, filled=False, color="red", strokeWidth=2)
+            .encode(
+                x=alt.X("data:T", axis=x_axis, scale=x_scale),
+                y=alt.Y("ovos_granja:Q"),
+                tooltip=[
+                    alt.Tooltip("data:T", title="Data"),
+                    alt.Tooltip("ovos_granja:Q", title="Ovos (granja)", format=".0f"),
+                    alt.Tooltip("ovos_granja_z:Q", title="Anomalia (z-score)", format=".1f"),
+                ],
+            )
+        )
+    if previsao is not None:
+        camadas.extend(_camadas_previsao(previsao, x_axis, x_scale, alt.Undefined, ".0f", cor="#1f77b4"))
+
+    return alt.layer(*camadas).properties(height=300)
+
+
+# -------------------- Cache de especificações dos gráficos --------------------
+# Limites do cache (compartilhado pelo processo): nº de gráficos e bytes de JSON
+CACHE_GRAFICOS_MAX_ITENS = 256
+CACHE_GRAFICOS_MAX_BYTES = 64 * 1024 * 1024
+
+
+@st.cache_resource(show_spinner=False)
+def cache_graficos():
+    """
+    Especificações Vega-Lite já serializadas, em ordem LRU:
+    chave -> (spec, tamanho em bytes). O dicionário guarda também o total de bytes.
+    """
+    return {"lock": threading.Lock(), "itens": OrderedDict(), "bytes": 0}
+
+
+def hash_conteudo(df):
+    """Hash do conteúdo (valores, colunas e dtypes) de um DataFrame, ignorando o índice."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr([(c, str(t)) for c, t in df.dtypes.items()]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+@medir_etapa("graficos")
+def spec_grafico(construtor, df, **params):
+    """
+    Especificação Vega-Lite (dict) de `construtor(df, **params)`, ou None se
+    o construtor não gerar gráfico.
+
+    A chave combina o construtor, o hash dos dados, os parâmetros (DataFrames
+    entram pelo hash do conteúdo) e a data de hoje (o eixo X termina em hoje). Em um acerto, o Altair não é chamado:
+    nem montagem nem validação do gráfico. O cache descarta os itens usados
+    há mais tempo ao passar de CACHE_GRAFICOS_MAX_ITENS ou CACHE_GRAFICOS_MAX_BYTES.
+    """
+    chave = (
+        construtor.__name__,
+        hash_conteudo(df),
+        repr(sorted((k, hash_conteudo(v) if isinstance(v, pd.DataFrame) else v) for k, v in params.items())),
+        pd.Timestamp.today().normalize(),
+    )
+    cache = cache_graficos()
+    with cache["lock"]:
+        if chave in cache["itens"]:
+            cache["itens"].move_to_end(chave)
+            return cache["itens"][chave][0]
+
+    chart = construtor(df, **params)
+    spec = chart.to_dict() if chart is not None else None
+    tamanho = len(json.dumps(spec, default=str)) if spec is not None else 0
+
+    with cache["lock"]:
+        if chave not in cache["itens"]:
+            cache["itens"][chave] = (spec, tamanho)
+            cache["bytes"] += tamanho
+        while cache["itens"] and (
+            len(cache["itens"]) > CACHE_GRAFICOS_MAX_ITENS or cache["bytes"] > CACHE_GRAFICOS_MAX_BYTES
+        ):
+            _, (_, tamanho_antigo) = cache["itens"].popitem(last=False)
+            cache["bytes"] -= tamanho_antigo
+    return spec
+
+
+def exibir_grafico(construtor, df, **params):
+    """Renderiza o gráfico de `construtor(df, **params)` a partir do cache de especificações."""
+    spec = spec_grafico(construtor, valores_exatos(df), **params)
+    if spec is not None:
+        st.vega_lite_chart(spec, use_container_width=True)
+    return spec is not None
+
+
+@medir_etapa("diagnosticos")
+def diagnostico_serie(df, col, ref_min, ref_max, nome):
+    """
+    Gera um texto de diagnóstico para a série usando a faixa [ref_min, ref_max].
+
+    Inclui:
+    - contagem de pontos dentro / acima / abaixo da faixa;
+    - análise da média dos 2 últimos registros;
+    - alerta nutricional específico para cada ingrediente (milho, farelo, calcário, núcleo).
+    """
+    if df.empty or col not in df.columns:
+        return f"Diagnóstico para {nome}: série sem dados suficientes."
+
+    y = df[col].dropna()
+    if y.empty:
+        return f"Diagnóstico para {nome}: série sem dados válidos (após remoção de NaN)."
+
+    dentro = ((y >= ref_min) & (y <= ref_max)).sum()
+    acima = (y > ref_max).sum()
+    abaixo = (y < ref_min).sum()
+    total = len(y)
+
+    partes = []
+    partes.append(
+        f"No período considerado (últimos **{total} registros**), "
+        f"**{dentro}** pontos ficaram **dentro** da faixa alvo "
+        f"({ref_min:.1f}–{ref_max:.1f} %), "
+        f"**{acima}** acima e **{abaixo}** abaixo."
+    )
+
+    if dentro == total:
+        partes.append("A mistura está **bem ajustada** em torno da faixa definida.")
+    elif acima + abaixo > dentro:
+        partes.append("Há **alta variabilidade** em relação à formulação recomendada.")
+    else:
+        partes.append(
+            "A maior parte dos dias está próxima da formulação ideal, "
+            "mas ainda há espaço para ajustes finos."
+        )
+
+    if len(y) >= 2:
+        ultimos = y.tail(2)
+        janela_desc = "2 últimos registros"
+    else:
+        ultimos = y
+        janela_desc = "registros disponíveis"
+
+    media_ultimos = ultimos.mean()
+    partes.append(
+        f"A média dos **{janela_desc}** é **{media_ultimos:.1f} %**."
+    )
+
+    if media_ultimos > ref_max:
+        tendencia = "acima"
+    elif media_ultimos < ref_min:
+        tendencia = "abaixo"
+    else:
+        tendencia = "dentro"
+
+    nome_lower = nome.lower()
+
+    alerta = ""
+    if tendencia == "acima":
+        if "milho" in nome_lower:
+            alerta = (
+                "Tendência recente de **excesso de milho**. "
+                "Isso aumenta a densidade energética da dieta, favorecendo deposição de gordura, "
+                "queda de persistência de postura e maior risco de ovos com casca frágil "
+                "se farelo de soja e calcário não acompanham o ajuste."
+            )
+        elif "farelo" in nome_lower:
+            alerta = (
+                "Tendência recente de **excesso de farelo de soja**. "
+                "Dietas muito proteicas podem aumentar custo, sobrecarregar metabolismo e "
+                "não se converter em ganho de produção se a energia não estiver alinhada."
+            )
+        elif "calcário" in nome_lower or "calcario" in nome_lower:
+            alerta = (
+                "Tendência recente de **excesso de calcário**. "
+                "Excesso de cálcio pode reduzir consumo, interferir na absorção de outros minerais "
+                "e comprometer desempenho se não houver ajuste cuidadoso do restante da formulação."
+            )
+        elif "núcleo" in nome_lower or "nucleo" in nome_lower:
+            alerta = (
+                "Tendência recente de **excesso de núcleo**. "
+                "Concentração muito alta de núcleo eleva o custo e pode gerar desbalanços de "
+                "vitaminas e minerais, sem ganho proporcional em desempenho."
+            )
+        else:
+            alerta = (
+                "A média recente está **acima da faixa alvo**, sugerindo excesso deste componente "
+                "na dieta. Avaliar impacto em custo e equilíbrio energia/proteína/minerais."
+            )
+
+    elif tendencia == "abaixo":
+        if "milho" in nome_lower:
+            alerta = (
+                "Tendência recente de **déficit de milho**. "
+                "Energia insuficiente leva a menor consumo efetivo, ovos menores e queda de produção, "
+                "especialmente em períodos frios ou de maior exigência."
+            )
+        elif "farelo" in nome_lower:
+            alerta = (
+                "Tendência recente de **déficit de farelo de soja**. "
+                "Proteína abaixo do recomendado reduz massa de ovo, piora a conversão alimentar "
+                "e compromete a persistência de postura."
+            )
+        elif "calcário" in nome_lower or "calcario" in nome_lower:
+            alerta = (
+                "Tendência recente de **déficit de calcário**. "
+                "Isso aumenta o risco de cascas finas, trincadas e maior percentual de ovos não conformes, "
+                "além de mobilização de cálcio ósseo das aves."
+            )
+        elif "núcleo" in nome_lower or "nucleo" in nome_lower:
+            alerta = (
+                "Tendência recente de **déficit de núcleo**. "
+                "Pode haver carência de vitaminas, minerais e aditivos, refletindo em queda de imunidade, "
+                "pior qualidade de casca e maior sensibilidade a estresses."
+            )
+        else:
+            alerta = (
+                "A média recente está **abaixo da faixa alvo**, sugerindo deficiência deste componente "
+                "na dieta. Monitorar possíveis quedas de desempenho e qualidade dos ovos."
+            )
+    else:
+        alerta = (
+            "A média recente permanece **dentro da faixa alvo**, indicando tendência de estabilidade. "
+            "Manter o acompanhamento para evitar deriva gradual ao longo das próximas semanas."
+        )
+
+    partes.append(alerta)
+
+    return " ".join(partes)
+
+@medir_etapa("diagnosticos")
+def diagnostico_consumo(df, col, ref_min, ref_max, nome="Consumo de ração"):
+    """
+    Gera um texto de diagnóstico para o CONSUMO de ração (g/ave/dia),
+    usando a faixa [ref_min, ref_max].
+
+    Inclui:
+    - contagem de dias abaixo / dentro / acima da faixa;
+    - análise da média dos 2 últimos registros;
+    - interpretação zootécnica para consumo baixo, alto ou dentro da faixa.
+    """
+    if df.empty or col not in df.columns:
+        return f"Diagnóstico para {nome}: série sem dados suficientes."
+
+    y = df[col].dropna()
+    if y.empty:
+        return f"Diagnóstico para {nome}: série sem dados válidos (após remoção de NaN)."
+
+    # -------------------------------------------------------------------------
+    # 1) Estatística global: quantos dias em cada faixa
+    # -------------------------------------------------------------------------
+    dentro = ((y >= ref_min) & (y <= ref_max)).sum()
+    acima = (y > ref_max).sum()
+    abaixo = (y < ref_min).sum()
+    total = len(y)
+
+    partes = []
+    partes.append(
+        f"No período analisado (**{total} dias** com dados válidos), "
+        f"**{abaixo}** dia(s) ficaram **abaixo** da faixa alvo "
+        f"({ref_min:.0f}–{ref_max:.0f} g/ave/dia), "
+        f"**{dentro}** dentro e **{acima}** **acima**."
+    )
+
+    if dentro == total:
+        partes.append(
+            "O padrão de consumo está **bem ajustado** à faixa recomendada, "
+            "o que tende a favorecer estabilidade de produção e conversão alimentar."
+        )
+    elif abaixo > acima:
+        partes.append(
+            "Predomina consumo **abaixo** da faixa ideal, sugerindo possível limitação de ingestão "
+            "ou problemas pontuais de manejo/ambiência."
+        )
+    elif acima > abaixo:
+        partes.append(
+            "Predomina consumo **acima** da faixa ideal, indicando risco de **desperdício de ração** "
+            "e aumento de custo por dúzia de ovos se a produção não acompanha esse aumento."
+        )
+    else:
+        partes.append(
+            "Há **variabilidade relevante** no consumo, alternando dias abaixo e acima da faixa. "
+            "Vale investigar se há mudanças de manejo, temperatura ou formulação ao longo do período."
+        )
+
+    # -------------------------------------------------------------------------
+    # 2) Tendência recente: média dos 2 últimos registros
+    # -------------------------------------------------------------------------
+    if len(y) >= 2:
+        ultimos = y.tail(2)
+        janela_desc = "2 últimos registros"
+    else:
+        ultimos = y
+        janela_desc = "registros disponíveis"
+
+    media_ultimos = ultimos.mean()
+    partes.append(
+        f"A média dos **{janela_desc}** é **{media_ultimos:.1f} g/ave/dia**."
+    )
+
+    if media_ultimos > ref_max:
+        tendencia = "acima"
+    elif media_ultimos < ref_min:
+        tendencia = "abaixo"
+    else:
+        tendencia = "dentro"
+
+    # -------------------------------------------------------------------------
+    # 3) Interpretação zootécnica da tendência recente
+    # -------------------------------------------------------------------------
+    if tendencia == "abaixo":
+        alerta = (
+            "A **tendência recente é de consumo ABAIXO da faixa ideal**. "
+            "Isso pode indicar:\n"
+            "- **Oferta diária de ração insuficiente**, os comedouros não estão recebendo ração suficiente no momento do trato;\n"
+            "- **Baixa ingestão** por competição em comedouros ou densidade elevada;\n"
+            "- Ambiência desfavorável (calor excessivo, frio intenso ou variações bruscas);\n"
+            "- Problemas de acesso à ração (altura de comedouros, segregação de lotes, falhas na distribuição);\n"
+            "- Palatabilidade ou granulometria inadequadas, levando as aves a selecionar ou desperdiçar parte da mistura.\n\n"
+            "Do ponto de vista produtivo, consumo baixo tende a resultar em **queda de produção**, "
+            "**ovos menores** e **pior persistência de postura** se mantido por vários dias. "
+            "Recomenda-se conferir se a **quantidade oferecida por trato** está adequada e se os comedouros "
+            "não permanecem vazios por longos períodos."
+        )
+    elif tendencia == "acima":
+        alerta = (
+            "A **tendência recente é de consumo ACIMA da faixa ideal**. "
+            "Situações possíveis:\n"
+            "- **Excesso de ração ofertada em cada trato**, com comedouros permanecendo cheios e "
+            "sobras significativas ao final do dia (ração velha, fina e mais sujeita a seleção e desperdício);\n"
+            "- Ajustes de manejo que aumentaram o acesso à ração, mas sem controle fino de quantidade ofertada;\n"
+            "- Granulometria muito fina ou muito grossa, levando a **desperdício por seleção** e queda de eficiência;\n"
+            "- Formulação com densidade energética mais baixa, fazendo a ave comer mais para compensar.\n\n"
+            "Se o aumento de consumo **não vier acompanhado de ganho proporcional em produção**, "
+            "há risco de **piorar a conversão alimentar** e **elevar o custo por dúzia de ovos**. "
+            "Vale revisar se há **sobras excessivas nos comedouros** e ajustar a quantidade fornecida por trato."
+        )
+    else:  # dentro da faixa
+        alerta = (
+            "A **tendência recente permanece DENTRO da faixa recomendada**, "
+            "o que sugere um **ajuste adequado entre ambiência, manejo, quantidade ofertada e formulação**. "
+            "Vale manter o monitoramento encadeado para captar rapidamente qualquer desvio, "
+            "especialmente em períodos de mudança de temperatura, fase de postura ou alteração de ração."
+        )
+
+
+    partes.append(alerta)
+
+    return " ".join(partes)
+
+
+def bloco_instagram_mistura(df, col, titulo, ref_min, ref_max, texto_ref, nome_curto, ylim=None):
+    """
+    Renderiza um "card" vertical no estilo linha do tempo (Instagram):
+
+    - Título do componente (ex.: 'Milho (%)')
+    - Texto de referência (valores alvo / fórmula)
+    - Gráfico temporal (Altair) com faixa [ref_min, ref_max]
+    - Diagnóstico automático abaixo do gráfico
+    """
+    st.markdown(f"### {titulo}")
+    st.markdown(texto_ref)
+
+    exibir_grafico(
+        chart_serie_altair,
+        df=df,
+        col=col,
+        titulo=titulo,
+        ref_min=ref_min,
+        ref_max=ref_max,
+        ylim=ylim,
+        y_label="%",
+        value_format=".1f",
+        tooltip_label=f"{nome_curto} (%)",
+    )
+
+    diag = diagnostico_serie(df, col, ref_min, ref_max, nome_curto)
+    st.markdown(f"**Diagnóstico ({nome_curto}):** {diag}")
+
+    st.markdown("---")
+
+
+# =============================================================================
+# PARTE 5 – SEÇÃO 1: MISTURA DA RAÇÃO
+# =============================================================================
+@medir_etapa("secao_mistura")
+def secao_mistura(conjunto):
+    """Seção 1: mistura da ração (últimas formulações registradas)."""
+    st.markdown("<div id='mistura' style='position: relative; top: -40px;'></div>", unsafe_allow_html=True)
+    st.subheader("Mistura da ração · linha do tempo")
+
+    df_mist, erro_mist = conjunto["mistura"]
+
+    if erro_mist is not None:
+        st.error(erro_mist)
+    elif df_mist is None:
+        st.warning(
+            "Arquivo `mistura_racao.csv` não encontrado na pasta de dados. "
+            "Crie-o com as colunas: data,%_milho,%_calcario,%_soja,%_nucleo."
+        )
+    else:
+        df_mist = df_mist.tail(10)
+
+        bloco_instagram_mistura(
+            df=df_mist,
+            col="milho_pct",
+            titulo="Milho (%)",
+            ref_min=59,
+            ref_max=67,
+            texto_ref="""
+            **Referência teórica:** 62 % (faixa alvo: 59% – 67 %).  
+            **Função:** principal fonte de energia da dieta.
+            """,
+            nome_curto="Milho",
+            ylim=(40, 90),
+        )
+
+        bloco_instagram_mistura(
+            df=df_mist,
+            col="farelo_soja_pct",
+            titulo="Farelo de soja (%)",
+            ref_min=22,
+            ref_max=26,
+            texto_ref="""
+            **Referência teórica:** 24 % (faixa alvo: 22.8% – 25.2%)  
+            **Função:** principal fonte de proteína da formulação.
+            """,
+            nome_curto="Farelo de soja",
+            ylim=(0, 40),
+        )
+
+        bloco_instagram_mistura(
+            df=df_mist,
+            col="calcario_pct",
+            titulo="Calcário (%)",
+            ref_min=9,
+            ref_max=11,
+            texto_ref="""
+            **Referência teórica:** 10 % (faixa alvo: 9.5% – 10.5%)  
+            **Função:** oferta de cálcio para qualidade de casca.
+            """,
+            nome_curto="Calcário",
+            ylim=(0, 20),
+        )
+
+        bloco_instagram_mistura(
+            df=df_mist,
+            col="nucleo_pct",
+            titulo="Núcleo (%)",
+            ref_min=3,
+            ref_max=5,
+            texto_ref="""
+            **Referência teórica:** 4 % (faixa alvo: 3–5 %)  
+            **Função:** vitaminas, minerais e aditivos concentrados.
+            """,
+            nome_curto="Núcleo",
+            ylim=None,
+        )
+
+        df_form, sem_formulacao = conjunto["formulacoes"]
+        if df_form is not None:
+            st.markdown("### Desempenho por formulação")
+            st.markdown(
+                "Cada registro diário dos lotes é atribuído à formulação em vigor na sua data "
+                "(a última troca registrada até aquele dia), permitindo comparar as dietas "
+                "em todo o histórico."
+            )
+            numero = st.column_config.NumberColumn
+            st.dataframe(
+                valores_exatos(df_form),
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "inicio": st.column_config.DateColumn("Início", format="DD/MM/YYYY"),
+                    "fim": st.column_config.DateColumn("Fim", format="DD/MM/YYYY"),
+                    "milho_pct": numero("Milho (%)", format="%.1f"),
+                    "farelo_soja_pct": numero("Soja (%)", format="%.1f"),
+                    "calcario_pct": numero("Calcário (%)", format="%.1f"),
+                    "nucleo_pct": numero("Núcleo (%)", format="%.1f"),
+                    "registros": numero("Registros"),
+                    "consumo_g_ave_dia": numero("Consumo médio (g/ave/dia)", format="%.1f"),
+                    "ovos_granja": numero("Produção média (ovos/dia)", format="%.0f"),
+                    "pct_defeituosos": numero("Não conformes (%)", format="%.1f"),
+                    "perda_ovos": numero("Perda média (ovos/dia)", format="%.1f"),
+                },
+            )
+            if sem_formulacao:
+                st.caption(
+                    f"{sem_formulacao} registro(s) anteriores à primeira formulação registrada "
+                    "não entram na comparação."
+                )
+
+
+# =============================================================================
+# PARTE 6 – SEÇÃO 2: CONSUMO
+# =============================================================================
+# =============================================================================
+# PARTE 6 – SEÇÃO 2: CONSUMO
+# =============================================================================
+@medir_etapa("secao_consumo")
+def secao_consumo(periodo):
+    """Seção 2: consumo de ração no período selecionado."""
+    st.markdown("<div id='consumo' style='position: relative; top: -40px;'></div>", unsafe_allow_html=True)
+    st.markdown("### Consumo de ração (g/ave/dia)")
+
+    st.markdown("""
+    **Referência de manejo:** faixa ideal de **105–115 g/ave/dia**.  
+    **Função:** garantir ingestão suficiente para atender o requerimento de energia e nutrientes,
+    mantendo produção, peso corporal e qualidade de casca adequados.
+    """)
+
+    df_consumo, erro_consumo = periodo["conjunto"]["consumo"]
+
+    if erro_consumo is not None:
+        st.error(erro_consumo)
+    elif df_consumo is None:
+        st.warning(
+            "Arquivo `consumo_racao.csv` não encontrado na pasta de dados. "
+            "Crie-o com as colunas: data,consumo_g_ave_dia."
+        )
+    else:
+        # Aplica o mesmo filtro de período da página (com a EWMA e as anomalias)
+        inicio, fim_excl = limites_periodo(df_consumo, periodo["ini"], periodo["fim"])
+        tendencias, erro = tendencias_conjunto(periodo["conjunto"])
+        avisar_falha(periodo, "tendencias", erro)
+        df_consumo_filtrado = quadro_tendencia(
+            df_consumo.iloc[inicio:fim_excl], tendencias and tendencias["consumo"], "consumo_g_ave_dia", inicio
+        )
+
+        if df_consumo_filtrado.empty:
+            st.info("Não há dados de `consumo_racao.csv` dentro do período selecionado.")
+        else:
+            # O arquivo de consumo também é lido como lote: a previsão usa a série dele
+            previsao = (
+                previsao_periodo(periodo, "consumo_g_ave_dia", horizonte_previsao, {"consumo_racao.csv"})
+                if mostrar_previsao
+                else None
+            )
+
+            # Gráfico em linha com faixa de referência
+            exibir_grafico(
+                chart_serie_altair,
+                df=df_consumo_filtrado,
+                col="consumo_g_ave_dia",
+                titulo="Consumo de ração (g/ave/dia)",
+                ref_min=CONSUMO_MIN,
+                ref_max=CONSUMO_MAX,
+                ylim=(80, 140),
+                y_label="Consumo (g/ave/dia)",
+                value_format=".1f",
+                tooltip_label="Consumo (g/ave/dia)",
+                max_pontos=max_pontos_grafico,
+                previsao=previsao,
+            )
+            if previsao is not None:
+                st.caption(
+                    f"Faixa cinza: previsão do consumo para os próximos {horizonte_previsao} dias "
+                    "(Holt-Winters com sazonalidade semanal; faixa de ~95%)."
+                )
+
+            # Estatística para o diagnóstico
+            consumo_medio_periodo = df_consumo_filtrado["consumo_g_ave_dia"].mean()
+
+            diag_consumo = diagnostico_consumo(
+                df=df_consumo_filtrado,
+                col="consumo_g_ave_dia",
+                ref_min=CONSUMO_MIN,
+                ref_max=CONSUMO_MAX,
+                nome="Consumo de ração (g/ave/dia)",
+            )
+
+            # Somente o diagnóstico automático abaixo do gráfico
+            st.markdown(f"**Diagnóstico (Consumo de ração):** {diag_consumo}")
+
+            st.markdown("---")
+
+
+# =============================================================================
+# PARTE 7 – SEÇÃO 3: PRODUÇÃO E PERDAS (VERTICAL)
+# =============================================================================
+@medir_etapa("secao_producao")
+def secao_producao(periodo):
+    """Seção 3: produção e perdas de ovos no período selecionado."""
+    colunas = periodo["colunas"]
+
+    st.markdown("<div id='producao' style='position: relative; top: -40px;'></div>", unsafe_allow_html=True)
+    st.subheader("Produção e perdas de ovos · linha do tempo")
+
+    if {"ovos_granja", "ovos_escola"}.issubset(colunas):
+        df_prod = tendencia_periodo(periodo, "ovos_granja", ["ovos_escola"]).dropna(subset=["ovos_granja", "ovos_escola"])
+
+        if not df_prod.empty:
+            st.markdown("### Produção diária de ovos (granja vs. escola)")
+            previsao = previsao_periodo(periodo, "ovos_granja", horizonte_previsao) if mostrar_previsao else None
+            exibir_grafico(chart_producao, df_prod, max_pontos=max_pontos_grafico, previsao=previsao)
+            if previsao is not None:
+                st.caption(
+                    f"Faixa azul: previsão da produção da granja para os próximos {horizonte_previsao} dias "
+                    "(Holt-Winters com sazonalidade semanal, por lote; faixa de ~95%)."
+                )
+
+            st.markdown(
+                """
+                **Referência conceitual:**  
+                - A curva da escola deveria acompanhar de perto a curva da granja.  
+                - Diferenças sistemáticas indicam perdas no transporte, registro ou manejo.
+                """
+            )
+
+        if "perda_ovos" in colunas:
+            df_perdas = tendencia_periodo(periodo, "perda_ovos").dropna(subset=["perda_ovos"])
+
+            st.markdown("### Perdas no trajeto (granja → escola)")
+            exibir_grafico(
+                chart_serie_altair,
+                df=df_perdas,
+                col="perda_ovos",
+                titulo="Perdas no trajeto (granja → escola)",
+                ref_min=None,
+                ref_max=None,
+                ylim=None,
+                y_label="Perdas (ovos)",
+                value_format=".0f",
+                tooltip_label="Perdas (ovos)",
+                max_pontos=max_pontos_grafico,
+            )
+
+        if "duzias_ovos" in colunas:
+            df_conversao = conversao_diaria(periodo, precos_racao, plantel).dropna(subset=["conversao_kg_duzia"])
+            if not df_conversao.empty:
+                st.markdown("### Conversão alimentar e custo da ração por dúzia")
+                exibir_grafico(
+                    chart_serie_altair,
+                    df=df_conversao,
+                    col="conversao_kg_duzia",
+                    titulo="Conversão alimentar (kg de ração por dúzia de ovos)",
+                    y_label="kg/dúzia",
+                    value_format=".2f",
+                    tooltip_label="kg/dúzia",
+                    max_pontos=max_pontos_grafico,
+                )
+                df_custo = df_conversao.dropna(subset=["custo_duzia"])
+                if not df_custo.empty:
+                    exibir_grafico(
+                        chart_serie_altair,
+                        df=df_custo,
+                        col="custo_duzia",
+                        titulo="Custo da ração por dúzia (R$)",
+                        y_label="R$/dúzia",
+                        value_format=".2f",
+                        tooltip_label="R$/dúzia",
+                        max_pontos=max_pontos_grafico,
+                    )
+                st.markdown(
+                    f"""
+                    **Como ler:** ração do dia (consumo × aves alojadas; **{plantel}** aves quando o
+                    lote não registra `aves_alojadas`) dividida pelas dúzias produzidas na granja.
+                    O custo usa a formulação em vigor em cada dia e os preços da barra lateral.
+                    """
+                )
+
+        total_granja, _, _ = resumo(periodo, "ovos_granja")
+        total_escola, _, _ = resumo(periodo, "ovos_escola")
+        total_perdas, _, _ = resumo(periodo, "perda_ovos")
+
+        st.markdown(
+            f"""
+            **Diagnóstico de produção e perdas (período filtrado):**  
+
+            - Total produzido na granja: **{total_granja:.0f} ovos**  
+            - Total registrado na escola: **{total_escola:.0f} ovos**  
+            - Diferença absoluta (perdas acumuladas): **{total_perdas:.0f} ovos**  
+
+            Se a diferença for recorrente e significativa, vale investigar:  
+            - acondicionamento das bandejas e proteção durante o transporte;  
+            - conferência de contagem na saída da granja e na chegada à escola;  
+            - registro diário em planilhas para rastrear dias mais críticos.
+            """
+        )
+    else:
+        st.info("Colunas 'ovos_granja' e 'ovos_escola' não encontradas nos dados.")
+
+    st.markdown("---")
+
+
+# =============================================================================
+# PARTE 8 – SEÇÃO 4: QUALIDADE & SANIDADE (VERTICAL)
+# =============================================================================
+@medir_etapa("secao_qualidade")
+def secao_qualidade(periodo):
+    """Seção 4: qualidade dos ovos, sanidade e tabela detalhada do período."""
+    colunas = periodo["colunas"]
+
+    st.markdown("<div id='qualidade' style='position: relative; top: -40px;'></div>", unsafe_allow_html=True)
+    st.subheader("Qualidade dos ovos & sanidade · linha do tempo")
+
+    if "pct_defeituosos" in colunas:
+        df_qual = tendencia_periodo(periodo, "pct_defeituosos").dropna(subset=["pct_defeituosos"])
+
+        exibir_grafico(
+            chart_serie_altair,
+            df=df_qual,
+            col="pct_defeituosos",
+            titulo="Percentual de ovos não conformes (%)",
+            ref_min=0,
+            ref_max=5,
+            ylim=None,
+            y_label="% de ovos não conformes",
+            value_format=".1f",
+            tooltip_label="% não conformes",
+            max_pontos=max_pontos_grafico,
+        )
+
+
+        st.markdown(
+            """
+            **Referência prática:**  
+            - Idealmente, o percentual de ovos não conformes deve ser mantido **o mais baixo possível**,  
+              tipicamente abaixo de **3–5%**, dependendo do sistema de produção.  
+            - Picos de defeitos podem estar associados a problemas de nutrição, sanidade ou manejo.
+            """
+        )
+
+    col_q1, col_q2 = st.columns(2)
+    with col_q1:
+        if "ovos_defeituosos" in colunas:
+            total_def, _, _ = resumo(periodo, "ovos_defeituosos")
+            st.metric("Total de ovos não conformes (período)", f"{total_def:.0f}")
+    with col_q2:
+        if "aves_doentes" in colunas:
+            total_doentes, _, _ = resumo(periodo, "aves_doentes")
+            st.metric("Soma de aves doentes observadas", f"{total_doentes:.0f}")
+
+    anomalias = anomalias_periodo(periodo)
+    if anomalias:
+        nomes = {
+            "consumo_g_ave_dia": "consumo",
+            "ovos_granja": "produção (granja)",
+            "perda_ovos": "perdas",
+            "pct_defeituosos": "% não conformes",
+            "aves_doentes": "aves doentes",
+        }
+        st.markdown(
+            f"**Registros fora do padrão do próprio lote** (|z| > {LIMITE_Z:g} em relação aos "
+            f"{JANELA_TENDENCIA} registros anteriores; círculos vermelhos nos gráficos):  \n"
+            + " · ".join(f"{nomes[col]}: **{n}**" for col, n in anomalias.items())
+        )
+
+    st.markdown("### Tabela detalhada (dados filtrados)")
+    colunas_tabela = colunas_tabela_detalhada(colunas)
+
+    # Tabela paginada: ordenação e filtro no servidor, só a página vai ao navegador
+    col_t1, col_t2, col_t3, col_t4 = st.columns([2, 1, 3, 1])
+    with col_t1:
+        ordem = st.selectbox("Ordenar por", colunas_tabela, key="tabela_ordem")
+    with col_t2:
+        decrescente = st.checkbox("Decrescente", key="tabela_decrescente")
+    with col_t3:
+        arquivos = st.multiselect(
+            "Arquivos",
+            sorted(periodo["conjunto"]["formatos"]),
+            key="tabela_arquivos",
+            placeholder="Todos",
+        )
+    with col_t4:
+        tamanho = st.selectbox("Linhas por página", [50, 100, 500, 1000], index=1, key="tabela_tamanho")
+
+    total_linhas = contar_linhas_tabela(periodo, arquivos)
+    total_paginas = max(1, -(-total_linhas // tamanho))
+    if st.session_state.get("tabela_pagina", 1) > total_paginas:
+        st.session_state["tabela_pagina"] = total_paginas
+
+    with etapa("tabela") as medida:
+        tabela = pagina_tabela(
+            periodo,
+            colunas_tabela,
+            ordem=ordem,
+            decrescente=decrescente,
+            arquivos=arquivos,
+            tamanho=tamanho,
+            pagina=st.session_state.get("tabela_pagina", 1),
+        )
+        medida["linhas"] = len(tabela)
+        st.dataframe(valores_exatos(tabela), use_container_width=True, hide_index=True)
+
+    col_p1, col_p2 = st.columns([1, 4])
+    with col_p1:
+        st.number_input("Página", min_value=1, max_value=total_paginas, step=1, key="tabela_pagina")
+    with col_p2:
+        st.caption(f"{total_linhas} linhas · {total_paginas} página(s) de até {tamanho} linhas")
+
+
+# =============================================================================
+# PARTE 9 – SEÇÃO 5: EFEITOS DEFASADOS (CORRELAÇÕES)
+# =============================================================================
+# Efeitos nutricionais aparecem com atraso (ex.: falta de calcário vira casca
+# defeituosa dias depois). Correlação entre cada série de dieta/consumo no dia
+# t e cada resultado no dia t + k, para k = 0..DEFASAGEM_MAXIMA, calculada para
+# todos os pares de uma vez por FFT e guardada por período.
+DEFASAGEM_MAXIMA = 21
+MIN_PARES_CORRELACAO = 10
+CACHE_CORRELACOES_MAX_ITENS = 64
+
+SERIES_CAUSA = {
+    "milho_pct": "Milho (%)",
+    "farelo_soja_pct": "Farelo de soja (%)",
+    "calcario_pct": "Calcário (%)",
+    "nucleo_pct": "Núcleo (%)",
+    "consumo_g_ave_dia": "Consumo (g/ave/dia)",
+}
+SERIES_EFEITO = {
+    "pct_defeituosos": "% não conformes",
+    "ovos_granja": "Produção (granja)",
+    "aves_doentes": "Aves doentes",
+}
+
+
+def series_diarias_periodo(periodo):
+    """
+    Séries por dia do calendário [ini, fim] (dias sem registro ficam NaN).
+    Causas: formulação em vigor no dia (junção "as-of" com `mistura_racao.csv`)
+    e consumo médio dos lotes. Efeitos: % de não conformes do dia (defeituosos
+    sobre produção), produção e aves doentes (somas dos lotes).
+    Retorna (causas, efeitos) como DataFrames indexados pelos dias.
+    """
+    dias = pd.date_range(pd.Timestamp(periodo["ini"]), pd.Timestamp(periodo["fim"]), freq="D")
+    medias = [c for c in ("consumo_g_ave_dia",) if c in periodo["colunas"]]
+    somas = [c for c in ("ovos_granja", "ovos_defeituosos", "aves_doentes") if c in periodo["colunas"]]
+    df = colunas_periodo(periodo, ["data", *medias, *somas])
+    grupos = df.groupby(df["data"].dt.normalize())
+    por_dia = (
+        pd.concat([grupos[medias].mean(), grupos[somas].sum(min_count=1)], axis=1)
+        .reindex(dias)
+        .astype("float64")
+    )
+
+    causas = pd.DataFrame(index=dias)
+    df_mist, _ = periodo["conjunto"]["mistura"]
+    if df_mist is not None and not df_mist.empty:
+        df_mist = trocas_formulacao(df_mist)
+        vigente = np.searchsorted(df_mist["data"].to_numpy(), dias.to_numpy(), side="right") - 1
+        composicao = df_mist[COLUNAS_FORMULACAO].to_numpy(dtype="float64", na_value=np.nan)[vigente.clip(0)]
+        composicao[vigente < 0] = np.nan
+        causas[COLUNAS_FORMULACAO] = composicao
+    if "consumo_g_ave_dia" in por_dia.columns:
+        causas["consumo_g_ave_dia"] = por_dia["consumo_g_ave_dia"]
+
+    efeitos = pd.DataFrame(index=dias)
+    if {"ovos_defeituosos", "ovos_granja"}.issubset(por_dia.columns):
+        efeitos["pct_defeituosos"] = 100 * por_dia["ovos_defeituosos"] / por_dia["ovos_granja"].where(por_dia["ovos_granja"] > 0)
+    for col in ("ovos_granja", "aves_doentes"):
+        if col in por_dia.columns:
+            efeitos[col] = por_dia[col]
+    return causas, efeitos
+
+
+def correlacao_defasada(x, y, defasagem_maxima):
+    """
+    Correlação de Pearson entre x[t] e y[t + k], k = 0..defasagem_maxima,
+    para todos os pares de colunas de `x` (T x P) e `y` (T x R) de uma vez.
+
+    Cada soma necessária (nº de pares, Σx, Σy, Σx², Σy², Σxy nos dias em que
+    os dois lados têm valor) é uma correlação cruzada calculada por FFT, em
+    O(T log T) por série. As séries são padronizadas antes, para que séries
+    constantes virem zeros exatos (e correlação NaN) em vez de ruído numérico.
+    Retorna (r, pares), ambos P x R x (defasagem_maxima + 1).
+    """
+    def padronizar(a):
+        validos = ~np.isnan(a)
+        a0, cont = np.where(validos, a, 0.0), validos.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            media = a0.sum(axis=0) / cont
+            desvio = np.sqrt(np.where(validos, (a0 - media) ** 2, 0.0).sum(axis=0) / cont)
+            z = np.where(validos & (desvio > 0), (a - media) / desvio, 0.0)
+        return z, validos.astype("float64")
+
+    (x, mx), (y, my) = padronizar(x), padronizar(y)
+    # Zero-padding até n_fft >= 2T: a correlação circular não dá a volta
+    n_fft = 1 << int(np.ceil(np.log2(max(2 * len(x), 2))))
+
+    def espectro(a):
+        return np.fft.rfft(a, n=n_fft, axis=0)
+
+    fx, fmx, fx2 = (np.conj(espectro(a)) for a in (x, mx, x * x))
+    fy, fmy, fy2 = (espectro(b) for b in (y, my, y * y))
+
+    def cruzada(fa, fb):
+        # Σ_t a[t] b[t + k] para todos os pares (colunas de a x colunas de b)
+        c = np.fft.irfft(fa[:, :, None] * fb[:, None, :], n=n_fft, axis=0)[: defasagem_maxima + 1]
+        return np.moveaxis(c, 0, -1)
+
+    n = np.rint(cruzada(fmx, fmy))
+    sx, sy = cruzada(fx, fmy), cruzada(fmx, fy)
+    sxx, syy, sxy = cruzada(fx2, fmy), cruzada(fmx, fy2), cruzada(fx, fy)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var_x, var_y = n * sxx - sx * sx, n * syy - sy * sy
+        limite = 1e-9 * n * n
+        r = np.where(
+            (n >= MIN_PARES_CORRELACAO) & (var_x > limite) & (var_y > limite),
+            (n * sxy - sx * sy) / np.sqrt(var_x * var_y),
+            np.nan,
+        )
+    return np.clip(r, -1, 1), n.astype("int64")
+
+
+@st.cache_resource(show_spinner=False)
+def cache_correlacoes():
+    """Correlações defasadas já calculadas, em ordem LRU: (versão, ini, fim) -> DataFrame."""
+    return {"lock": threading.Lock(), "itens": OrderedDict()}
+
+
+@medir_etapa("correlacoes")
+def correlacoes_periodo(periodo):
+    """
+    Tabela longa (causa, efeito, defasagem, r, pares) das correlações
+    defasadas do período, guardada por versão do conjunto e período: trocar
+    de seção ou voltar a um período já visto não recalcula nada.
+    """
+    chave = (periodo["conjunto"]["versao"], periodo["ini"], periodo["fim"])
+    cache = cache_correlacoes()
+    with cache["lock"]:
+        if chave in cache["itens"]:
+            cache["itens"].move_to_end(chave)
+            return cache["itens"][chave]
+
+    causas, efeitos = series_diarias_periodo(periodo)
+    r, pares = correlacao_defasada(causas.to_numpy(), efeitos.to_numpy(), DEFASAGEM_MAXIMA)
+    n_causas, n_efeitos, n_defasagens = r.shape
+    resultado = pd.DataFrame({
+        "causa": np.repeat(causas.columns.to_numpy(), n_efeitos * n_defasagens),
+        "efeito": np.tile(np.repeat(efeitos.columns.to_numpy(), n_defasagens), n_causas),
+        "defasagem": np.tile(np.arange(n_defasagens), n_causas * n_efeitos),
+        "r": r.ravel(),
+        "pares": pares.ravel(),
+    })
+
+    with cache["lock"]:
+        cache["itens"][chave] = resultado
+        while len(cache["itens"]) > CACHE_CORRELACOES_MAX_ITENS:
+            cache["itens"].popitem(last=False)
+    return resultado
+
+
+def chart_correlacoes(df):
+    """Mapa de calor: um par causa → efeito por linha, defasagem (dias) nas colunas, cor = r."""
+    return (
+        alt.Chart(df)
+        .mark_rect()
+        .encode(
+            x=alt.X("defasagem:O", title="Defasagem (dias)"),
+            y=alt.Y("par:N", title=None, sort=None),
+            color=alt.Color("r:Q", title="r", scale=alt.Scale(scheme="redblue", domain=[-1, 1], reverse=True)),
+            tooltip=[
+                alt.Tooltip("par:N", title="Par"),
+                alt.Tooltip("defasagem:O", title="Defasagem (dias)"),
+                alt.Tooltip("r:Q", title="Correlação", format=".2f"),
+                alt.Tooltip("pares:Q", title="Dias comparados"),
+            ],
+        )
+        .properties(height=alt.Step(16))
+    )
+
+
+@medir_etapa("secao_defasagens")
+def secao_defasagens(periodo):
+    """Seção 5: correlações defasadas entre dieta/consumo e resultados no período."""
+    st.markdown("<div id='defasagens' style='position: relative; top: -40px;'></div>", unsafe_allow_html=True)
+    st.subheader("Efeitos defasados · dieta e consumo → resultados")
+
+    st.markdown(
+        f"""
+        Correlação entre cada série de **dieta/consumo no dia t** e cada resultado no
+        **dia t + k** (k = 0 a {DEFASAGEM_MAXIMA} dias), com uma série por dia do período
+        (lotes somados). Um pico em k > 0 sugere efeito com atraso; correlação não prova
+        causa, e formulações que não mudam no período não têm correlação definida.
+        """
+    )
+
+    correlacoes = correlacoes_periodo(periodo)
+    validas = correlacoes.dropna(subset=["r"])
+    if validas.empty:
+        st.info(
+            f"Não há variação suficiente no período para calcular as correlações "
+            f"(mínimo de {MIN_PARES_CORRELACAO} dias com os dois lados registrados)."
+        )
+        st.markdown("---")
+        return
+
+    # Só os pares com alguma correlação definida vão para o mapa de calor
+    grafico = correlacoes[correlacoes.groupby(["causa", "efeito"])["r"].transform("count") > 0]
+    grafico = grafico.assign(par=grafico["causa"].map(SERIES_CAUSA) + " → " + grafico["efeito"].map(SERIES_EFEITO))
+    exibir_grafico(chart_correlacoes, grafico)
+
+    # Defasagem de maior |r| de cada par
+    mais_fortes = (
+        validas.loc[validas["r"].abs().groupby([validas["causa"], validas["efeito"]]).idxmax()]
+        .assign(forca=lambda d: d["r"].abs())
+        .sort_values("forca", ascending=False)
+    )
+    st.markdown("**Defasagem mais forte de cada par**")
+    st.dataframe(
+        pd.DataFrame({
+            "Causa": mais_fortes["causa"].map(SERIES_CAUSA),
+            "Efeito": mais_fortes["efeito"].map(SERIES_EFEITO),
+            "Defasagem (dias)": mais_fortes["defasagem"],
+            "Correlação (r)": mais_fortes["r"].round(2),
+            "Dias comparados": mais_fortes["pares"],
+        }),
+        use_container_width=True,
+        hide_index=True,
+    )
+    st.markdown("---")
+
+
+# =============================================================================
+# PARTE 10 – EXPORTAÇÃO DOS DADOS (CSV / PARQUET / XLSX)
+# =============================================================================
+# Os arquivos são escritos bloco a bloco em um arquivo temporário em disco, a
+# partir das fatias do conjunto em cache, sem cópia do DataFrame inteiro nem
+# uma string/planilha montada por concatenação. O botão de download, porém,
+# precisa do arquivo pronto em bytes, que o Streamlit guarda em memória até
+# o download: o pico de memória é o tamanho do arquivo gerado. Por isso o
+# download vai só até LIMITE_LINHAS_DOWNLOAD linhas (ajuste com a variável de
+# ambiente AVICULTURA_LIMITE_DOWNLOAD); acima disso o arquivo é gravado em
+# PASTA_EXPORTACAO, direto do disco para o disco, e a página mostra o
+# caminho. A geração só roda quando o botão é clicado (o download do
+# Streamlit aceita uma função), não a cada execução da página.
+TAMANHO_BLOCO_EXPORTACAO = 50_000
+LIMITE_LINHAS_XLSX = 1_048_575
+LIMITE_LINHAS_DOWNLOAD = max(1, numero_ambiente("AVICULTURA_LIMITE_DOWNLOAD", 1_000_000))
+PASTA_EXPORTACAO = os.path.join(PASTA_DADOS, ".exportacoes")
+
+FORMATOS_EXPORTACAO = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "XLSX": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def blocos_dataframe(df, tamanho=TAMANHO_BLOCO_EXPORTACAO):
+    """Fatias posicionais de `df` (views, salvo colunas float32: ver `valores_exatos`); sempre ao menos uma, mesmo vazia."""
+    for inicio in range(0, max(len(df), 1), tamanho):
+        yield valores_exatos(df.iloc[inicio:inicio + tamanho])
+
+
+def escrever_blocos(blocos, formato):
+    """
+    Escreve os blocos (DataFrames com as mesmas colunas) no `formato` pedido
+    em um arquivo temporário e devolve o conteúdo (bytes); o arquivo é
+    fechado (e apagado) ao final.
+    """
+    with tempfile.TemporaryFile() as arquivo:
+        _escrever_blocos_arquivo(blocos, formato, arquivo)
+        arquivo.seek(0)
+        return arquivo.read()
+
+
+def gravar_exportacao(blocos, formato, nome):
+    """
+    Escreve os blocos no `formato` pedido no arquivo `nome` de
+    PASTA_EXPORTACAO (via temporário + troca, para nunca deixar um arquivo
+    pela metade) e devolve o caminho; nada passa pela memória inteiro.
+    """
+    os.makedirs(PASTA_EXPORTACAO, exist_ok=True)
+    caminho = os.path.join(PASTA_EXPORTACAO, nome)
+    try:
+        with open(caminho + ".tmp", "wb") as arquivo:
+            _escrever_blocos_arquivo(blocos, formato, arquivo)
+    except Exception:
+        if os.path.exists(caminho + ".tmp"):
+            os.remove(caminho + ".tmp")
+        raise
+    os.replace(caminho + ".tmp", caminho)
+    return caminho
+
+
+def _escrever_blocos_arquivo(blocos, formato, arquivo):
+    if formato == "CSV":
+        texto = io.TextIOWrapper(arquivo, encoding="utf-8", newline="")
+        for i, bloco in enumerate(blocos):
+            bloco.to_csv(texto, header=(i == 0), index=False)
+        texto.flush()
+        texto.detach()
+    elif formato == "Parquet":
+        escritor = None
+        for bloco in blocos:
+            # Cada bloco vira um row group com o esquema do primeiro bloco
+            tabela = pa.Table.from_pandas(bloco, preserve_index=False, schema=escritor.schema if escritor else None)
+            if escritor is None:
+                escritor = pq.ParquetWriter(arquivo, tabela.schema)
+            escritor.write_table(tabela)
+        escritor.close()
+    else:
+        # Modo write_only do openpyxl: as linhas vão direto para o arquivo
+        livro = openpyxl.Workbook(write_only=True)
+        folha = livro.create_sheet("dados")
+        for i, bloco in enumerate(blocos):
+            if i == 0:
+                folha.append(list(bloco.columns))
+            for linha in bloco.astype(object).where(bloco.notna(), None).itertuples(index=False, name=None):
+                folha.append(linha)
+        livro.save(arquivo)
+
+
+def fontes_exportacao(periodo):
+    """
+    Conjuntos exportáveis: rótulo -> (nome base do arquivo, nº de linhas,
+    função que gera os blocos). O período usa as colunas da tabela detalhada.
+    """
+    conjunto = periodo["conjunto"]
+    colunas_tabela = colunas_tabela_detalhada(periodo["colunas"])
+    ini, fim = periodo["ini"], periodo["fim"]
+    sufixo = f"{ini:%Y%m%d}_{fim:%Y%m%d}"
+
+    if periodo["dados"] is None:
+        def blocos_periodo():
+            return blocos_banco(colunas_tabela, ini, fim, TAMANHO_BLOCO_EXPORTACAO)
+    else:
+        def blocos_periodo():
+            return blocos_dataframe(periodo["dados"][colunas_tabela])
+
+    fontes = {"Período filtrado (dados)": (f"avicultura_{sufixo}", periodo["linhas"], blocos_periodo)}
+
+    df_consumo, _ = conjunto["consumo"]
+    if df_consumo is not None:
+        df_consumo = fatiar_periodo(df_consumo, ini, fim)
+        fontes["Consumo de ração (período)"] = (f"consumo_racao_{sufixo}", len(df_consumo), lambda: blocos_dataframe(df_consumo))
+
+    df_mist, _ = conjunto["mistura"]
+    if df_mist is not None:
+        fontes["Mistura da ração (completa)"] = ("mistura_racao", len(df_mist), lambda: blocos_dataframe(df_mist))
+    return fontes
+
+
+def bloco_exportacao(periodo):
+    """Botões de download dos dados do período, do consumo e da mistura."""
+    st.markdown("<div id='exportar' style='position: relative; top: -40px;'></div>", unsafe_allow_html=True)
+    st.markdown("### Exportar dados")
+
+    formatos = ["CSV"]
+    if pq is not None:
+        formatos.append("Parquet")
+    if openpyxl is not None:
+        formatos.append("XLSX")
+
+    fontes = fontes_exportacao(periodo)
+    col_e1, col_e2, col_e3 = st.columns([2, 1, 1])
+    with col_e1:
+        escolha = st.selectbox("Dados", list(fontes), key="exportar_fonte")
+    with col_e2:
+        formato = st.selectbox("Formato", formatos, key="exportar_formato")
+
+    nome, linhas, gerar_blocos = fontes[escolha]
+    extensao, mime = FORMATOS_EXPORTACAO[formato]
+    muito_grande = formato == "XLSX" and linhas > LIMITE_LINHAS_XLSX
+    em_disco = linhas > LIMITE_LINHAS_DOWNLOAD
+    with col_e3:
+        if em_disco:
+            gravar = st.button("💾 Gravar em disco", key="exportar_gravar", disabled=muito_grande)
+        else:
+            gravar = False
+            st.download_button(
+                "⬇️ Baixar",
+                data=lambda: escrever_blocos(gerar_blocos(), formato),
+                file_name=f"{nome}.{extensao}",
+                mime=mime,
+                key="exportar_baixar",
+                on_click="ignore",
+                disabled=muito_grande,
+            )
+
+    if muito_grande:
+        st.caption(f"{linhas} linhas: acima do limite de uma planilha XLSX; use CSV ou Parquet.")
+    elif em_disco:
+        st.caption(
+            f"{linhas} linhas: acima do limite de download ({LIMITE_LINHAS_DOWNLOAD} linhas, "
+            "AVICULTURA_LIMITE_DOWNLOAD); o arquivo é gravado na pasta de dados."
+        )
+    else:
+        st.caption(f"{linhas} linhas · o arquivo é gerado ao clicar, em blocos de {TAMANHO_BLOCO_EXPORTACAO} linhas.")
+    if gravar:
+        with st.spinner("Gravando o arquivo..."):
+            caminho = gravar_exportacao(gerar_blocos(), formato, f"{nome}.{extensao}")
+        st.success(f"Arquivo gravado em `{caminho}`.")
+    if openpyxl is None:
+        st.caption("Exportação XLSX requer o pacote `openpyxl`.")
+
+
+# =============================================================================
+# DESENHO DAS SEÇÕES (página inteira ou só a seção escolhida)
+# =============================================================================
+@st.fragment
+def painel_periodo(conjunto, secoes, resumo=True, exportar=True):
+    """
+    Painel reexecutável isoladamente: filtro de período, cards resumo
+    (`resumo`), as seções que dependem do período e a exportação
+    (`exportar`). Mudar o período reexecuta só este painel; leitura dos
+    arquivos, barra lateral e seções independentes do período (mistura)
+    não são tocadas.
+    """
+    ini, fim = filtro_periodo(conjunto)
+    periodo = montar_periodo(conjunto, ini, fim)
+
+    if periodo["linhas"] == 0:
+        st.warning("Nenhum dado dentro do período selecionado.")
+        return
+
+    if resumo:
+        cards_resumo(periodo)
+    for desenhar_secao in secoes:
+        desenhar_secao(periodo)
+    if exportar:
+        bloco_exportacao(periodo)
+
+
+# Rótulo do menu -> (âncora, função que desenha a seção, depende do período?)
+SECOES = {
+    "Consumo": ("consumo", secao_consumo, True),
+    "Produção e perdas": ("producao", secao_producao, True),
+    "Qualidade & sanidade": ("qualidade", secao_qualidade, True),
+    "Efeitos defasados": ("defasagens", secao_defasagens, True),
+    "Mistura da ração": ("mistura", secao_mistura, False),
+}
+
+if somente_secao:
+    # Só a seção escolhida é calculada e enviada ao navegador ("Topo" = só
+    # os cards, "Exportar dados" = só a exportação)
+    escolhidas = [secao] if secao in SECOES else []
+    mostrar_resumo, mostrar_exportacao = secao == "Topo", secao == "Exportar dados"
+else:
+    escolhidas = list(SECOES)
+    mostrar_resumo = mostrar_exportacao = True
+
+secoes_periodo = [SECOES[n][1] for n in escolhidas if SECOES[n][2]]
+if secoes_periodo or mostrar_resumo or mostrar_exportacao:
+    painel_periodo(conjunto, secoes_periodo, mostrar_resumo, mostrar_exportacao)
+for nome in escolhidas:
+    if not SECOES[nome][2]:
+        SECOES[nome][1](conjunto)
+
+st.markdown("---")
+if USAR_OBSERVADOR:
+    aviso_nova_versao()
+    st.caption(
+        "Para atualizar o dashboard, basta adicionar novos arquivos .csv na pasta `dados/` "
+        "seguindo o mesmo padrão de colunas. Os gráficos são atualizados sozinhos em poucos segundos."
+    )
+else:
+    st.caption(
+        "Para atualizar o dashboard, basta adicionar novos arquivos .csv na pasta `dados/` "
+        "seguindo o mesmo padrão de colunas. Ao recarregar a página, os gráficos são atualizados automaticamente."
+    )
+
+
+# =====================================================================
+# PAINEL DO MODO DIAGNÓSTICO
+# =====================================================================
+def painel_diagnostico(medidas, segundos_total, caminho_perfil=None):
+    """Resumo por etapa (chamadas, tempo, linhas, pico e variação líquida de memória) na barra lateral."""
+    with st.sidebar:
+        st.subheader("Diagnóstico da execução")
+        st.caption(
+            f"Execução completa: **{1000 * segundos_total:.0f} ms**. Etapas aninhadas têm "
+            "tempo inclusivo; trocar o período reexecuta só o painel do período, sem atualizar esta tabela."
+        )
+        if caminho_perfil:
+            st.success(f"Perfil gravado em `{caminho_perfil}`")
+        if not medidas:
+            return
+
+        tabela = pd.DataFrame(medidas).reindex(columns=["etapa", "segundos", "linhas", "pico_mb", "variacao_mb"])
+        tabela["ms"] = 1000 * tabela["segundos"]
+        for col in ("linhas", "pico_mb", "variacao_mb"):
+            tabela[col] = pd.to_numeric(tabela[col])
+        por_etapa = (
+            tabela.groupby("etapa", sort=False)
+            .agg(
+                chamadas=("etapa", "size"),
+                ms=("ms", "sum"),
+                linhas=("linhas", lambda v: v.sum(min_count=1)),
+                pico_mb=("pico_mb", "max"),
+                variacao_mb=("variacao_mb", lambda v: v.sum(min_count=1)),
+            )
+            .sort_values("ms", ascending=False)
+            .round(1)
+            .rename(columns={"pico_mb": "pico (MB)", "variacao_mb": "variação líquida (MB)"})
+        )
+        st.caption(
+            "Pico: maior uso de memória durante a etapa, acima do uso na entrada (máximo entre as "
+            "chamadas). Variação líquida: o que ficou alocado ao final (soma das chamadas)."
+        )
+        st.dataframe(por_etapa, use_container_width=True)
+
+
+if diagnostico["ativo"]:
+    caminho_perfil = gravar_perfil(perfil) if perfil is not None else None
+    painel_diagnostico(diagnostico["medidas"], time.perf_counter() - inicio_execucao, caminho_perfil)
+
+
+# =====================================================================
+# DISPARA O SCROLL APÓS DESENHAR TODA A PÁGINA
+# =====================================================================
+if not somente_secao:
+    if secao in SECOES:
+        scroll_to(SECOES[secao][0])
+    elif secao == "Exportar dados":
+        scroll_to("exportar")
+    else:
+        scroll_to("topo")
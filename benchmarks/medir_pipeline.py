@@ -0,0 +1,209 @@
+"""
+Benchmark do dashboard com dados sintéticos.
+
+Gera uma pasta de dados no mesmo formato da pasta `dados/` (lotes diários,
+`mistura_racao.csv` e `consumo_racao.csv`), roda o `app.py` sem navegador
+(Streamlit AppTest) e mede cada etapa do pipeline: ingestão, conversão de
+datas, métricas derivadas, filtro de período, diagnósticos, geração dos
+gráficos e serialização da tabela.
+
+Cada caso (nº de linhas x nº de arquivos) roda em um processo separado,
+para que os caches de um caso não contaminem o seguinte. O resultado é um
+JSON com, por caso e por fase (primeira execução, reexecução e troca de
+período), o tempo total da execução e o tempo somado de cada etapa.
+
+Uso (a partir da raiz do repositório):
+
+    python benchmarks/medir_pipeline.py
+    python benchmarks/medir_pipeline.py --linhas 1000 100000 10000000 --arquivos 1 100 1000
+    python benchmarks/medir_pipeline.py --backend sqlite --saida resultados.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(RAIZ, "app.py")
+
+# Até um dia por linha; acima disso, várias linhas (aviários) por dia
+DIAS_MAXIMOS = 20 * 365
+INICIO = pd.Timestamp("2005-01-01")
+
+
+# -------------------- Geração dos dados sintéticos --------------------
+def gerar_lote(rng, n, dia_inicial, dias):
+    """Linhas de um arquivo de lote (mesmas colunas de `dados/2025-09-lote1.csv`)."""
+    deslocamento = dia_inicial + (np.arange(n) * dias) // max(n, 1)
+    datas = INICIO + pd.to_timedelta(deslocamento, unit="D")
+    granja = rng.integers(120, 260, n)
+    return pd.DataFrame(
+        {
+            "data": datas.strftime("%Y-%m-%d"),
+            "milho_pct": 63.5,
+            "farelo_soja_pct": 20.0,
+            "calcario_pct": 8.5,
+            "nucleo_pct": 8.0,
+            "consumo_g_ave_dia": rng.normal(100, 6, n).round(1),
+            "ovos_granja": granja,
+            "ovos_escola": granja - rng.integers(0, 40, n),
+            "ovos_quebrados": rng.integers(0, 8, n),
+            "ovos_sem_casca": rng.integers(0, 4, n),
+            "ovos_deformados": rng.integers(0, 4, n),
+            "aves_doentes": rng.integers(0, 6, n),
+            "observacao": rng.choice(["", "Produção normal", "Calor intenso", "Troca de ração"], n),
+        }
+    )
+
+
+def gerar_dados(pasta, linhas, arquivos, semente=0):
+    """
+    Escreve em `pasta` `arquivos` lotes somando `linhas` linhas, mais
+    `consumo_racao.csv` (datas dd/mm/aaaa) e `mistura_racao.csv` (cabeçalhos
+    "%_..." e decimal com vírgula), como os arquivos reais.
+    """
+    rng = np.random.default_rng(semente)
+    os.makedirs(pasta, exist_ok=True)
+    dias = min(linhas, DIAS_MAXIMOS)
+
+    # Cada lote cobre um trecho consecutivo do período total
+    tamanhos = np.full(arquivos, linhas // arquivos)
+    tamanhos[: linhas % arquivos] += 1
+    dia = 0
+    for i, n in enumerate(tamanhos):
+        dias_lote = max(1, dias * int(n) // linhas)
+        gerar_lote(rng, int(n), dia, dias_lote).to_csv(os.path.join(pasta, f"lote-{i:04d}.csv"), index=False)
+        dia += dias_lote
+
+    datas = INICIO + pd.to_timedelta(np.arange(dias), unit="D")
+    pd.DataFrame(
+        {"data": datas.strftime("%d/%m/%Y"), "consumo_g_ave_dia": rng.normal(100, 6, dias).round(1)}
+    ).to_csv(os.path.join(pasta, "consumo_racao.csv"), index=False)
+
+    trocas = datas[:: max(1, dias // 20)]
+    with open(os.path.join(pasta, "mistura_racao.csv"), "w", encoding="utf-8") as f:
+        f.write("data, %_milho, %_calcario, %_soja, %_nucleo\n")
+        for d in trocas:
+            milho = rng.uniform(60, 66)
+            nucleo = 100 - milho - 28.5
+            f.write(f'{d:%d/%m/%Y},"{milho:.1f}","8,5","20","{nucleo:.1f}"\n'.replace(".", ","))
+
+
+# -------------------- Execução de um caso --------------------
+def ler_medicoes(caminho):
+    """Soma o tempo de cada etapa registrado pelo app e esvazia o arquivo."""
+    etapas = {}
+    if os.path.exists(caminho):
+        with open(caminho, encoding="utf-8") as f:
+            for linha in f:
+                m = json.loads(linha)
+                etapas[m["etapa"]] = etapas.get(m["etapa"], 0.0) + m["segundos"]
+        os.remove(caminho)
+    return etapas
+
+
+def medir_caso(linhas, arquivos, backend, timeout):
+    """
+    Gera os dados de um caso, roda o app três vezes (fria, reexecução e
+    troca de período) e devolve o resultado do caso como dicionário.
+    """
+    with tempfile.TemporaryDirectory(prefix="avicultura-bench-") as tmp:
+        pasta = os.path.join(tmp, "dados")
+        inicio = time.perf_counter()
+        gerar_dados(pasta, linhas, arquivos)
+        geracao = time.perf_counter() - inicio
+
+        medicoes = os.path.join(tmp, "medicoes.jsonl")
+        # As variáveis precisam existir antes de o app ser executado
+        os.environ.update(
+            AVICULTURA_PASTA_DADOS=pasta,
+            AVICULTURA_MEDICOES=medicoes,
+            AVICULTURA_BACKEND=backend,
+            AVICULTURA_OBSERVADOR="0",
+        )
+        from streamlit.testing.v1 import AppTest
+
+        at = AppTest.from_file(APP, default_timeout=timeout)
+        fases = {}
+
+        def executar(nome, acao):
+            inicio = time.perf_counter()
+            acao()
+            fases[nome] = {
+                "segundos": time.perf_counter() - inicio,
+                "etapas": ler_medicoes(medicoes),
+                "erros": [e.value for e in at.exception] + [e.value for e in at.error],
+            }
+
+        executar("primeira_execucao", at.run)
+        executar("reexecucao", at.run)
+        if at.date_input:
+            ini, fim = at.date_input[0].value
+            executar("troca_periodo", lambda: at.date_input[0].set_value((max(ini, fim - timedelta(days=30)), fim)).run())
+
+        return {
+            "linhas": linhas,
+            "arquivos": arquivos,
+            "backend": backend,
+            "geracao_dados_segundos": geracao,
+            "fases": fases,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--linhas", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--arquivos", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--backend", default="pandas", choices=["pandas", "sqlite", "duckdb"])
+    parser.add_argument("--timeout", type=float, default=600, help="limite por execução do app (s)")
+    parser.add_argument("--saida", help="arquivo JSON de saída (padrão: saída padrão)")
+    parser.add_argument("--caso", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.caso:
+        # Processo filho: mede um único caso e devolve o JSON na saída padrão
+        linhas, arquivos = map(int, args.caso.split("x"))
+        print(json.dumps(medir_caso(linhas, arquivos, args.backend, args.timeout)))
+        return
+
+    casos = []
+    for linhas in args.linhas:
+        for arquivos in args.arquivos:
+            if arquivos > linhas:
+                continue
+            print(f"medindo {linhas} linhas em {arquivos} arquivo(s)...", file=sys.stderr)
+            proc = subprocess.run(
+                [sys.executable, __file__, "--caso", f"{linhas}x{arquivos}",
+                 "--backend", args.backend, "--timeout", str(args.timeout)],
+                capture_output=True,
+                text=True,
+            )
+            if proc.returncode != 0:
+                casos.append({"linhas": linhas, "arquivos": arquivos, "backend": args.backend,
+                              "falha": proc.stderr.strip().splitlines()[-1:]})
+                continue
+            casos.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    resultado = {
+        "data": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+        "casos": casos,
+    }
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
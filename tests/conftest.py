@@ -0,0 +1,56 @@
+"""
+Fixtures dos testes.
+
+O `app.py` é um script do Streamlit (não um pacote importável): os testes o
+executam uma vez, sem navegador (modo "bare" do Streamlit), sobre uma pasta
+de dados mínima e usam as funções do namespace resultante.
+"""
+import logging
+import os
+import runpy
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOTE_MINIMO = """data,consumo_g_ave_dia,ovos_granja,ovos_escola
+2025-09-01,95.2,170,160
+2025-09-02,96.0,180,170
+"""
+
+
+def _executar_app(pasta, **extra):
+    """Executa o `app.py` sobre `pasta` com as variáveis de ambiente `extra`."""
+    (pasta / "lote.csv").write_text(LOTE_MINIMO, encoding="utf-8")
+    ambiente = {"AVICULTURA_PASTA_DADOS": str(pasta), "AVICULTURA_OBSERVADOR": "0", **extra}
+    anterior = {chave: os.environ.get(chave) for chave in ambiente}
+    os.environ.update(ambiente)
+    # Sem sessão do Streamlit, cada chamada de st.* avisa no log
+    logging.disable(logging.WARNING)
+    try:
+        yield runpy.run_path(os.path.join(RAIZ, "app.py"), run_name="app")
+    finally:
+        logging.disable(logging.NOTSET)
+        for chave, valor in anterior.items():
+            if valor is None:
+                os.environ.pop(chave, None)
+            else:
+                os.environ[chave] = valor
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    """Namespace do `app.py` executado sobre uma pasta de dados temporária."""
+    yield from _executar_app(tmp_path_factory.mktemp("dados"))
+
+
+@pytest.fixture(scope="session")
+def app_compacto(tmp_path_factory):
+    """Como `app`, com a representação compacta ligada (AVICULTURA_COMPACTO=1)."""
+    yield from _executar_app(tmp_path_factory.mktemp("dados_compactos"), AVICULTURA_COMPACTO="1")
+
+
+@pytest.fixture(scope="session")
+def app_banco(tmp_path_factory):
+    """Como `app`, com o banco analítico embutido (AVICULTURA_BACKEND=sqlite)."""
+    yield from _executar_app(tmp_path_factory.mktemp("dados_banco"), AVICULTURA_BACKEND="sqlite")
@@ -0,0 +1,94 @@
+"""Banco embutido (AVICULTURA_BACKEND=sqlite): mesmas linhas e tendências que a carga em memória."""
+import numpy as np
+import pandas as pd
+
+CABECALHO = "data,consumo_g_ave_dia,ovos_granja,ovos_escola\n"
+
+
+def _lote(dias, semente, inicio=0):
+    rng = np.random.default_rng(semente)
+    return "".join(
+        f"{(pd.Timestamp('2025-06-01') + pd.Timedelta(days=inicio + d)).date()},"
+        f"{rng.normal(95, 3):.1f},{rng.integers(150, 190)},{rng.integers(140, 150)}\n"
+        for d in range(dias)
+    )
+
+
+def _em_memoria(app, caminhos):
+    blocos = [app["ler_arquivo_incremental"](str(c), None)[1] for c in caminhos]
+    return app["_ordenar_por_data"](app["concatenar_blocos"](blocos))
+
+
+def _registros(app_banco, caminho):
+    return app_banco["consultar_banco"](
+        'SELECT rowid, data, consumo_g_ave_dia FROM registros WHERE "__arquivo_origem" = ? ORDER BY rowid',
+        (caminho.name,),
+    )
+
+
+def test_arquivo_que_cresceu_so_insere_as_linhas_novas(app_banco, tmp_path):
+    sincronizar = app_banco["sincronizar_banco"]
+    caminho = tmp_path / "lote_a.csv"
+    linhas = _lote(40, 1).splitlines(keepends=True)
+    # A última linha ainda está sendo gravada
+    caminho.write_text(CABECALHO + "".join(linhas[:20]) + linhas[20][:14], encoding="utf-8")
+    assert sincronizar([str(caminho)]) == []
+    antes = _registros(app_banco, caminho)
+    assert len(antes) == 21
+
+    with open(caminho, "a", encoding="utf-8") as f:
+        f.write(linhas[20][14:] + "".join(linhas[21:]))
+    assert sincronizar([str(caminho)]) == []
+    depois = _registros(app_banco, caminho)
+
+    # As 20 linhas completas continuam no lugar; a pendente foi trocada pela linha inteira
+    assert depois[:20] == antes[:20]
+    assert len(depois) == 40
+    esperado = _em_memoria(app_banco, [caminho])
+    assert [r[2] for r in depois] == esperado["consumo_g_ave_dia"].tolist()
+
+    # Banco vazio e sincronizado do zero: mesmas linhas
+    assert sincronizar([]) == []
+    assert sincronizar([str(caminho)]) == []
+    assert [r[1:] for r in _registros(app_banco, caminho)] == [r[1:] for r in depois]
+
+
+def test_consultas_e_tendencias_iguais_as_da_memoria(app_banco, tmp_path):
+    caminhos = [tmp_path / "lote_a.csv", tmp_path / "lote_b.csv"]
+    caminhos[0].write_text(CABECALHO + _lote(90, 2), encoding="utf-8")
+    caminhos[1].write_text(CABECALHO + _lote(60, 3, inicio=20), encoding="utf-8")
+    assert app_banco["sincronizar_banco"]([str(c) for c in caminhos]) == []
+    dados = _em_memoria(app_banco, caminhos)
+
+    ini, fim = pd.Timestamp("2025-07-20"), pd.Timestamp("2025-08-10")
+    colunas = ["data", "__arquivo_origem", "consumo_g_ave_dia", "ovos_granja", "perda_ovos"]
+    do_banco = app_banco["consultar_periodo"](colunas, ini, fim)
+    pd.testing.assert_frame_equal(do_banco, app_banco["fatiar_periodo"](dados, ini, fim)[colunas], check_dtype=False)
+
+    # Tendências do banco: calculadas com dias antes de `ini`, como se viessem do histórico inteiro
+    periodo = {"dados": None, "ini": ini, "fim": fim, "colunas": colunas}
+    inicio, _ = app_banco["limites_periodo"](dados, ini, fim)
+    tendencias = app_banco["calcular_tendencias"](dados[colunas])
+    for col in ("consumo_g_ave_dia", "ovos_granja"):
+        obtido = app_banco["tendencia_periodo"](periodo, col)
+        esperado = app_banco["quadro_tendencia"](dados.iloc[inicio:inicio + len(do_banco)], tendencias, col, inicio)
+        np.testing.assert_allclose(obtido[f"{col}_z"], esperado[f"{col}_z"], rtol=1e-5)
+        np.testing.assert_allclose(obtido[f"{col}_ewma"], esperado[f"{col}_ewma"], rtol=1e-3)
+
+
+def test_agregados_iguais_ao_indice_da_memoria(app_banco, tmp_path):
+    caminhos = [tmp_path / "lote_a.csv", tmp_path / "lote_b.csv"]
+    caminhos[0].write_text(CABECALHO + _lote(50, 4), encoding="utf-8")
+    caminhos[1].write_text(CABECALHO + _lote(50, 5, inicio=30), encoding="utf-8")
+    assert app_banco["sincronizar_banco"]([str(c) for c in caminhos]) == []
+    dados = _em_memoria(app_banco, caminhos)
+    indice = app_banco["construir_indice_acumulado"](dados)
+
+    ini, fim = pd.Timestamp("2025-06-20"), pd.Timestamp("2025-07-15")
+    agregados = app_banco["agregados_banco"](ini, fim)
+    inicio, fim_excl = app_banco["limites_periodo"](dados, ini, fim)
+    assert agregados["linhas"] == fim_excl - inicio
+    for col in indice["soma"]:
+        soma, cont, _ = app_banco["resumo_periodo"](indice, inicio, fim_excl, col)
+        np.testing.assert_allclose(agregados["soma"][col], soma, rtol=1e-12, atol=1e-9)
+        assert agregados["cont"][col] == cont
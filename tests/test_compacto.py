@@ -0,0 +1,44 @@
+"""Representação compacta (AVICULTURA_COMPACTO=1): tipos menores sem ruído nos valores que saem."""
+import io
+
+import numpy as np
+import pandas as pd
+
+LOTE = (
+    "data,consumo_g_ave_dia,milho_pct,ovos_granja,perda_ovos\n"
+    + "".join(f"2025-09-{1 + i % 28:02d},95.2,63.5,{170 + i % 9},{i % 4}\n" for i in range(2000))
+)
+
+
+def _ler(app, tmp_path):
+    caminho = tmp_path / "lote.csv"
+    caminho.write_text(LOTE, encoding="utf-8")
+    _, linhas, _ = app["ler_arquivo_incremental"](str(caminho), None)
+    return linhas
+
+
+def test_tipos_e_memoria(app, app_compacto, tmp_path):
+    padrao, compacto = _ler(app, tmp_path), _ler(app_compacto, tmp_path)
+
+    assert padrao["consumo_g_ave_dia"].dtype == np.float64
+    assert compacto["consumo_g_ave_dia"].dtype == np.float32
+    assert compacto["milho_pct"].dtype == np.float32
+    assert str(compacto["ovos_granja"].dtype) == "UInt32"
+    assert str(compacto["__arquivo_origem"].dtype) == "category"
+    colunas = ["consumo_g_ave_dia", "milho_pct", "ovos_granja", "perda_ovos", "__arquivo_origem"]
+    memoria = {nome: df[colunas].memory_usage(deep=True, index=False).sum() for nome, df in (("padrao", padrao), ("compacto", compacto))}
+    assert memoria["compacto"] < memoria["padrao"] / 2
+    assert compacto.memory_usage(deep=True).sum() < padrao.memory_usage(deep=True).sum()
+
+
+def test_valores_exatos_na_saida(app_compacto, tmp_path):
+    linhas = _ler(app_compacto, tmp_path)
+    assert linhas["consumo_g_ave_dia"].astype("float64").iloc[0] != 95.2  # ruído do float32
+
+    exatos = app_compacto["valores_exatos"](linhas)
+    assert exatos["consumo_g_ave_dia"].dtype == np.float64
+    assert set(exatos["consumo_g_ave_dia"]) == {95.2}
+
+    conteudo = app_compacto["escrever_blocos"](app_compacto["blocos_dataframe"](linhas, 500), "CSV")
+    assert set(pd.read_csv(io.BytesIO(conteudo))["milho_pct"]) == {63.5}
+    assert b"95.2," in conteudo and b"95.19" not in conteudo
@@ -0,0 +1,11 @@
+"""Variáveis de ambiente AVICULTURA_*: valor inválido cai no padrão."""
+
+
+def test_numero_ambiente_invalido_usa_padrao(app, monkeypatch):
+    numero_ambiente = app["numero_ambiente"]
+    monkeypatch.setenv("AVICULTURA_WORKERS", "quatro")
+    assert numero_ambiente("AVICULTURA_WORKERS", 4) == 4
+    monkeypatch.setenv("AVICULTURA_WORKERS", "2")
+    assert numero_ambiente("AVICULTURA_WORKERS", 4) == 2
+    monkeypatch.setenv("AVICULTURA_INTERVALO_OBSERVADOR", "")
+    assert numero_ambiente("AVICULTURA_INTERVALO_OBSERVADOR", 2.0, float) == 2.0
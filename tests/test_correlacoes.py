@@ -0,0 +1,23 @@
+"""Correlação defasada por FFT: mesma resposta que `Series.corr` com `shift`."""
+import numpy as np
+import pandas as pd
+
+
+def test_fft_igual_a_series_corr(app):
+    rng = np.random.default_rng(3)
+    dias, defasagem = 120, 10
+    causa = rng.normal(100, 5, (dias, 2))
+    efeito = np.column_stack([np.roll(causa[:, 0], 4) * 0.5 + rng.normal(0, 1, dias), rng.normal(0, 1, dias)])
+    causa[rng.random(causa.shape) < 0.15] = np.nan
+    efeito[rng.random(efeito.shape) < 0.15] = np.nan
+
+    r, pares = app["correlacao_defasada"](causa, efeito, defasagem)
+
+    for p in range(causa.shape[1]):
+        for q in range(efeito.shape[1]):
+            x = pd.Series(causa[:, p])
+            for k in range(defasagem + 1):
+                y = pd.Series(efeito[:, q]).shift(-k)
+                assert pares[p, q, k] == (x.notna() & y.notna()).sum()
+                np.testing.assert_allclose(r[p, q, k], x.corr(y), rtol=1e-9, atol=1e-12)
+    assert np.nanargmax(r[0, 0]) == 4
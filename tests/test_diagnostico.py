@@ -0,0 +1,31 @@
+"""Modo diagnóstico: pico de memória por etapa, inclusive em etapas aninhadas."""
+import tracemalloc
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def diagnostico(app):
+    app["diagnostico"].update(ativo=True, medidas=[])
+    tracemalloc.start()
+    try:
+        yield app["diagnostico"]
+    finally:
+        tracemalloc.stop()
+        app["diagnostico"].update(ativo=False, medidas=[])
+
+
+def test_pico_de_etapa_que_aloca_e_libera(app, diagnostico):
+    etapa = app["etapa"]
+    with etapa("externa") as externa:
+        with etapa("interna") as interna:
+            bloco = np.ones(40 * 2**20 // 8)  # 40 MB, liberados antes do fim
+            del bloco
+        with etapa("depois") as depois:
+            pass
+
+    for medida in (externa, interna):
+        assert medida["pico_mb"] >= 39
+        assert abs(medida["variacao_mb"]) < 5
+    assert depois["pico_mb"] < 5
@@ -0,0 +1,40 @@
+"""Exportação em blocos (CSV / Parquet / XLSX)."""
+import io
+import os
+
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def blocos():
+    df = pd.DataFrame({"data": pd.date_range("2025-09-01", periods=5), "consumo_g_ave_dia": [95.2, 96.1, 92.0, 94.5, 99.9]})
+    return df, [df.iloc[:3], df.iloc[3:]]
+
+
+def test_csv_em_blocos(app, blocos):
+    df, partes = blocos
+    conteudo = app["escrever_blocos"](iter(partes), "CSV")
+
+    lido = pd.read_csv(io.BytesIO(conteudo), parse_dates=["data"])
+    pd.testing.assert_frame_equal(lido, df, check_dtype=False)
+
+
+@pytest.mark.parametrize("formato, modulo", [("Parquet", "pyarrow"), ("XLSX", "openpyxl")])
+def test_formatos_binarios_em_blocos(app, blocos, formato, modulo):
+    pytest.importorskip(modulo)
+    df, partes = blocos
+    conteudo = app["escrever_blocos"](iter(partes), formato)
+
+    lido = pd.read_parquet(io.BytesIO(conteudo)) if formato == "Parquet" else pd.read_excel(io.BytesIO(conteudo))
+    assert lido["consumo_g_ave_dia"].tolist() == df["consumo_g_ave_dia"].tolist()
+    assert len(lido) == len(df)
+
+
+def test_gravacao_em_disco_acima_do_limite(app, blocos):
+    df, partes = blocos
+    caminho = app["gravar_exportacao"](iter(partes), "CSV", "periodo.csv")
+
+    assert os.path.dirname(caminho) == app["PASTA_EXPORTACAO"]
+    assert os.listdir(app["PASTA_EXPORTACAO"]) == ["periodo.csv"]
+    pd.testing.assert_frame_equal(pd.read_csv(caminho, parse_dates=["data"]), df, check_dtype=False)
@@ -0,0 +1,52 @@
+"""Desempenho por formulação: só linhas de produção diária entram."""
+import numpy as np
+import pandas as pd
+
+
+def test_linhas_auxiliares_nao_entram_na_formulacao(app):
+    datas = pd.to_datetime(["2025-09-01", "2025-09-01", "2025-09-02", "2025-09-02", "2025-09-03", "2025-09-03"])
+    dados = app["_ordenar_por_data"](pd.DataFrame({
+        "data": datas,
+        # Lote (com ovos), consumo_racao.csv (só consumo) e mistura_racao.csv (só %)
+        "__arquivo_origem": ["lote.csv", "consumo_racao.csv", "lote.csv", "consumo_racao.csv", "lote.csv", "mistura_racao.csv"],
+        "ovos_granja": [170.0, np.nan, 180.0, np.nan, 190.0, np.nan],
+        "consumo_g_ave_dia": [100.0, 50.0, 110.0, 50.0, np.nan, np.nan],
+    }))
+    mistura = pd.DataFrame({
+        "data": pd.to_datetime(["2025-09-02"]),
+        "milho_pct": [63.5], "farelo_soja_pct": [20.0], "calcario_pct": [8.5], "nucleo_pct": [8.0],
+    })
+
+    df, sem_formulacao = app["desempenho_por_formulacao"](
+        dados, list(dados.columns), (dados.index[0], dados.index[-1]), mistura
+    )
+
+    assert sem_formulacao == 1  # só a linha de produção de 01/09
+    assert df["registros"].tolist() == [2]
+    assert df["consumo_g_ave_dia"].tolist() == [110.0]
+    assert df["ovos_granja"].tolist() == [185.0]
+
+
+def test_custo_diario_sem_formulacao_em_parte_do_dia(app):
+    # 02/09: a troca é às 12h, então o registro da manhã não tem formulação
+    datas = pd.to_datetime(["2025-09-02 08:00", "2025-09-02 12:00", "2025-09-03 08:00", "2025-09-03 08:00"])
+    dados = app["_ordenar_por_data"](app["metricas_derivadas"](pd.DataFrame({
+        "data": datas,
+        "__arquivo_origem": ["a.csv", "b.csv", "a.csv", "b.csv"],
+        "ovos_granja": [120.0, 240.0, 120.0, 240.0],
+        "consumo_g_ave_dia": [100.0, 100.0, 100.0, 100.0],
+    })))
+    mistura = pd.DataFrame({
+        "data": pd.to_datetime(["2025-09-02 12:00"]),
+        "milho_pct": [50.0], "farelo_soja_pct": [50.0], "calcario_pct": [0.0], "nucleo_pct": [0.0],
+    })
+    periodo = {"dados": dados, "conjunto": {"mistura": (mistura, None)}}
+    precos = {"milho_pct": 1.0, "farelo_soja_pct": 3.0, "calcario_pct": 0.5, "nucleo_pct": 5.0}
+
+    diario = app["conversao_diaria"](periodo, precos, plantel=1200)
+
+    # 1200 aves x 0,1 kg = 120 kg por registro; 10 + 20 dúzias por dia; R$ 2/kg
+    assert diario["data"].tolist() == list(pd.to_datetime(["2025-09-02", "2025-09-03"]))
+    np.testing.assert_allclose(diario["conversao_kg_duzia"], [8.0, 8.0])
+    assert np.isnan(diario["custo_duzia"].iloc[0])
+    np.testing.assert_allclose(diario["custo_duzia"].iloc[1], 240 * 2.0 / 30)
@@ -0,0 +1,108 @@
+"""Gráficos: redução de pontos por min/max sem perder os extremos e cache das especificações."""
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _serie(n, semente=9):
+    rng = np.random.default_rng(semente)
+    df = pd.DataFrame({
+        "data": pd.Timestamp("2024-01-01") + pd.to_timedelta(np.arange(n), unit="h"),
+        "ovos_granja": rng.normal(180, 5, n),
+        "ovos_escola": rng.normal(170, 5, n),
+    })
+    df.loc[rng.random(n) < 0.05, "ovos_escola"] = np.nan
+    df.loc[n // 8, "ovos_granja"] = 400.0  # pico isolado
+    df.loc[n * 3 // 7, "ovos_escola"] = 10.0  # vale isolado
+    return df
+
+
+def test_reducao_mantem_extremos_de_cada_faixa(app):
+    reduzir = app["reduzir_pontos"]
+    df, max_pontos = _serie(10_000), 200
+    reduzido = reduzir(df, ["ovos_granja", "ovos_escola"], max_pontos)
+
+    assert len(reduzido) <= max_pontos
+    assert reduzido.index.is_monotonic_increasing
+    assert {0, len(df) - 2, len(df) - 1} <= set(reduzido.index)
+    assert {len(df) // 8, len(df) * 3 // 7} <= set(reduzido.index)
+    for col in ("ovos_granja", "ovos_escola"):
+        assert reduzido[col].max() == df[col].max()
+        assert reduzido[col].min() == df[col].min()
+
+    # Cada faixa mantém o seu mínimo e o seu máximo
+    n_faixas = (max_pontos - 3) // 4
+    tamanho = int(np.ceil(len(df) / n_faixas))
+    for inicio in range(0, len(df), tamanho):
+        faixa = df["ovos_granja"].iloc[inicio:inicio + tamanho]
+        assert {faixa.idxmin(), faixa.idxmax()} <= set(reduzido.index)
+
+
+def test_serie_curta_ou_sem_limite_fica_igual(app):
+    reduzir = app["reduzir_pontos"]
+    df = _serie(150)
+    assert reduzir(df, "ovos_granja", None) is df
+    assert reduzir(df, "ovos_granja", 150) is df
+    assert len(reduzir(df, "ovos_granja", 149)) <= 149
+
+
+class _Grafico:
+    def __init__(self, spec):
+        self.spec = spec
+
+    def to_dict(self):
+        return self.spec
+
+
+@pytest.fixture
+def cache(app):
+    """Cache de gráficos vazio, com limites restaurados no fim."""
+    globais = app["hash_conteudo"].__globals__
+    limites = {k: globais[k] for k in ("CACHE_GRAFICOS_MAX_ITENS", "CACHE_GRAFICOS_MAX_BYTES")}
+    app["cache_graficos"].clear()
+    yield globais
+    globais.update(limites)
+    app["cache_graficos"].clear()
+
+
+def test_cache_de_graficos_acerta_pelo_conteudo(app, cache):
+    chamadas = []
+
+    def grafico_teste(df, titulo, previsao=None):
+        chamadas.append(titulo)
+        return _Grafico({"titulo": titulo, "soma": float(df["ovos_granja"].sum())})
+
+    spec = app["spec_grafico"]
+    df = _serie(50)
+    primeiro = spec(grafico_teste, df, titulo="a")
+    # Mesmo conteúdo com outro índice e outra cópia: acerto, sem chamar o construtor
+    assert spec(grafico_teste, df.reset_index(drop=True).set_axis(df.index + 7).copy(), titulo="a") is primeiro
+    assert chamadas == ["a"]
+
+    alterado = df.copy()
+    alterado.loc[3, "ovos_granja"] += 1
+    spec(grafico_teste, alterado, titulo="a")
+    spec(grafico_teste, df, titulo="b")
+    # DataFrames nos parâmetros entram pelo conteúdo
+    spec(grafico_teste, df, titulo="a", previsao=df.head(3))
+    spec(grafico_teste, df, titulo="a", previsao=df.head(3).copy())
+    assert chamadas == ["a", "a", "b", "a"]
+
+
+def test_cache_de_graficos_descarta_o_usado_ha_mais_tempo(app, cache):
+    cache["CACHE_GRAFICOS_MAX_ITENS"] = 2
+
+    def grafico_teste(df, titulo):
+        return _Grafico({"titulo": titulo})
+
+    spec, itens = app["spec_grafico"], app["cache_graficos"]()
+    df = _serie(10)
+    for titulo in ("a", "b", "a", "c"):  # "a" usado de novo: "b" é o mais antigo
+        spec(grafico_teste, df, titulo=titulo)
+    assert [chave[2] for chave in itens["itens"]] == [repr([("titulo", "a")]), repr([("titulo", "c")])]
+    assert itens["bytes"] == sum(tamanho for _, tamanho in itens["itens"].values())
+
+    # Limite de bytes: só cabe o último gráfico
+    cache["CACHE_GRAFICOS_MAX_BYTES"] = itens["bytes"] // 2 + 1
+    spec(grafico_teste, df, titulo="d")
+    assert len(itens["itens"]) == 1 and itens["bytes"] <= cache["CACHE_GRAFICOS_MAX_BYTES"]
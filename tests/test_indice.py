@@ -0,0 +1,57 @@
+"""Índice de somas acumuladas: KPIs de qualquer período iguais à soma direta das linhas."""
+import numpy as np
+import pandas as pd
+
+
+def _dados(app):
+    rng = np.random.default_rng(8)
+    n = 500
+    datas = pd.Timestamp("2025-03-01") + pd.to_timedelta(np.sort(rng.integers(0, 120, n)), unit="D")
+    df = pd.DataFrame({"data": datas, "__arquivo_origem": "lote.csv"})
+    for col in app["COLUNAS_INDICE"]:
+        valores = rng.normal(100, 20, n)
+        valores[rng.random(n) < 0.2] = np.nan
+        df[col] = valores
+    return app["_ordenar_por_data"](df)
+
+
+def test_resumo_igual_a_soma_direta(app):
+    dados = _dados(app)
+    indice = app["construir_indice_acumulado"](dados)
+    limites, fatiar, resumo = app["limites_periodo"], app["fatiar_periodo"], app["resumo_periodo"]
+
+    periodos = [
+        ("2025-03-01", "2025-06-28"),  # tudo
+        ("2025-04-10", "2025-04-10"),  # um dia
+        ("2025-04-10", "2025-05-03"),
+        ("2025-02-01", "2025-02-20"),  # antes dos dados
+        ("2025-06-20", "2025-08-01"),  # passa do fim
+    ]
+    for ini, fim in periodos:
+        inicio, fim_excl = limites(dados, ini, fim)
+        fatia = fatiar(dados, ini, fim)
+        assert (dados.index[inicio:fim_excl] == fatia.index).all()
+        for col in app["COLUNAS_INDICE"]:
+            soma, cont, media = resumo(indice, inicio, fim_excl, col)
+            np.testing.assert_allclose(soma, fatia[col].sum(), rtol=1e-9, atol=1e-6)
+            assert cont == fatia[col].count()
+            if cont:
+                np.testing.assert_allclose(media, fatia[col].mean(), rtol=1e-9)
+            else:
+                assert np.isnan(media)
+
+    soma, cont, media = resumo(indice, 0, len(dados), "coluna_inexistente")
+    assert (soma, cont) == (0.0, 0) and np.isnan(media)
+
+
+def test_indice_estendido_igual_ao_construido_de_uma_vez(app):
+    dados = _dados(app)
+    construir = app["construir_indice_acumulado"]
+    indice = None
+    for corte in (0, 1, 120, 121, 400, len(dados)):
+        indice = construir(dados.iloc[:corte], indice)
+    completo = construir(dados)
+    assert indice["linhas"] == completo["linhas"] == len(dados)
+    for tipo in ("soma", "cont"):
+        for col, vetor in completo[tipo].items():
+            np.testing.assert_allclose(indice[tipo][col], vetor, rtol=1e-12, atol=1e-9)
@@ -0,0 +1,95 @@
+"""Ingestão incremental: leitura só do trecho anexado e base com folga para as linhas novas."""
+import numpy as np
+import pandas as pd
+import pytest
+
+CABECALHO = "data,consumo_g_ave_dia,ovos_granja,ovos_escola\n"
+
+
+def _linha(dia, consumo):
+    return f"2025-09-{dia:02d},{consumo},{170 + dia},{160 + dia}\n"
+
+
+def test_anexo_com_linha_pendente(app, tmp_path):
+    ler = app["ler_arquivo_incremental"]
+    caminho = tmp_path / "lote.csv"
+    # A última linha ainda está sendo gravada (sem quebra de linha)
+    caminho.write_text(CABECALHO + _linha(1, 95.2) + _linha(2, 96.0)[:12], encoding="utf-8")
+    entrada, linhas, modo = ler(str(caminho), None)
+    assert (modo, len(linhas), len(entrada["pendente"])) == ("completo", 1, 1)
+
+    with open(caminho, "a", encoding="utf-8") as f:
+        f.write(_linha(2, 96.0)[12:] + _linha(3, 97.5))
+    entrada, linhas, modo = ler(str(caminho), entrada)
+
+    assert modo == "anexado"
+    assert entrada["pendente"].empty and entrada["linhas"] == 3
+    assert linhas["consumo_g_ave_dia"].tolist() == [96.0, 97.5]
+    completo, _, _ = ler(str(caminho), None)
+    assert entrada["crc_prefixo"] == completo["crc_prefixo"]
+    assert ler(str(caminho), entrada)[2] == "inalterado"
+
+
+def test_reescrita_que_preserva_o_fim_relê_o_arquivo(app, tmp_path):
+    ler = app["ler_arquivo_incremental"]
+    caminho = tmp_path / "lote.csv"
+    linhas_csv = [_linha(dia, 95.0) for dia in range(1, 11)]
+    caminho.write_text(CABECALHO + "".join(linhas_csv), encoding="utf-8")
+    entrada, _, _ = ler(str(caminho), None)
+
+    # Mesmo tamanho e mesmos bytes de controle no fim: só o CRC percebe
+    linhas_csv[0] = _linha(1, 99.0)
+    caminho.write_text(CABECALHO + "".join(linhas_csv) + _linha(11, 95.0), encoding="utf-8")
+    entrada, linhas, modo = ler(str(caminho), entrada)
+
+    assert modo == "completo"
+    assert linhas["consumo_g_ave_dia"].iloc[0] == 99.0 and len(linhas) == 11
+
+
+@pytest.fixture
+def base(app):
+    datas = pd.Timestamp("2025-09-01") + pd.to_timedelta(np.arange(50) // 5, unit="D")
+    df = pd.DataFrame({
+        "data": datas,
+        "consumo_g_ave_dia": np.linspace(90, 99, 50),
+        "ovos_granja": np.arange(50, dtype="float64"),
+        "observacao": pd.array(["ok", None] * 25, dtype="str"),
+        "__arquivo_origem": "a.csv",
+    })
+    return app["_ordenar_por_data"](df)
+
+
+def _bloco(inicio, n, origem="a.csv"):
+    return pd.DataFrame({
+        "data": pd.Timestamp("2025-09-11") + pd.to_timedelta(inicio + np.arange(n), unit="D"),
+        "consumo_g_ave_dia": 95.0 + np.arange(n),
+        "ovos_granja": np.full(n, 7.0),
+        "__arquivo_origem": origem,
+    })
+
+
+def test_anexo_no_fim_usa_a_folga_da_base(app, base):
+    anexar, construir = app["anexar_linhas"], app["construir_indice_acumulado"]
+    dados, reserva = app["reservar_base"](base)
+    indice = construir(dados)
+    pd.testing.assert_frame_equal(dados, base)
+
+    for inicio in (0, 3, 10):
+        bloco = _bloco(inicio, 3)
+        antes = dados
+        dados, indice, reserva = anexar(dados, indice, [bloco], reserva)
+        assert reserva is not None
+        # As linhas já existentes não foram copiadas
+        assert np.shares_memory(antes["consumo_g_ave_dia"].to_numpy(), dados["consumo_g_ave_dia"].to_numpy())
+
+    esperado = app["_ordenar_por_data"](
+        app["concatenar_blocos"]([base, _bloco(0, 3), _bloco(3, 3), _bloco(10, 3)])
+    )
+    pd.testing.assert_frame_equal(dados, esperado)
+    for col, soma in construir(esperado)["soma"].items():
+        np.testing.assert_allclose(indice["soma"][col], soma)
+
+    # Linhas anteriores às existentes: a base é remontada em ordem, sem folga
+    dados, indice, reserva = anexar(dados, indice, [_bloco(-5, 1, "b.csv")], reserva)
+    assert reserva is None and dados.index.is_monotonic_increasing
+    assert dados["__arquivo_origem"].iloc[25:31].tolist() == ["a.csv"] * 5 + ["b.csv"]
@@ -0,0 +1,95 @@
+"""Leitura dos CSV: separador decimal, milhar e formatos de data."""
+import numpy as np
+import pandas as pd
+
+
+def test_data_com_pontos_em_arquivo_com_virgula_decimal(app, tmp_path):
+    # Com decimal "," o milhar é "."; a data dd.mm.aaaa não pode virar número
+    caminho = tmp_path / "lote.csv"
+    caminho.write_text(
+        'data,consumo_g_ave_dia,ovos_granja\n'
+        '01.09.2025,"95,2",170\n'
+        '02.09.2025,"1.001,5",180\n',
+        encoding="utf-8",
+    )
+    entrada, linhas, modo = app["ler_arquivo_incremental"](str(caminho), None)
+
+    assert modo == "completo"
+    assert entrada["formato_data"] == "%d.%m.%Y"
+    assert list(linhas["data"].dt.strftime("%Y-%m-%d")) == ["2025-09-01", "2025-09-02"]
+    np.testing.assert_allclose(linhas["consumo_g_ave_dia"], [95.2, 1001.5])
+
+
+def test_arquivo_auxiliar_com_data_com_pontos(app, tmp_path):
+    caminho = tmp_path / "consumo_racao.csv"
+    caminho.write_text('Data,consumo_g_ave_dia\n01.09.2025,"95,2"\n', encoding="utf-8")
+    df = app["ler_csv_tipado"](str(caminho))
+
+    assert df["data"].tolist() == ["01.09.2025"]
+    np.testing.assert_allclose(df["consumo_g_ave_dia"], [95.2])
+
+
+def test_valores_numericos_sem_ruido_de_float32(app, tmp_path):
+    # 95.2 tem de chegar exato à tabela, à exportação e ao banco
+    caminho = tmp_path / "lote.csv"
+    caminho.write_text("data,consumo_g_ave_dia,milho_pct\n2025-09-01,95.2,63.5\n", encoding="utf-8")
+    _, linhas, _ = app["ler_arquivo_incremental"](str(caminho), None)
+
+    assert linhas["consumo_g_ave_dia"].tolist() == [95.2]
+    assert str(linhas["consumo_g_ave_dia"].astype(object).iloc[0]) == "95.2"
+
+
+def test_arquivo_misto_virgula_entre_aspas_e_ponto_decimal(app, tmp_path):
+    # Uma vírgula decimal entre aspas não pode transformar "95.2" (sem aspas) em 952
+    caminho = tmp_path / "lote.csv"
+    caminho.write_text(
+        'data,consumo_g_ave_dia,ovos_granja,milho_pct\n'
+        '2025-09-01,"95,2",1.250,63.5\n'
+        '2025-09-02,95.2,"1.300",63\n'
+        '2025-09-03,"1.001,5",1300,"63,5"\n',
+        encoding="utf-8",
+    )
+    _, linhas, _ = app["ler_arquivo_incremental"](str(caminho), None)
+
+    np.testing.assert_allclose(linhas["consumo_g_ave_dia"], [95.2, 95.2, 1001.5])
+    np.testing.assert_allclose(linhas["ovos_granja"], [1250, 1300, 1300])
+    np.testing.assert_allclose(linhas["milho_pct"], [63.5, 63.0, 63.5])
+    np.testing.assert_allclose(app["ler_csv_tipado"](str(caminho))["consumo_g_ave_dia"], [95.2, 95.2, 1001.5])
+
+
+def test_formato_de_data_detectado_por_arquivo(app, tmp_path):
+    ler = app["ler_arquivo_incremental"]
+    arquivos = {
+        "br.csv": ("01/09/2025", "02/09/2025", "%d/%m/%Y"),
+        "iso.csv": ("2025-09-01", "2025-09-02", "%Y-%m-%d"),
+        "curto.csv": ("01-09-25", "02-09-25", "%d-%m-%y"),
+        # Nenhum formato conhecido: inferência linha a linha
+        "texto.csv": ("1 Sep 2025", "2 Sep 2025", "mixed"),
+    }
+    for nome, (dia1, dia2, formato) in arquivos.items():
+        caminho = tmp_path / nome
+        caminho.write_text(f"data,ovos_granja\n{dia1},170\n", encoding="utf-8")
+        entrada, linhas, _ = ler(str(caminho), None)
+        assert entrada["formato_data"] == formato, nome
+        assert linhas["data"].tolist() == [pd.Timestamp("2025-09-01")], nome
+
+        # O formato fica com o arquivo: o trecho anexado não é redetectado
+        with open(caminho, "a", encoding="utf-8") as f:
+            f.write(f"{dia2},180\n")
+        entrada, linhas, modo = ler(str(caminho), entrada)
+        assert (modo, entrada["formato_data"]) == ("anexado", formato), nome
+        assert linhas["data"].tolist() == [pd.Timestamp("2025-09-02")], nome
+
+    assert app["descricao_formato_data"]("mixed") == "inferido linha a linha (lento)"
+
+
+def test_formato_de_data_pela_maioria_da_amostra(app):
+    detectar = app["detectar_formato_data"]
+    # 01/09 é ambíguo; vale dd/mm/aaaa, o primeiro da lista
+    assert detectar(pd.Series(["01/09/2025", "02/09/2025"])) == "%d/%m/%Y"
+    # Um valor fora do padrão não decide o formato do arquivo
+    assert detectar(pd.Series(["2025-09-01", "2025-09-02", "01/09/2025"])) == "%Y-%m-%d"
+    assert detectar(pd.Series(["sem data", None])) is None
+
+    datas, formato = app["converter_datas"](pd.Series(["2025-09-01", "lixo"]), "%Y-%m-%d")
+    assert formato == "%Y-%m-%d" and datas.isna().tolist() == [False, True]
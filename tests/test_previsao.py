@@ -0,0 +1,84 @@
+"""Previsão por lote: carga em partes igual à carga de uma vez, com reajuste programado."""
+import numpy as np
+import pandas as pd
+
+CHAVES_ESTADO = ("params", "nivel", "tendencia", "sazonal", "sse", "n")
+
+
+def _registros(app):
+    rng = np.random.default_rng(11)
+    linhas = []
+    for lote, inicio, n_dias in (("a.csv", 0, 80), ("b.csv", 20, 45), ("c.csv", 60, 15)):
+        for d in range(n_dias):
+            if rng.random() < 0.1:
+                continue  # dia sem registro
+            for _ in range(rng.integers(1, 3)):
+                momento = pd.Timestamp("2025-01-01") + pd.Timedelta(days=inicio + d, hours=int(rng.integers(0, 20)))
+                ovos = 180 + 15 * np.sin(2 * np.pi * d / 7) + 0.5 * d + rng.normal(0, 3)
+                linhas.append((momento, lote, ovos, rng.normal(110, 2)))
+    return app["_ordenar_por_data"](
+        pd.DataFrame(linhas, columns=["data", "__arquivo_origem", "ovos_granja", "consumo_g_ave_dia"])
+    )
+
+
+def assert_modelos_iguais(obtido, esperado):
+    assert obtido.keys() == esperado.keys()
+    for chave in esperado:
+        assert obtido[chave]["pendente"] == esperado[chave]["pendente"]
+        assert obtido[chave]["marco"] == esperado[chave]["marco"]
+        for campo in CHAVES_ESTADO:
+            np.testing.assert_allclose(obtido[chave][campo], esperado[chave][campo], rtol=1e-12, err_msg=str((chave, campo)))
+
+
+def test_carga_em_partes_igual_a_carga_de_uma_vez(app):
+    registros = _registros(app)
+    atualizar, diarios = app["atualizar_modelos"], app["diarios_previsao"]
+    de_uma_vez = atualizar({}, diarios(registros))
+
+    # Cortes em qualquer linha: inclusive no meio de um dia
+    modelos = {}
+    for corte in [*np.random.default_rng(5).choice(len(registros), 30, replace=False).tolist(), len(registros)]:
+        modelos = atualizar(modelos, diarios(registros.iloc[:corte]))
+    assert_modelos_iguais(modelos, de_uma_vez)
+
+    # Valor antigo corrigido: a série afetada é reajustada como numa carga nova
+    corrigido = registros.copy()
+    corrigido.iloc[5, corrigido.columns.get_loc("ovos_granja")] += 40
+    assert_modelos_iguais(atualizar(de_uma_vez, diarios(corrigido)), atualizar({}, diarios(corrigido)))
+
+
+def test_parametros_reajustados_a_cada_semana(app):
+    marco, minimo, passo = app["marco_ajuste"], app["MIN_DIAS_AJUSTE"], app["REAJUSTE_DIAS"]
+    assert [marco(n) for n in (0, minimo - 1)] == [0, minimo - 1]
+    assert [marco(minimo + k) for k in range(passo + 1)] == [minimo] * passo + [minimo + passo]
+
+    modelos = app["atualizar_modelos"]({}, app["diarios_previsao"](_registros(app)))
+    for modelo in modelos.values():
+        assert modelo["marco"] == marco(modelo["dias"])
+
+
+def test_totais_diarios_estendidos_so_com_as_linhas_novas(app):
+    registros = _registros(app)
+    acumular = app["acumular_diarios"]
+
+    # Referência: agrupamento do histórico inteiro pelo pandas
+    partes = []
+    for col in app["COLUNAS_PREVISAO"]:
+        grupos = registros.groupby(["__arquivo_origem", registros["data"].dt.normalize()])[col]
+        diario = grupos.agg(soma="sum", cont="count").reset_index()
+        partes.append(diario.set_axis(["lote", "dia", "soma", "cont"], axis=1).assign(coluna=col))
+    esperado = pd.concat(partes, ignore_index=True)[["lote", "coluna", "dia", "soma", "cont"]]
+
+    estado = None
+    for corte in [0, 1, 37, 38, 200, 201, len(registros)]:
+        estado = acumular(registros.iloc[:corte], estado)
+    pd.testing.assert_frame_equal(estado["diarios"], esperado, check_dtype=False)
+    pd.testing.assert_frame_equal(estado["diarios"], app["diarios_previsao"](registros))
+
+    # Valor antigo corrigido: só o lote afetado é reagrupado, e do início
+    corrigido = registros.copy()
+    corrigido.iloc[5, corrigido.columns.get_loc("ovos_granja")] += 40
+    pd.testing.assert_frame_equal(acumular(corrigido, estado)["diarios"], acumular(corrigido)["diarios"])
+    lote = corrigido["__arquivo_origem"].iloc[5]
+    outro = next(n for n in estado["lotes"] if n != lote)
+    assert acumular(corrigido, estado)["lotes"][outro]["dias"] is estado["lotes"][outro]["dias"]
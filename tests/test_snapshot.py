@@ -0,0 +1,90 @@
+"""Snapshot colunar: o que é lido de volta é o que foi gravado, e só enquanto os CSV não mudam."""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+CABECALHO = "data,consumo_g_ave_dia,ovos_granja,ovos_escola,observacao\n"
+
+
+@pytest.fixture
+def snapshot(app, tmp_path):
+    """Funções do snapshot gravando em `tmp_path`, com o cache de leitura limpo."""
+    globais = app["_caminhos_snapshot"].__globals__
+    anterior = globais["PASTA_SNAPSHOT"]
+    globais["PASTA_SNAPSHOT"] = str(tmp_path / ".snapshot")
+    app["ler_snapshot"].clear()
+    yield app
+    app["ler_snapshot"].clear()
+    globais["PASTA_SNAPSHOT"] = anterior
+
+
+def _gravar(app, tmp_path):
+    caminhos = []
+    for nome, inicio in (("lote_a.csv", 1), ("lote_b.csv", 5)):
+        caminho = tmp_path / nome
+        caminho.write_text(
+            CABECALHO + "".join(f"2025-09-{d:02d},{90 + d / 10},{170 + d},{160 + d},dia {d}\n" for d in range(inicio, inicio + 8)),
+            encoding="utf-8",
+        )
+        caminhos.append(str(caminho))
+    ingestao = {c: app["ler_arquivo_incremental"](c, None)[0] for c in caminhos}
+    dados = app["_ordenar_por_data"](app["concatenar_blocos"]([b for e in ingestao.values() for b in e["blocos"]]))
+    indice = app["construir_indice_acumulado"](dados)
+    impressoes = tuple(app["impressao_digital"](c) for c in caminhos)
+    formatos = {"lote_a.csv": "%Y-%m-%d", "lote_b.csv": "%Y-%m-%d"}
+    app["compactar_snapshot"](dados, indice, impressoes, formatos, ingestao)
+    return caminhos, dados, indice, impressoes, ingestao
+
+
+def test_ida_e_volta(snapshot, tmp_path):
+    app = snapshot
+    caminhos, dados, indice, impressoes, ingestao = _gravar(app, tmp_path)
+
+    lidos, indice_lido, formatos, ingestao_lida = app["ler_snapshot"](impressoes)
+    pd.testing.assert_frame_equal(lidos, dados)
+    assert indice_lido["linhas"] == len(dados)
+    for tipo in ("soma", "cont"):
+        assert indice_lido[tipo].keys() == indice[tipo].keys()
+        for col, vetor in indice[tipo].items():
+            np.testing.assert_array_equal(indice_lido[tipo][col], vetor)
+    assert formatos == {"lote_a.csv": "%Y-%m-%d", "lote_b.csv": "%Y-%m-%d"}
+    for caminho in caminhos:
+        for campo in (*app["_CAMPOS_INGESTAO"], "controle"):
+            assert ingestao_lida[caminho][campo] == ingestao[caminho][campo]
+
+    # Só as colunas pedidas saem do arquivo mapeado
+    app["ler_snapshot"].clear()
+    parcial, _, _, _ = app["ler_snapshot"](impressoes, ["data", "ovos_granja"])
+    assert list(parcial.columns) == ["data", "ovos_granja"]
+
+    # Os offsets salvos continuam a leitura incremental de onde ela parou
+    with open(caminhos[0], "a", encoding="utf-8") as f:
+        f.write("2025-09-20,99.0,180,170,novo\n")
+    _, linhas, modo = app["ler_arquivo_incremental"](caminhos[0], {**ingestao_lida[caminhos[0]], "blocos": []})
+    assert modo == "anexado" and linhas["observacao"].tolist() == ["novo"]
+
+
+def test_invalidado_quando_os_csv_ou_a_versao_mudam(snapshot, tmp_path):
+    app = snapshot
+    caminhos, _, _, impressoes, _ = _gravar(app, tmp_path)
+    ler = app["ler_snapshot"]
+    assert ler(impressoes) is not None
+
+    # Arquivo que cresceu: nova impressão digital, snapshot ignorado
+    with open(caminhos[1], "a", encoding="utf-8") as f:
+        f.write("2025-09-20,99.0,180,170,novo\n")
+    assert ler(tuple(app["impressao_digital"](c) for c in caminhos)) is None
+    # Arquivo a menos
+    assert ler(impressoes[:1]) is None
+
+    # Manifesto de outra VERSAO_CACHE
+    _, _, manifesto = app["_caminhos_snapshot"]()
+    with open(manifesto, encoding="utf-8") as f:
+        conteudo = json.load(f)
+    conteudo["versao"] = app["VERSAO_CACHE"] - 1
+    with open(manifesto, "w", encoding="utf-8") as f:
+        json.dump(conteudo, f)
+    ler.clear()
+    assert ler(impressoes) is None
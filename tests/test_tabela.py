@@ -0,0 +1,63 @@
+"""Tabela detalhada paginada: páginas em sequência iguais à ordenação do período inteiro."""
+import numpy as np
+import pandas as pd
+import pytest
+
+CABECALHO = "data,ovos_granja,consumo_g_ave_dia\n"
+COLUNAS = ["data", "__arquivo_origem", "ovos_granja", "consumo_g_ave_dia"]
+
+
+@pytest.fixture
+def lotes(tmp_path):
+    rng = np.random.default_rng(19)
+    caminhos = []
+    for nome in ("lote_a.csv", "lote_b.csv"):
+        linhas = []
+        for d in range(60):
+            # Poucos valores distintos (muitos empates) e alguns vazios
+            ovos = "" if rng.random() < 0.1 else str(rng.integers(170, 175))
+            linhas.append(f"{(pd.Timestamp('2025-08-01') + pd.Timedelta(days=d)).date()},{ovos},{rng.normal(95, 2):.1f}\n")
+        caminho = tmp_path / nome
+        caminho.write_text(CABECALHO + "".join(linhas), encoding="utf-8")
+        caminhos.append(str(caminho))
+    return caminhos
+
+
+def _todas_as_paginas(pagina_tabela, periodo, tamanho, **opcoes):
+    paginas, numero = [], 1
+    while not (pagina := pagina_tabela(periodo, COLUNAS, tamanho=tamanho, pagina=numero, **opcoes)).empty:
+        assert len(pagina) <= tamanho
+        paginas.append(pagina)
+        numero += 1
+    return pd.concat(paginas, ignore_index=True)
+
+
+def _esperado(fatia, ordem, decrescente, arquivos):
+    if arquivos:
+        fatia = fatia[fatia["__arquivo_origem"].isin(arquivos)]
+    fatia = fatia.reset_index(drop=True)
+    if ordem != "data" or decrescente:
+        fatia = fatia.sort_values(ordem, ascending=not decrescente, kind="stable", na_position="last")
+    return fatia[COLUNAS].reset_index(drop=True)
+
+
+@pytest.mark.parametrize("ordem,decrescente", [("data", False), ("data", True), ("ovos_granja", False), ("ovos_granja", True)])
+@pytest.mark.parametrize("arquivos", [None, ["lote_b.csv"]])
+def test_paginas_em_sequencia_na_memoria_e_no_banco(app, app_banco, lotes, ordem, decrescente, arquivos):
+    blocos = [app["ler_arquivo_incremental"](c, None)[1] for c in lotes]
+    dados = app["_ordenar_por_data"](app["concatenar_blocos"](blocos))
+    ini, fim = pd.Timestamp("2025-08-05"), pd.Timestamp("2025-09-20")
+    fatia = app["fatiar_periodo"](dados, ini, fim)
+    esperado = _esperado(fatia, ordem, decrescente, arquivos)
+    opcoes = {"ordem": ordem, "decrescente": decrescente, "arquivos": arquivos}
+
+    periodo = {"dados": fatia, "linhas": len(fatia)}
+    assert app["contar_linhas_tabela"](periodo, arquivos) == len(esperado)
+    pd.testing.assert_frame_equal(_todas_as_paginas(app["pagina_tabela"], periodo, 17, **opcoes), esperado)
+
+    assert app_banco["sincronizar_banco"](lotes) == []
+    periodo = {"dados": None, "ini": ini, "fim": fim}
+    assert app_banco["contar_linhas_tabela"](periodo, arquivos) == len(esperado)
+    pd.testing.assert_frame_equal(
+        _todas_as_paginas(app_banco["pagina_tabela"], periodo, 17, **opcoes), esperado, check_dtype=False
+    )
@@ -0,0 +1,55 @@
+"""Estatísticas móveis por lote: cálculo incremental igual ao completo e à referência do pandas."""
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def registros(app):
+    rng = np.random.default_rng(7)
+    n = 600
+    return app["_ordenar_por_data"](pd.DataFrame({
+        "data": pd.Timestamp("2025-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 120, n)), unit="D"),
+        "__arquivo_origem": rng.choice(["a.csv", "b.csv", "c.csv"], n),
+        "ovos_granja": np.where(rng.random(n) < 0.1, np.nan, rng.normal(180, 15, n)),
+        "perda_ovos": rng.normal(10, 3, n),
+    }))
+
+
+def assert_tendencias_iguais(obtido, esperado):
+    for chave in ("media", "desvio", "ewma", "z"):
+        np.testing.assert_allclose(obtido[chave], esperado[chave], rtol=1e-5, atol=1e-5, equal_nan=True, err_msg=chave)
+
+
+def test_incremental_igual_ao_completo(app, registros):
+    calcular = app["calcular_tendencias"]
+    completo = calcular(registros)
+
+    resultado = None
+    for corte in (0, 7, 150, 151, 420, len(registros)):
+        resultado = calcular(registros.iloc[:corte], resultado)
+    assert_tendencias_iguais(resultado, completo)
+
+    # Linha antiga alterada e lote removido: os lotes afetados são refeitos
+    alterado = registros.copy()
+    alterado.iloc[3, alterado.columns.get_loc("ovos_granja")] = 999.0
+    alterado = alterado[alterado["__arquivo_origem"] != "c.csv"]
+    assert_tendencias_iguais(calcular(alterado, completo), calcular(alterado))
+
+
+def test_igual_a_referencia_do_pandas(app, registros):
+    tendencias = app["calcular_tendencias"](registros)
+    janela = app["JANELA_TENDENCIA"]
+    j = app["COLUNAS_TENDENCIA"].index("ovos_granja")
+    grupos = registros.reset_index(drop=True).groupby("__arquivo_origem")["ovos_granja"]
+
+    media = grupos.transform(lambda s: s.rolling(janela, min_periods=1).mean())
+    ewma = grupos.transform(lambda s: s.ewm(alpha=app["ALFA_EWMA"], adjust=False, ignore_na=True).mean())
+    anterior = grupos.shift(1).groupby(registros["__arquivo_origem"].to_numpy())
+    media_ant = anterior.transform(lambda s: s.rolling(janela, min_periods=app["MIN_PONTOS_Z"]).mean())
+    desvio_ant = anterior.transform(lambda s: s.rolling(janela, min_periods=app["MIN_PONTOS_Z"]).std())
+    z = ((registros["ovos_granja"].to_numpy() - media_ant) / desvio_ant).where(desvio_ant > 0)
+
+    np.testing.assert_allclose(tendencias["media"][:, j], media, rtol=1e-5, equal_nan=True)
+    np.testing.assert_allclose(tendencias["ewma"][:, j], ewma, rtol=1e-5, equal_nan=True)
+    np.testing.assert_allclose(tendencias["z"][:, j], z, rtol=1e-4, atol=1e-5, equal_nan=True)